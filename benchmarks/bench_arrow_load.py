@@ -0,0 +1,105 @@
+"""
+Benchmark: nạp dataset JSONL (parse toàn bộ text) so với Arrow (memory map, zero-copy)
+Đo thời gian mở + đếm mẫu + đọc ngẫu nhiên, và RSS tối đa của tiến trình đọc.
+
+Chạy (cần pyarrow):
+    python benchmarks/bench_arrow_load.py --rows 1000000
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'scripts'))
+
+from normalizer import frame_to_jsonl, normalize_frame  # noqa: E402
+from arrow_dataset import ArrowDataset, ArrowDatasetWriter, arrow_available  # noqa: E402
+
+SAMPLES_FILE = os.path.join(ROOT_DIR, 'data', 'test_samples.csv')
+CHUNK_ROWS = 10000
+RANDOM_READS = 1000
+
+def build_datasets(rows: int, directory: str) -> tuple:
+    """Sinh rows cặp hội thoại từ test_samples.csv, ghi cả JSONL và Arrow theo chunk"""
+    samples = normalize_frame(pd.read_csv(SAMPLES_FILE, dtype=str)).reset_index(drop=True)
+    jsonl_path = os.path.join(directory, 'dataset.jsonl')
+    arrow_path = os.path.join(directory, 'dataset.arrow')
+    writer = ArrowDatasetWriter(arrow_path)
+    with open(jsonl_path, 'w', encoding='utf-8') as f:
+        for start in range(0, rows, CHUNK_ROWS):
+            index = [(start + i) % len(samples) for i in range(min(CHUNK_ROWS, rows - start))]
+            chunk = pd.DataFrame({
+                'user_message': [f"{samples['user_message'][j]} #{start + i}" for i, j in enumerate(index)],
+                'assistant_message': [samples['assistant_message'][j] for j in index]
+            })
+            f.write(frame_to_jsonl(chunk))
+            writer.write(chunk)
+    writer.close()
+    return jsonl_path, arrow_path
+
+def load_jsonl(path: str, reads: list) -> dict:
+    """Đường cũ: parse mọi dòng JSON vào bộ nhớ rồi truy cập"""
+    with open(path, 'r', encoding='utf-8') as f:
+        conversations = [json.loads(line) for line in f]
+    sample = [conversations[i] for i in reads]
+    return {'rows': len(conversations), 'sampled': len(sample)}
+
+def load_arrow(path: str, reads: list) -> dict:
+    """Memory map file Arrow, đếm mẫu qua metadata, đọc ngẫu nhiên từng mẫu"""
+    dataset = ArrowDataset(path)
+    sample = [dataset[i] for i in reads]
+    stats = dataset.stats()
+    return {'rows': len(dataset), 'sampled': len(sample), 'mean_user_bytes': stats['user_message']['mean_bytes']}
+
+def measure(mode: str, path: str, rows: int) -> None:
+    """Chạy trong tiến trình con để RSS của mỗi cách nạp được đo riêng"""
+    reads = random.Random(0).sample(range(rows), min(RANDOM_READS, rows))
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    result = (load_jsonl if mode == 'jsonl' else load_arrow)(path, reads)
+    result['seconds'] = time.perf_counter() - started
+    result['rss_mb'] = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_rss) / 1024
+    print(json.dumps(result))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--measure', nargs=2, metavar=('MODE', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if not arrow_available():
+        raise SystemExit('Cần cài đặt pyarrow: pip install pyarrow')
+    if args.measure:
+        measure(args.measure[0], args.measure[1], args.rows)
+        return
+
+    directory = tempfile.mkdtemp(prefix='spa-arrow-bench-')
+    try:
+        jsonl_path, arrow_path = build_datasets(args.rows, directory)
+        print(f"rows={args.rows} jsonl={os.path.getsize(jsonl_path) / 2 ** 20:.1f}MB "
+              f"arrow={os.path.getsize(arrow_path) / 2 ** 20:.1f}MB")
+        results = {}
+        for mode, path in (('jsonl', jsonl_path), ('arrow', arrow_path)):
+            output = subprocess.run(
+                [sys.executable, __file__, '--rows', str(args.rows), '--measure', mode, path],
+                check=True, capture_output=True, text=True
+            ).stdout
+            results[mode] = json.loads(output)
+            print(f"{mode:<6} load={results[mode]['seconds']:.3f}s rss=+{results[mode]['rss_mb']:.1f}MB "
+                  f"rows={results[mode]['rows']}")
+        print(f"speedup: x{results['jsonl']['seconds'] / results['arrow']['seconds']:.1f}, "
+              f"RSS: {results['jsonl']['rss_mb'] / max(results['arrow']['rss_mb'], 0.1):.1f}x nhỏ hơn")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark: độ trễ mỗi lần gọi tool database (mcp-server/tool.py) khi tạo engine mới mỗi lần
+(như trước: create_engine + kết nối mới cho từng lần gọi) so với engine dùng chung có connection pool.
+Đo p50/p95/trung bình của execute_read_query và list_all_tables.
+
+Mặc định dùng file SQLite tạm; đo với database thật (thấy rõ chi phí kết nối/TLS/xác thực) bằng
+các biến môi trường giống container open-webui: DB_TYPE, DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME.
+
+Chạy (cần sqlalchemy, pydantic, python-dotenv và driver của database):
+    python benchmarks/bench_db_tool.py --calls 200
+    DB_TYPE=postgresql DB_HOST=localhost DB_PORT=5432 DB_USER=postgres DB_PASSWORD=postgres DB_NAME=spa \\
+        python benchmarks/bench_db_tool.py
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'mcp-server'))
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+def create_sqlite_db(path: str) -> None:
+    """Database nhỏ có vài bảng để list_all_tables / execute_read_query có dữ liệu trả về"""
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT, phone TEXT)')
+    conn.execute('CREATE TABLE appointments (id INTEGER PRIMARY KEY, customer_id INTEGER, service TEXT)')
+    conn.executemany('INSERT INTO customers (name, phone) VALUES (?, ?)',
+                     [(f'Khách {i}', f'09{i:08d}') for i in range(100)])
+    conn.commit()
+    conn.close()
+
+def measure(call: Callable[[], str], calls: int, reset: Callable[[], None] = None) -> Dict[str, float]:
+    """Thời gian (ms) từng lần gọi; reset chạy trước mỗi lần và không tính giờ"""
+    durations = []
+    for _ in range(calls):
+        if reset is not None:
+            reset()
+        started = time.perf_counter()
+        output = call()
+        durations.append((time.perf_counter() - started) * 1000)
+        if output.startswith('Error'):
+            raise RuntimeError(output)
+    return {
+        'p50': percentile(durations, 0.5),
+        'p95': percentile(durations, 0.95),
+        'mean': statistics.mean(durations)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=100)
+    parser.add_argument('--query', default='SELECT 1')
+    args = parser.parse_args()
+
+    work_dir = None
+    if not os.getenv('DB_TYPE'):
+        work_dir = tempfile.mkdtemp(prefix='spa-db-bench-')
+        os.environ['DB_TYPE'] = 'sqlite'
+        os.environ['DB_NAME'] = os.path.join(work_dir, 'bench.db')
+        create_sqlite_db(os.environ['DB_NAME'])
+    # tool.py đọc DB_PORT lúc import
+    os.environ.setdefault('DB_PORT', '0')
+    import tool
+
+    tools = tool.Tools()
+    db_name = tools.valves.db_name
+    cases = {
+        'execute_read_query': lambda: tools.execute_read_query(args.query),
+        'list_all_tables': lambda: tools.list_all_tables(db_name)
+    }
+    # Các method in ra mỗi lần gọi; tắt để không tính thời gian in
+    stdout = sys.stdout
+    results = {}
+    try:
+        sys.stdout = open(os.devnull, 'w')
+        for name, call in cases.items():
+            call()
+            # Trước: bỏ engine sau mỗi lần gọi, lần sau phải tạo engine và kết nối mới
+            results[(name, 'engine mỗi lần gọi')] = measure(call, args.calls, reset=tool.dispose_engines)
+            tool.dispose_engines()
+            call()
+            results[(name, 'engine dùng chung')] = measure(call, args.calls)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        tool.dispose_engines()
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"Database: {tools.valves.db_type}, {args.calls} lần gọi mỗi trường hợp")
+    print(f"{'method':<20} {'engine':<20} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9}")
+    for (name, mode), stats in results.items():
+        print(f"{name:<20} {mode:<20} {stats['p50']:>9.2f} {stats['p95']:>9.2f} {stats['mean']:>9.2f}")
+
+if __name__ == '__main__':
+    main()
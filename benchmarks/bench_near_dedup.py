@@ -0,0 +1,115 @@
+"""
+Benchmark: lọc gần trùng MinHash/LSH (DedupBatch + NearDupIndex) theo số cặp hội thoại
+Sinh các cặp khác nhau và chèn biến thể gần trùng (thêm từ đệm, bỏ dấu, đổi hoa/thường),
+đo thời gian, tỉ lệ tăng theo n (gần tuyến tính thay vì bình phương) và recall/precision.
+
+Chạy:
+    python benchmarks/bench_near_dedup.py --rows 10000 100000 1000000
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'scripts'))
+
+from dedup_index import DedupIndex  # noqa: E402
+from near_dedup import NearDupIndex, DEFAULT_THRESHOLD  # noqa: E402
+
+CHUNK_ROWS = 10000
+SERVICES = ['massage chân', 'massage body', 'chăm sóc da mặt', 'gội đầu dưỡng sinh', 'tắm trắng',
+            'triệt lông', 'xông hơi', 'trị mụn', 'nối mi', 'làm móng']
+QUESTIONS = ['Giá {s} gói số {n}?', 'Gói {s} số {n} kéo dài bao lâu?', 'Đặt lịch {s} gói số {n} thế nào?']
+ANSWERS = ['Gói {s} số {n} có giá {p}.000đ ạ', 'Gói {s} số {n} kéo dài {m} phút ạ',
+           'Anh/chị gọi hotline hoặc nhắn tin để đặt gói {s} số {n} ạ']
+FILLERS = ['Cho em hỏi ', 'Dạ ', 'Chị ơi ', 'Cho mình hỏi ']
+ENDINGS = [' ạ', ' vậy ạ', ' nhé', ' với ạ']
+ACCENTS = str.maketrans('àáảãạăằắẳẵặâầấẩẫậèéẻẽẹêềếểễệìíỉĩịòóỏõọôồốổỗộơờớởỡợùúủũụưừứửữựỳýỷỹỵđ',
+                        'aaaaaaaaaaaaaaaaaeeeeeeeeeeeiiiiiooooooooooooooooouuuuuuuuuuuyyyyyd')
+
+def variant(question: str, rng: random.Random) -> str:
+    """Biến thể gõ khác của cùng câu hỏi"""
+    choice = rng.randrange(3)
+    if choice == 0:
+        return rng.choice(FILLERS) + question[0].lower() + question[1:].rstrip('?') + rng.choice(ENDINGS)
+    if choice == 1:
+        return question.lower().translate(ACCENTS)
+    return question.upper()
+
+def generate(rows: int, duplicate_ratio: float, seed: int = 0) -> pd.DataFrame:
+    """rows cặp, trong đó khoảng duplicate_ratio là biến thể gần trùng của một cặp trước đó"""
+    rng = random.Random(seed)
+    users, assistants, originals = [], [], []
+    for i in range(rows):
+        if originals and rng.random() < duplicate_ratio:
+            question, answer = originals[rng.randrange(len(originals))]
+            users.append(variant(question, rng))
+            assistants.append(answer)
+            continue
+        kind = rng.randrange(len(QUESTIONS))
+        values = {'s': rng.choice(SERVICES), 'n': i, 'p': rng.randrange(100, 999), 'm': rng.randrange(30, 120)}
+        question, answer = QUESTIONS[kind].format(**values), ANSWERS[kind].format(**values)
+        originals.append((question, answer))
+        users.append(question)
+        assistants.append(answer)
+    return pd.DataFrame({'user_message': users, 'assistant_message': assistants}), len(originals)
+
+def run(rows: int, threshold: float, duplicate_ratio: float) -> dict:
+    frame, originals = generate(rows, duplicate_ratio)
+    directory = tempfile.mkdtemp(prefix='spa-near-dedup-')
+    try:
+        canonical_path = os.path.join(directory, 'canonical.jsonl')
+        near_dup = NearDupIndex(os.path.join(directory, 'minhash.bin'), canonical_path, threshold=threshold)
+        batch = DedupIndex(os.path.join(directory, 'hashes.bin'), canonical_path, near_dup).begin()
+        started = time.perf_counter()
+        kept = 0
+        for start in range(0, rows, CHUNK_ROWS):
+            new_chunk, _ = batch.filter(frame.iloc[start:start + CHUNK_ROWS])
+            kept += len(new_chunk)
+        elapsed = time.perf_counter() - started
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    injected = rows - originals
+    removed = batch.near_dup.duplicates + batch.duplicates
+    return {
+        'rows': rows,
+        'seconds': round(elapsed, 2),
+        'rows_per_second': round(rows / elapsed),
+        'injected_duplicates': injected,
+        'removed': removed,
+        'kept': kept,
+        # Mỗi cặp gốc đều khác nhau nên số cặp giữ lại vượt số gốc là biến thể bị sót
+        'recall': round(1 - max(kept - originals, 0) / injected, 4) if injected else None,
+        'false_removals': max(originals - kept, 0)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--duplicate-ratio', type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = []
+    for rows in args.rows:
+        result = run(rows, args.threshold, args.duplicate_ratio)
+        if results:
+            previous = results[-1]
+            # ~1 nếu tuyến tính, ~2 nếu so sánh từng cặp
+            result['scaling_exponent'] = round(
+                __import__('math').log(result['seconds'] / previous['seconds']) /
+                __import__('math').log(rows / previous['rows']), 2)
+        results.append(result)
+        print(f"rows={rows:<8} {result['seconds']:>7.2f}s {result['rows_per_second']:>7} rows/s "
+              f"recall={result['recall']} false_removals={result['false_removals']}")
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
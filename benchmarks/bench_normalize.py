@@ -0,0 +1,76 @@
+"""
+Benchmark: normalize_conversation (từng dòng) so với normalize_frame (vector hóa)
+
+Chạy:
+    python benchmarks/bench_normalize.py --rows 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'scripts'))
+
+from normalizer import normalize_conversation, normalize_frame, frame_to_jsonl  # noqa: E402
+
+SAMPLES_FILE = os.path.join(ROOT_DIR, 'data', 'test_samples.csv')
+
+def build_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Nhân bản test_samples.csv thành DataFrame có số dòng mong muốn, kèm dòng lỗi"""
+    samples = pd.read_csv(SAMPLES_FILE, dtype=str).to_dict('records')
+    rng = random.Random(seed)
+    noise = [float('nan'), '', '   ', 'NaN']
+    user_msgs, assistant_msgs = [], []
+    for i in range(rows):
+        sample = samples[i % len(samples)]
+        user_msg = f"  {sample['user_message']} #{i} "
+        assistant_msg = sample['assistant_message']
+        if rng.random() < 0.05:
+            user_msg = rng.choice(noise)
+        user_msgs.append(user_msg)
+        assistant_msgs.append(assistant_msg)
+    return pd.DataFrame({'user_message': user_msgs, 'assistant_message': assistant_msgs}, dtype=object)
+
+def legacy_jsonl(df: pd.DataFrame) -> str:
+    """Đường xử lý cũ: to_dict('records') + normalize_conversation + json.dumps từng dòng"""
+    normalized = normalize_conversation(df.to_dict('records'))
+    return ''.join(json.dumps(item, ensure_ascii=False) + '\n' for item in normalized)
+
+def vectorized_jsonl(df: pd.DataFrame) -> str:
+    return frame_to_jsonl(normalize_frame(df))
+
+def timed(func, *args, repeat: int = 3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = build_frame(args.rows)
+    legacy_time, legacy_output = timed(legacy_jsonl, df, repeat=args.repeat)
+    vector_time, vector_output = timed(vectorized_jsonl, df, repeat=args.repeat)
+
+    print(f"rows:        {args.rows}")
+    print(f"legacy:      {legacy_time:.3f}s")
+    print(f"vectorized:  {vector_time:.3f}s")
+    print(f"speedup:     {legacy_time / vector_time:.1f}x")
+    print(f"identical:   {legacy_output == vector_output}")
+    if legacy_output != vector_output:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
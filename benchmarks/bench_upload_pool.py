@@ -0,0 +1,88 @@
+"""
+Benchmark: đọc + chuẩn hóa nhiều file upload (CSV/XLSX) bằng UploadPool theo số tiến trình
+Mô phỏng các chi nhánh gửi cùng lúc nhiều file export; đo thời gian tới khi tiến trình chính
+nhận hết các chunk đã chuẩn hóa (theo thứ tự file) và hệ số tăng tốc so với 1 tiến trình.
+
+Chạy:
+    python benchmarks/bench_upload_pool.py --files 24 --rows 20000 --workers 1 2 4 8
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'scripts'))
+
+from upload_pool import UploadPool  # noqa: E402
+
+CHUNK_ROWS = 10000
+
+def build_files(directory: str, files: int, rows: int, xlsx_ratio: float) -> list:
+    """Sinh các file export, một phần là XLSX (đọc chậm hơn CSV nhiều)"""
+    entries = []
+    xlsx_files = round(files * xlsx_ratio)
+    for index in range(files):
+        frame = pd.DataFrame({
+            'user_message': [f'Chi nhánh {index}: câu hỏi số {i} về dịch vụ spa' for i in range(rows)],
+            'assistant_message': [f'Chi nhánh {index}: trả lời số {i}, giá {i % 900 + 100}.000đ ạ' for i in range(rows)]
+        })
+        if index < xlsx_files:
+            path = os.path.join(directory, f'branch_{index}.xlsx')
+            frame.to_excel(path, index=False)
+        else:
+            path = os.path.join(directory, f'branch_{index}.csv')
+            frame.to_csv(path, index=False)
+        entries.append({'file': os.path.basename(path), 'path': path})
+    return entries
+
+def run(entries: list, workers: int, work_dir: str) -> dict:
+    pool = UploadPool(workers)
+    try:
+        # Khởi động tiến trình con trước khi đo
+        list(pool.process([dict(entries[0])], work_dir, CHUNK_ROWS))
+        batch = [dict(entry) for entry in entries]
+        started = time.perf_counter()
+        rows = sum(len(chunk) for chunk in pool.process(batch, work_dir, CHUNK_ROWS))
+        elapsed = time.perf_counter() - started
+    finally:
+        pool.close()
+    return {
+        'workers': workers,
+        'seconds': round(elapsed, 2),
+        'rows': rows,
+        'rows_per_second': round(rows / elapsed),
+        'errors': sum(1 for entry in batch if 'error' in entry)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=24)
+    parser.add_argument('--rows', type=int, default=20000, help='Số dòng mỗi file')
+    parser.add_argument('--xlsx-ratio', type=float, default=0.25)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='spa-upload-bench-')
+    try:
+        entries = build_files(directory, args.files, args.rows, args.xlsx_ratio)
+        work_dir = os.path.join(directory, 'work')
+        os.makedirs(work_dir)
+        results = []
+        for workers in sorted(set(args.workers)):
+            result = run(entries, workers, work_dir)
+            result['speedup'] = round(results[0]['seconds'] / result['seconds'], 2) if results else 1.0
+            results.append(result)
+            print(f"workers={workers:<3} {result['seconds']:>7.2f}s {result['rows_per_second']:>9} rows/s "
+                  f"x{result['speedup']:.2f}")
+        print(json.dumps(results, indent=2))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
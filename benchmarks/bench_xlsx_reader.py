@@ -0,0 +1,103 @@
+"""
+Benchmark: đọc file XLSX lớn bằng pd.read_excel (dựng toàn bộ workbook) so với
+read_xlsx_chunks (openpyxl read-only, duyệt từng dòng, chỉ lấy hai cột cần thiết).
+Đo thời gian đọc + chuẩn hóa và RSS tối đa của mỗi cách trong tiến trình riêng,
+đồng thời kiểm tra hai cách cho cùng kết quả chuẩn hóa.
+
+Chạy:
+    python benchmarks/bench_xlsx_reader.py --rows 200000
+"""
+import argparse
+import hashlib
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import openpyxl
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'scripts'))
+
+from normalizer import frame_to_jsonl, normalize_frame  # noqa: E402
+from upload_pool import read_xlsx_chunks  # noqa: E402
+
+CHUNK_ROWS = 10000
+
+def build_workbook(path: str, rows: int) -> None:
+    """Sinh file export giống Google Sheets: thêm vài cột không dùng tới, một số ô trống"""
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(['timestamp', 'branch', 'user_message', 'assistant_message', 'note'])
+    for i in range(rows):
+        sheet.append([
+            f'2024-01-{i % 28 + 1:02d} 10:00:00',
+            f'Chi nhánh {i % 12}',
+            f'Câu hỏi số {i} về gói massage chân và chăm sóc da mặt?' if i % 50 else None,
+            f'Dạ gói số {i} có giá {i % 900 + 100}.000đ, thời gian 60 phút ạ',
+            'ghi chú' if i % 3 == 0 else None
+        ])
+    workbook.save(path)
+
+def load_read_excel(path: str):
+    df = pd.read_excel(path)
+    for start in range(0, len(df), CHUNK_ROWS):
+        yield normalize_frame(df.iloc[start:start + CHUNK_ROWS])
+
+def load_streaming(path: str):
+    for chunk, _ in read_xlsx_chunks(path, CHUNK_ROWS):
+        yield normalize_frame(chunk)
+
+def measure(mode: str, path: str) -> None:
+    """Chạy trong tiến trình con để RSS của mỗi cách đọc được đo riêng"""
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    digest = hashlib.sha256()
+    rows = 0
+    for normalized in (load_read_excel if mode == 'read_excel' else load_streaming)(path):
+        digest.update(frame_to_jsonl(normalized).encode('utf-8'))
+        rows += len(normalized)
+    print(json.dumps({
+        'seconds': time.perf_counter() - started,
+        'rss_mb': (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_rss) / 1024,
+        'rows': rows,
+        'sha256': digest.hexdigest()
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--measure', nargs=2, metavar=('MODE', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(*args.measure)
+        return
+
+    directory = tempfile.mkdtemp(prefix='spa-xlsx-bench-')
+    try:
+        path = os.path.join(directory, 'export.xlsx')
+        build_workbook(path, args.rows)
+        print(f"rows={args.rows} xlsx={os.path.getsize(path) / 2 ** 20:.1f}MB")
+        results = {}
+        for mode in ('read_excel', 'streaming'):
+            output = subprocess.run(
+                [sys.executable, __file__, '--measure', mode, path],
+                check=True, capture_output=True, text=True
+            ).stdout
+            results[mode] = json.loads(output)
+            print(f"{mode:<10} {results[mode]['seconds']:.2f}s rss=+{results[mode]['rss_mb']:.1f}MB "
+                  f"rows={results[mode]['rows']}")
+        print(f"speedup: x{results['read_excel']['seconds'] / results['streaming']['seconds']:.2f}, "
+              f"RSS: {results['read_excel']['rss_mb'] / max(results['streaming']['rss_mb'], 0.1):.1f}x nhỏ hơn, "
+              f"cùng kết quả: {results['read_excel']['sha256'] == results['streaming']['sha256']}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,353 @@
+"""
+Load test end-to-end: chạy app của main.py (werkzeug threaded, một tiến trình) với server
+Telegram giả lập, gửi webhook theo đúng định dạng sendToWebhook của google-appscript.js
+(và một phần là upload CSV) với tốc độ cố định trong khi giữ N kết nối /events.
+
+Tải dạng open-loop: request thứ k được lên lịch ở t0 + k / rate bất kể các request trước
+đã xong hay chưa, latency tính từ thời điểm lên lịch (không che đi thời gian xếp hàng khi
+server chậm lại). Với mỗi cặp (tốc độ, số kết nối SSE) báo:
+- p50/p95/p99 latency của /webhook/sheets và /upload, số lỗi
+- độ trễ giao event: lúc mỗi client SSE nhận event hoàn tất thứ k (webhook Success /
+  upload completed) so với lúc nhận response thành công thứ k của endpoint đó (event được
+  gửi trước khi trả response nên giá trị âm là bình thường, tăng dần khi client SSE bị chậm)
+- CPU của server (%), CPU cho mỗi request và CPU tăng thêm cho mỗi kết nối SSE
+  (so với cấu hình ít kết nối nhất cùng tốc độ)
+- số tin nhắn server Telegram giả lập nhận được
+
+Chạy:
+    python benchmarks/load_test.py --rates 1 2 5 10 --sse-clients 0 50 200 --duration 20
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import requests
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS_DIR = os.path.join(ROOT_DIR, 'scripts')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_data import generate  # noqa: E402
+
+# Tắt log từng request của werkzeug để không tính chi phí in log vào kết quả
+SERVER_CODE = """
+import logging, os
+import main
+logging.getLogger('werkzeug').setLevel(logging.ERROR)
+main.create_app(multiprocess=False).run(host='127.0.0.1', port=int(os.environ['LOAD_TEST_PORT']), threaded=True)
+"""
+# Event báo request đã xử lý xong, theo endpoint
+DONE_EVENTS = {'webhook': ('webhook', 'Success'), 'upload': ('upload', 'completed')}
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+class TelegramStub:
+    def __init__(self):
+        """Server giả lập API sendMessage của Telegram, chỉ đếm tin nhắn nhận được"""
+        self.messages = 0
+        lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                with lock:
+                    stub.messages += 1
+                body = b'{"ok": true, "result": {}}'
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+def start_server(port: int, data_dir: str, telegram_url: str) -> subprocess.Popen:
+    env = dict(
+        os.environ, DATA_DIR=data_dir, LOAD_TEST_PORT=str(port),
+        TELEGRAM_BOT_TOKEN='load-test', TELEGRAM_CHAT_ID='1', TELEGRAM_API_URL=telegram_url
+    )
+    process = subprocess.Popen(
+        [sys.executable, '-c', SERVER_CODE], cwd=SCRIPTS_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('Server dừng khi khởi động')
+        try:
+            requests.get(f'http://127.0.0.1:{port}/processed-data', timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError('Server không khởi động được')
+
+def cpu_seconds(pid: int) -> Optional[float]:
+    """utime + stime của tiến trình (Linux /proc)"""
+    try:
+        with open(f'/proc/{pid}/stat', 'r') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    except OSError:
+        return None
+
+class SSEClient:
+    def __init__(self, url: str):
+        """Một kết nối /events, ghi lại thời điểm nhận các event hoàn tất"""
+        self.url = url
+        self.received: Dict[str, List[float]] = {endpoint: [] for endpoint in DONE_EVENTS}
+        self.error: Optional[str] = None
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self) -> None:
+        done_events = {value: endpoint for endpoint, value in DONE_EVENTS.items()}
+        try:
+            with requests.get(self.url, stream=True, timeout=(10, 120)) as response:
+                for line in response.iter_lines(decode_unicode=True):
+                    if self.stop.is_set():
+                        return
+                    if not line or not line.startswith('data: '):
+                        continue
+                    event = json.loads(line[len('data: '):])
+                    endpoint = done_events.get((event.get('type'), event.get('status')))
+                    if endpoint:
+                        with self.lock:
+                            self.received[endpoint].append(time.perf_counter())
+        except Exception as e:
+            if not self.stop.is_set():
+                self.error = str(e)
+
+    def take(self) -> Dict[str, List[float]]:
+        with self.lock:
+            received = self.received
+            self.received = {endpoint: [] for endpoint in DONE_EVENTS}
+        return received
+
+class PayloadSource:
+    def __init__(self, rows_per_request: int, total_requests: int, seed: int):
+        """
+        Dữ liệu không lặp lại giữa các request (để mỗi request đều có cặp mới),
+        mỗi dòng như một dòng sheet: ô trống là chuỗi rỗng
+        """
+        frame = generate(rows_per_request * total_requests, seed).fillna('')
+        self.records = frame.to_dict('records')
+        self.rows = rows_per_request
+        self.cursor = 0
+        self.lock = threading.Lock()
+
+    def next_batch(self) -> List[Dict[str, str]]:
+        with self.lock:
+            start = self.cursor % len(self.records)
+            self.cursor += self.rows
+        return self.records[start:start + self.rows]
+
+def webhook_request(session: requests.Session, base_url: str, data: List[Dict[str, str]]) -> requests.Response:
+    """Body giống sendToWebhook: {'data': [{user_message, assistant_message}, ...]}"""
+    payload = {'data': [
+        {'user_message': row['user_message'], 'assistant_message': row['assistant_message']} for row in data
+    ]}
+    return session.post(f'{base_url}/webhook/sheets', json=payload, timeout=120)
+
+def upload_request(session: requests.Session, base_url: str, data: List[Dict[str, str]], index: int
+                   ) -> requests.Response:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=['user_message', 'assistant_message'], extrasaction='ignore')
+    writer.writeheader()
+    writer.writerows(data)
+    files = {'file': (f'load_{index}.csv', buffer.getvalue().encode('utf-8'), 'text/csv')}
+    return session.post(f'{base_url}/upload', files=files, timeout=120)
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+    p50, p95, p99 = np.percentile(np.asarray(values) * 1000, [50, 95, 99])
+    return {'p50_ms': round(float(p50), 1), 'p95_ms': round(float(p95), 1), 'p99_ms': round(float(p99), 1)}
+
+def _ms(stats: Dict[str, Optional[float]]) -> str:
+    return '/'.join('-' if value is None else f'{value:.0f}' for value in stats.values()) + 'ms'
+
+def run_step(base_url: str, server_pid: int, source: PayloadSource, rate: float, duration: float,
+             upload_share: float, clients: List[SSEClient], max_inflight: int) -> Dict[str, Any]:
+    """Gửi request open-loop với tốc độ rate trong duration giây"""
+    local = threading.local()
+    lock = threading.Lock()
+    latencies: Dict[str, List[float]] = {endpoint: [] for endpoint in DONE_EVENTS}
+    responses: Dict[str, List[float]] = {endpoint: [] for endpoint in DONE_EVENTS}
+    errors: Dict[str, int] = {endpoint: 0 for endpoint in DONE_EVENTS}
+    error_samples: List[str] = []
+    upload_every = round(1 / upload_share) if upload_share > 0 else 0
+
+    def send(index: int, scheduled: float) -> None:
+        session = getattr(local, 'session', None) or requests.Session()
+        local.session = session
+        endpoint = 'upload' if upload_every and index % upload_every == upload_every - 1 else 'webhook'
+        data = source.next_batch()
+        try:
+            if endpoint == 'upload':
+                response = upload_request(session, base_url, data, index)
+            else:
+                response = webhook_request(session, base_url, data)
+            error = None if response.status_code == 200 else f'{response.status_code} {response.text[:200]}'
+        except requests.RequestException as e:
+            error = str(e)
+        finished = time.perf_counter()
+        with lock:
+            if error is None:
+                latencies[endpoint].append(finished - scheduled)
+                responses[endpoint].append(finished)
+            else:
+                errors[endpoint] += 1
+                if len(error_samples) < 5:
+                    error_samples.append(f'{endpoint}: {error}')
+
+    for client in clients:
+        client.take()
+    total = int(rate * duration)
+    cpu_before = cpu_seconds(server_pid)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_inflight) as executor:
+        for index in range(total):
+            scheduled = started + index / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(send, index, scheduled)
+    elapsed = time.perf_counter() - started
+    cpu_after = cpu_seconds(server_pid)
+    # Chờ các event cuối tới client SSE
+    time.sleep(1)
+
+    lags = []
+    missed = 0
+    for client in clients:
+        received = client.take()
+        for endpoint in DONE_EVENTS:
+            expected = sorted(responses[endpoint])
+            got = received[endpoint]
+            missed += max(len(expected) - len(got), 0)
+            lags.extend(got_at - response_at for got_at, response_at in zip(got, expected))
+
+    completed = sum(len(values) for values in latencies.values())
+    cpu = None if cpu_before is None or cpu_after is None else cpu_after - cpu_before
+    result = {
+        'rate': rate,
+        'sse_clients': len(clients),
+        'requests': total,
+        'completed': completed,
+        'achieved_rate': round(completed / elapsed, 2),
+        'errors': errors,
+        'error_samples': error_samples,
+        'event_lag': percentiles(lags),
+        'events_missed': missed,
+        'sse_errors': sum(1 for client in clients if client.error),
+        'cpu_seconds': None if cpu is None else round(cpu, 3),
+        'cpu_percent': None if cpu is None else round(cpu / elapsed * 100, 1),
+        'cpu_ms_per_request': None if cpu is None or not completed else round(cpu / completed * 1000, 2),
+        'elapsed': round(elapsed, 2)
+    }
+    for endpoint in DONE_EVENTS:
+        result[endpoint] = percentiles(latencies[endpoint])
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rates', type=float, nargs='+', default=[1, 2, 5, 10], help='Số request mỗi giây')
+    parser.add_argument('--sse-clients', type=int, nargs='+', default=[0, 50, 200],
+                        help='Số kết nối /events giữ mở')
+    parser.add_argument('--duration', type=float, default=20, help='Thời gian đo mỗi cấu hình (giây)')
+    parser.add_argument('--rows', type=int, default=100, help='Số cặp hội thoại mỗi request')
+    parser.add_argument('--upload-share', type=float, default=0.2, help='Tỉ lệ request là upload CSV')
+    parser.add_argument('--max-inflight', type=int, default=64, help='Số request đang chờ tối đa phía client')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Ghi kết quả JSON ra file')
+    args = parser.parse_args()
+
+    # Mỗi cấu hình số kết nối SSE: một request khởi động + các bước tốc độ
+    sse_configs = sorted(set(args.sse_clients))
+    total_requests = len(sse_configs) * (1 + sum(int(rate * args.duration) for rate in args.rates))
+    source = PayloadSource(args.rows, total_requests, args.seed)
+    telegram = TelegramStub()
+    data_dir = tempfile.mkdtemp(prefix='spa-load-test-')
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    server = start_server(port, data_dir, telegram.url)
+    results = []
+    try:
+        for sse_clients in sse_configs:
+            clients = [SSEClient(f'{base_url}/events') for _ in range(sse_clients)]
+            try:
+                # Request khởi động: đảm bảo mọi client SSE đã kết nối và nhận được event
+                webhook_request(requests.Session(), base_url, source.next_batch())
+                deadline = time.time() + 30
+                while time.time() < deadline and any(not client.received['webhook'] for client in clients):
+                    time.sleep(0.1)
+                idle_cpu = cpu_seconds(server.pid)
+                time.sleep(1)
+                idle_cpu = None if idle_cpu is None else cpu_seconds(server.pid) - idle_cpu
+                for rate in args.rates:
+                    messages_before = telegram.messages
+                    result = run_step(base_url, server.pid, source, rate, args.duration, args.upload_share,
+                                      clients, args.max_inflight)
+                    result['idle_cpu_percent'] = None if idle_cpu is None else round(idle_cpu * 100, 1)
+                    result['telegram_messages'] = telegram.messages - messages_before
+                    results.append(result)
+                    print(f"rate={rate:<5} sse={sse_clients:<4} done={result['completed']}/{result['requests']} "
+                          f"webhook p50/p95/p99={_ms(result['webhook'])} upload p50/p95/p99={_ms(result['upload'])} "
+                          f"lag p50/p95/p99={_ms(result['event_lag'])} missed={result['events_missed']} "
+                          f"cpu={result['cpu_percent']}% ({result['cpu_ms_per_request']}ms/req)")
+            finally:
+                for client in clients:
+                    client.stop.set()
+
+        # CPU tăng thêm cho mỗi kết nối SSE so với cấu hình ít kết nối nhất ở cùng tốc độ
+        for result in results:
+            reference = min((other for other in results if other['rate'] == result['rate']),
+                            key=lambda other: other['sse_clients'])
+            extra_clients = result['sse_clients'] - reference['sse_clients']
+            if extra_clients and result['cpu_seconds'] is not None and reference['cpu_seconds'] is not None:
+                result['cpu_ms_per_sse_client'] = round(
+                    (result['cpu_seconds'] - reference['cpu_seconds']) / extra_clients * 1000, 2
+                )
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        telegram.close()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
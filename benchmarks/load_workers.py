@@ -0,0 +1,174 @@
+"""
+Load test: throughput của /webhook/sheets theo số worker (gunicorn, chế độ nhiều worker)
+Đồng thời mở các kết nối /events để kiểm tra mỗi client SSE nhận đủ event,
+bất kể request được worker nào xử lý. --workers 0 chạy một tiến trình (MULTI_WORKER=0, bus cục bộ)
+để so sánh với chế độ nhiều worker.
+
+Xử lý webhook chủ yếu là CPU (chuẩn hóa, lọc trùng, ghi file) nên throughput chỉ tăng theo số worker
+khi máy có đủ core: số worker lớn hơn số CPU chỉ thêm chi phí chuyển ngữ cảnh và tranh khóa SQLite.
+Kết quả đo (--workers 0 1 2 4 --duration 10, 16 client, 500 cặp/webhook) trên máy 1 vCPU Intel Xeon,
+5GB RAM, Python 3.11:
+    workers=0  12.5 req/s  p50 1271ms  p95 1486ms
+    workers=1  11.4 req/s  p50 1343ms  p95 1859ms
+    workers=2  11.2 req/s  p50 1081ms  p95 2300ms
+    workers=4   9.1 req/s  p50 1739ms  p95 2590ms
+Throughput không tăng (giảm ở 4 worker), mọi client SSE nhận đủ event. Máy này không chứng minh được
+khả năng mở rộng; đo lại trên máy nhiều core trước khi tăng số worker.
+
+Chạy:
+    pip install gunicorn
+    python benchmarks/load_workers.py --workers 0 1 2 4 --duration 10
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS_DIR = os.path.join(ROOT_DIR, 'scripts')
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_server(workers: int, port: int, data_dir: str) -> subprocess.Popen:
+    """
+    Chạy gunicorn với app factory ở chế độ nhiều worker (workers = 0: một tiến trình, bus cục bộ),
+    chờ tới khi nhận request
+    """
+    env = dict(os.environ, MULTI_WORKER='1' if workers else '0', DATA_DIR=data_dir,
+               TELEGRAM_BOT_TOKEN='', TELEGRAM_CHAT_ID='')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(max(workers, 1)), '-k', 'gthread', '--threads', '8',
+         '-b', f'127.0.0.1:{port}', '--log-level', 'warning', 'main:create_app()'],
+        cwd=SCRIPTS_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            requests.get(f'http://127.0.0.1:{port}/processed-data', timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError('gunicorn không khởi động được')
+
+def sse_client(url: str, stop: threading.Event, received: list) -> None:
+    """Đếm các event webhook 'Success' nhận được qua SSE"""
+    with requests.get(url, stream=True, timeout=(5, 30)) as response:
+        for line in response.iter_lines(decode_unicode=True):
+            if stop.is_set():
+                return
+            if line and line.startswith('data: '):
+                event = json.loads(line[len('data: '):])
+                if event.get('type') == 'webhook' and event.get('status') == 'Success':
+                    received.append(event)
+
+def run_load(base_url: str, clients: int, duration: float, rows: int) -> dict:
+    """Gửi webhook (dữ liệu không trùng) từ nhiều luồng trong duration giây"""
+    counter = iter(range(10 ** 9))
+    lock = threading.Lock()
+    latencies = []
+    errors = [0]
+    deadline = time.time() + duration
+
+    def client() -> None:
+        session = requests.Session()
+        while time.time() < deadline:
+            with lock:
+                batch = next(counter)
+            data = [
+                {'user_message': f'Câu hỏi {batch}-{i}', 'assistant_message': f'Trả lời {batch}-{i}'}
+                for i in range(rows)
+            ]
+            started = time.perf_counter()
+            response = session.post(f'{base_url}/webhook/sheets', json={'data': data}, timeout=60)
+            with lock:
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'throughput': len(latencies) / elapsed,
+        'p50_ms': latencies[len(latencies) // 2] * 1000 if latencies else None,
+        'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000 if latencies else None
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=16, help='Số luồng gửi request đồng thời')
+    parser.add_argument('--duration', type=float, default=10, help='Thời gian đo cho mỗi cấu hình (giây)')
+    parser.add_argument('--rows', type=int, default=500, help='Số cặp hội thoại mỗi webhook')
+    parser.add_argument('--sse-clients', type=int, default=4)
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    print(f"Máy đo: {cpus} CPU ({platform.processor() or platform.machine()}), Python {platform.python_version()}")
+    if max(args.workers) > cpus:
+        print(f"Lưu ý: số worker lớn hơn số CPU ({cpus}), throughput không thể tăng theo số worker")
+
+    results = []
+    baseline = None
+    for workers in args.workers:
+        data_dir = tempfile.mkdtemp(prefix='spa-load-')
+        port = free_port()
+        server = start_server(workers, port, data_dir)
+        base_url = f'http://127.0.0.1:{port}'
+        stop = threading.Event()
+        received = [[] for _ in range(args.sse_clients)]
+        sse_threads = [
+            threading.Thread(target=sse_client, args=(f'{base_url}/events', stop, received[i]), daemon=True)
+            for i in range(args.sse_clients)
+        ]
+        try:
+            for thread in sse_threads:
+                thread.start()
+            time.sleep(1)
+            result = run_load(base_url, args.clients, args.duration, args.rows)
+            # Chờ các event cuối tới client SSE
+            time.sleep(1)
+            stop.set()
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+        baseline = baseline or result['throughput']
+        result.update({
+            'workers': workers,
+            'cpus': cpus,
+            'speedup': result['throughput'] / baseline if baseline else None,
+            'sse_received': [len(events) for events in received]
+        })
+        results.append(result)
+        print(f"workers={workers:<2} requests={result['requests']:<5} errors={result['errors']:<3} "
+              f"throughput={result['throughput']:.1f} req/s (x{result['speedup']:.2f}) "
+              f"p50={result['p50_ms']:.0f}ms p95={result['p95_ms']:.0f}ms "
+              f"sse={result['sse_received']}")
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""
+Bộ benchmark các bước nhận dữ liệu: chuẩn hóa (normalize_conversation, normalize_frame),
+đọc file upload theo chunk, toàn bộ process_data (lọc trùng, gần trùng, chia train/eval,
+packing, Arrow) và ghi log (LogManager.add_log) trên dataset giả lập 1k / 100k / 1M dòng
+sinh từ data/test_samples.csv (benchmarks/synthetic_data.py).
+
+Mỗi lần đo chạy trong một tiến trình riêng với thư mục dữ liệu mới: thời gian là lần nhanh nhất
+trong --repeat lần, bộ nhớ là RSS tối đa tăng thêm so với lúc dữ liệu đầu vào đã nạp xong.
+Kết quả được ghi thành JSON trong benchmarks/results/ và so với baseline đã lưu: bước nào chậm
+hơn hoặc tốn bộ nhớ hơn baseline quá --threshold (mặc định 20%) bị báo regression (exit code 1).
+Baseline phụ thuộc máy chạy nên không commit, lưu lại bằng --save-baseline trên cùng máy.
+
+Chạy:
+    python benchmarks/run_suite.py --save-baseline                 # đo và lưu baseline
+    python benchmarks/run_suite.py                                 # đo và so với baseline
+    python benchmarks/run_suite.py --sizes 1k 100k --cases normalize_frame add_log --repeat 1
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'scripts'))
+
+from normalizer import frame_to_jsonl, normalize_conversation, normalize_frame  # noqa: E402
+from synthetic_data import SIZES, write_dataset  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT_DIR, 'benchmarks', 'results')
+BASELINE_FILE = os.path.join(RESULTS_DIR, 'baseline.json')
+CHUNK_ROWS = 10000
+# Chênh lệch nhỏ hơn các ngưỡng này là nhiễu đo, không tính là regression
+MIN_SECONDS_DELTA = 0.05
+MIN_RSS_MB_DELTA = 5.0
+
+def _read_records(csv_path: str, work_dir: str) -> List[Dict[str, Any]]:
+    return pd.read_csv(csv_path, dtype=str).to_dict('records')
+
+def _read_frame(csv_path: str, work_dir: str) -> pd.DataFrame:
+    return pd.read_csv(csv_path, dtype=str)
+
+def _run_normalize_conversation(records: List[Dict[str, Any]]) -> int:
+    return len(normalize_conversation(records))
+
+def _run_normalize_frame(df: pd.DataFrame) -> int:
+    return len(frame_to_jsonl(normalize_frame(df)))
+
+def _prepare_read_chunks(csv_path: str, work_dir: str) -> Tuple[Callable, str]:
+    from upload_pool import read_chunks
+    return read_chunks, csv_path
+
+def _run_read_chunks(prepared: Tuple[Callable, str]) -> int:
+    read_chunks, csv_path = prepared
+    return sum(len(normalize_frame(chunk)) for chunk, _ in read_chunks(csv_path, CHUNK_ROWS))
+
+def _prepare_process_data(csv_path: str, work_dir: str) -> Tuple[Any, List[Dict[str, Any]]]:
+    # main đọc cấu hình lúc import: trỏ DATA_DIR vào thư mục tạm của lần đo này
+    os.environ['DATA_DIR'] = os.path.join(work_dir, 'data')
+    import main
+    return main, _read_records(csv_path, work_dir)
+
+def _run_process_data(prepared: Tuple[Any, List[Dict[str, Any]]]) -> int:
+    main, records = prepared
+    jsonl_path, _, error = main.process_data(records)
+    if error:
+        raise RuntimeError(error)
+    return len(main.dedup_index)
+
+def _prepare_add_log(csv_path: str, work_dir: str) -> Tuple[Any, List[str]]:
+    from log_manager import LogManager
+    messages = _read_frame(csv_path, work_dir)['user_message'].fillna('').tolist()
+    return LogManager(os.path.join(work_dir, 'logs')), messages
+
+def _run_add_log(prepared: Tuple[Any, List[str]]) -> int:
+    """Mỗi dòng một log upload như khi báo tiến độ; tính cả thời gian ghi hết xuống đĩa"""
+    log_manager, messages = prepared
+    for index, message in enumerate(messages):
+        log_manager.add_log('upload', {
+            'status': 'processing',
+            'message': f'Đã xử lý {index} dòng: {message[:80]}',
+            'progress': index * 100 // len(messages),
+            'status_class': 'warning'
+        })
+    log_manager.close()
+    return len(messages)
+
+# Tên bước -> (chuẩn bị đầu vào, không tính giờ; chạy bước cần đo)
+CASES: Dict[str, Tuple[Callable[[str, str], Any], Callable[[Any], int]]] = {
+    'normalize_conversation': (_read_records, _run_normalize_conversation),
+    'normalize_frame': (_read_frame, _run_normalize_frame),
+    'read_chunks': (_prepare_read_chunks, _run_read_chunks),
+    'process_data': (_prepare_process_data, _run_process_data),
+    'add_log': (_prepare_add_log, _run_add_log)
+}
+
+def measure(case: str, csv_path: str, work_dir: str) -> None:
+    """Chạy trong tiến trình con: in JSON thời gian và RSS tăng thêm của một bước"""
+    prepare, run = CASES[case]
+    prepared = prepare(csv_path, work_dir)
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    output = run(prepared)
+    print(json.dumps({
+        'seconds': time.perf_counter() - started,
+        'rss_mb': (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_rss) / 1024,
+        'output': output
+    }))
+
+def run_case(case: str, csv_path: str, repeat: int) -> Dict[str, Any]:
+    runs = []
+    for _ in range(repeat):
+        work_dir = tempfile.mkdtemp(prefix='spa-suite-')
+        try:
+            output = subprocess.run(
+                [sys.executable, __file__, '--measure', case, csv_path, work_dir],
+                check=True, capture_output=True, text=True
+            ).stdout
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        # Dòng JSON cuối cùng (các module có thể in thêm thông tin lúc khởi tạo)
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        'seconds': round(min(run['seconds'] for run in runs), 4),
+        'rss_mb': round(min(run['rss_mb'] for run in runs), 1),
+        'output': runs[0]['output']
+    }
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """Các bước chậm hơn / tốn bộ nhớ hơn baseline quá threshold (bỏ qua chênh lệch nhỏ)"""
+    previous = {(result['case'], result['size']): result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        before = previous.get((result['case'], result['size']))
+        if before is None:
+            continue
+        for metric, min_delta in (('seconds', MIN_SECONDS_DELTA), ('rss_mb', MIN_RSS_MB_DELTA)):
+            delta = result[metric] - before[metric]
+            if delta > min_delta and result[metric] > before[metric] * (1 + threshold):
+                regressions.append({
+                    'case': result['case'],
+                    'size': result['size'],
+                    'metric': metric,
+                    'baseline': before[metric],
+                    'current': result[metric],
+                    'change': f'+{delta / max(before[metric], 1e-9) * 100:.0f}%'
+                })
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=list(SIZES))
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true', help='Ghi kết quả lần chạy này làm baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Mức tăng tối đa so với baseline (0.2 = 20%%)')
+    parser.add_argument('--measure', nargs=3, metavar=('CASE', 'CSV', 'WORK_DIR'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(*args.measure)
+        return
+
+    data_dir = tempfile.mkdtemp(prefix='spa-suite-data-')
+    results = []
+    try:
+        for size in args.sizes:
+            csv_path = write_dataset(os.path.join(data_dir, f'{size}.csv'), SIZES[size], args.seed)
+            for case in args.cases:
+                result = {'case': case, 'size': size, 'rows': SIZES[size]}
+                result.update(run_case(case, csv_path, args.repeat))
+                result['rows_per_second'] = round(result['rows'] / max(result['seconds'], 1e-9))
+                results.append(result)
+                print(f"{case:<24} {size:>5} {result['seconds']:>9.3f}s {result['rows_per_second']:>10} rows/s "
+                      f"rss=+{result['rss_mb']:.1f}MB")
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    report = {
+        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'machine': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'repeat': args.repeat,
+        'seed': args.seed,
+        'results': results
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output_path = os.path.join(RESULTS_DIR, f"run_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Kết quả: {output_path}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        shutil.copyfile(output_path, args.baseline)
+        print(f"Đã lưu baseline: {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print('Chưa có baseline, chạy lại với --save-baseline để lưu')
+        return
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression['case']} {regression['size']} {regression['metric']}: "
+              f"{regression['baseline']} -> {regression['current']} ({regression['change']})")
+    print(f"So với baseline {baseline['created_at']}: "
+          f"{'OK' if not regressions else f'{len(regressions)} regression'} (ngưỡng {args.threshold:.0%})")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == '__main__':
+    main()
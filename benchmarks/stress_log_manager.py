@@ -0,0 +1,114 @@
+"""
+Stress test: nhiều tiến trình, mỗi tiến trình nhiều luồng cùng gọi LogManager.add_log
+trên cùng một thư mục logs, sau đó kiểm tra không mất / không trùng entry nào.
+
+Chạy:
+    python benchmarks/stress_log_manager.py --processes 4 --threads 8 --entries 500
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'scripts'))
+
+from log_manager import LogManager  # noqa: E402
+
+LOG_TYPE = 'upload'
+
+def writer_process(log_dir: str, process_index: int, threads: int, entries: int) -> None:
+    """Một tiến trình ghi: nhiều luồng add_log, flush theo lô nhỏ để các tiến trình ghi xen kẽ"""
+    log_manager = LogManager(log_dir, flush_interval=0.01, flush_batch_size=10)
+
+    def write(thread_index: int) -> None:
+        for seq in range(entries):
+            log_manager.add_log(LOG_TYPE, {
+                'status': 'stress',
+                'writer': f'{process_index}-{thread_index}',
+                'seq': seq
+            })
+
+    workers = [threading.Thread(target=write, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    log_manager.close()
+
+    # Chỉ mục của tiến trình phải khớp với file: đọc lại toàn bộ qua get_logs_page
+    page = log_manager.get_logs_page(LOG_TYPE, 0, 10 ** 9)
+    if page['total'] != len(page['entries']) or any('writer' not in entry for entry in page['entries']):
+        raise SystemExit(f'process {process_index}: chỉ mục không khớp với file')
+
+def verify(log_dir: str, processes: int, threads: int, entries: int) -> dict:
+    """Đọc file logs và status, đếm entry mất/trùng/hỏng"""
+    seen = {}
+    corrupt = 0
+    with open(os.path.join(log_dir, f'{LOG_TYPE}_logs.jsonl'), 'rb') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                corrupt += 1
+                continue
+            key = (entry['writer'], entry['seq'])
+            seen[key] = seen.get(key, 0) + 1
+    expected = {
+        (f'{p}-{t}', seq)
+        for p in range(processes) for t in range(threads) for seq in range(entries)
+    }
+    with open(os.path.join(log_dir, f'{LOG_TYPE}_status.json'), 'r', encoding='utf-8') as f:
+        json.load(f)
+
+    # Một LogManager mới nạp lại file phải thấy đủ entry
+    reloaded = LogManager(log_dir)
+    total = reloaded.get_logs_page(LOG_TYPE, 0, 1)['total']
+    reloaded.close()
+    return {
+        'expected': len(expected),
+        'written': sum(seen.values()),
+        'missing': len(expected - set(seen)),
+        'duplicated': sum(1 for count in seen.values() if count > 1),
+        'corrupt_lines': corrupt,
+        'reloaded_total': total
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--entries', type=int, default=500, help='Số entry mỗi luồng ghi')
+    args = parser.parse_args()
+
+    log_dir = tempfile.mkdtemp(prefix='spa-logs-stress-')
+    try:
+        started = time.perf_counter()
+        processes = [
+            multiprocessing.Process(target=writer_process, args=(log_dir, i, args.threads, args.entries))
+            for i in range(args.processes)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+
+        result = verify(log_dir, args.processes, args.threads, args.entries)
+        result['failed_processes'] = sum(1 for process in processes if process.exitcode != 0)
+        result['seconds'] = round(elapsed, 2)
+        print(json.dumps(result, indent=2))
+        ok = (result['missing'] == 0 and result['duplicated'] == 0 and result['corrupt_lines'] == 0
+              and result['reloaded_total'] == result['expected'] and result['failed_processes'] == 0)
+        print('OK' if ok else 'FAILED')
+        sys.exit(0 if ok else 1)
+    finally:
+        shutil.rmtree(log_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Sinh dataset hỏi/đáp tiếng Việt giả lập từ data/test_samples.csv cho benchmark
+Mỗi dòng lấy một cặp mẫu rồi biến đổi giống tin nhắn thật của khách: lời chào, xưng hô,
+chi nhánh, khung giờ, giá; xen một phần dòng lỗi lấy từ file mẫu và một phần nhỏ dòng trùng
+hẳn / gần trùng (bỏ dấu, khác hoa thường) như dữ liệu export nhiều lần từ Google Sheets.
+Cùng seed luôn cho cùng dữ liệu.
+
+Chạy:
+    python benchmarks/synthetic_data.py --rows 100000 --output /tmp/spa_100k.csv
+"""
+import argparse
+import os
+import random
+import unicodedata
+
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLES_FILE = os.path.join(ROOT_DIR, 'data', 'test_samples.csv')
+
+# Kích thước dataset chuẩn của bộ benchmark
+SIZES = {'1k': 1000, '100k': 100000, '1m': 1000000}
+
+GREETINGS = ['', '', 'Chào em, ', 'Cho chị hỏi ', 'Dạ ', 'Shop ơi ', 'Em ơi cho anh hỏi ', 'Hi spa, ']
+ENDINGS = ['', '', ' ạ', ' nhé', ' vậy em', '?', ' với ạ', ' không em']
+BRANCHES = ['Quận 1', 'Quận 3', 'Quận 7', 'Thủ Đức', 'Gò Vấp', 'Bình Thạnh', 'Hà Đông', 'Cầu Giấy', 'Đà Nẵng']
+SERVICES = [
+    'massage body', 'massage chân', 'chăm sóc da mặt', 'gội đầu dưỡng sinh', 'tắm trắng',
+    'triệt lông', 'xông hơi', 'đắp mặt nạ vàng', 'massage đá nóng'
+]
+TITLES = ['anh', 'chị', 'anh/chị', 'bạn']
+# Tỉ lệ dòng lấy từ các cặp lỗi/quá ngắn của file mẫu (thiếu câu trả lời, "abc", "ok"...)
+JUNK_RATE = 0.05
+# Tỉ lệ dòng trùng hẳn / gần trùng với một dòng trước đó
+EXACT_DUP_RATE = 0.02
+NEAR_DUP_RATE = 0.03
+
+def _strip_accents(text: str) -> str:
+    text = unicodedata.normalize('NFD', text).replace('đ', 'd').replace('Đ', 'D')
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+def generate(rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Returns:
+        DataFrame: Hai cột user_message, assistant_message (dtype object, có NaN như file gốc)
+    """
+    samples = pd.read_csv(SAMPLES_FILE, dtype=str).to_dict('records')
+    usable = [
+        sample for sample in samples
+        if isinstance(sample['user_message'], str) and isinstance(sample['assistant_message'], str)
+        and len(sample['assistant_message']) > 10
+    ]
+    junk = [sample for sample in samples if sample not in usable]
+    rng = random.Random(seed)
+    user_msgs = []
+    assistant_msgs = []
+    for i in range(rows):
+        if i and rng.random() < EXACT_DUP_RATE + NEAR_DUP_RATE:
+            source = rng.randrange(i)
+            user_msg, assistant_msg = user_msgs[source], assistant_msgs[source]
+            if isinstance(user_msg, str) and rng.random() < NEAR_DUP_RATE / (EXACT_DUP_RATE + NEAR_DUP_RATE):
+                user_msg = _strip_accents(user_msg) if rng.random() < 0.5 else user_msg.lower()
+            user_msgs.append(user_msg)
+            assistant_msgs.append(assistant_msg)
+            continue
+
+        if rng.random() < JUNK_RATE:
+            sample = rng.choice(junk)
+            user_msg = sample['user_message']
+            assistant_msg = sample['assistant_message']
+            if isinstance(user_msg, str) and rng.random() < 0.5:
+                user_msg = f'{user_msg} {i}'
+        else:
+            # Thêm chi tiết riêng để các dòng không trùng nhau
+            sample = rng.choice(usable)
+            service = rng.choice(SERVICES)
+            branch = rng.choice(BRANCHES)
+            hour = rng.randint(8, 21)
+            price = rng.randint(15, 120) * 10
+            user_msg = sample['user_message']
+            user_msg = (f'{rng.choice(GREETINGS)}{user_msg.rstrip("?")} ({service}, chi nhánh {branch}, '
+                        f'{hour}h){rng.choice(ENDINGS)}')
+            assistant_msg = (sample['assistant_message'].replace('anh/chị', rng.choice(TITLES))
+                             + f'\nDịch vụ {service} tại chi nhánh {branch} còn lịch lúc {hour}h, '
+                               f'giá ưu đãi {price}.000đ ạ.')
+        if isinstance(user_msg, str) and rng.random() < 0.05:
+            user_msg = f'  {user_msg}\n'
+        user_msgs.append(user_msg)
+        assistant_msgs.append(assistant_msg)
+    return pd.DataFrame({'user_message': user_msgs, 'assistant_message': assistant_msgs}, dtype=object)
+
+def write_dataset(path: str, rows: int, seed: int = 0) -> str:
+    """Ghi dataset giả lập ra file CSV (định dạng upload)"""
+    generate(rows, seed).to_csv(path, index=False)
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=SIZES['100k'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', required=True)
+    args = parser.parse_args()
+
+    write_dataset(args.output, args.rows, args.seed)
+    print(f"{args.output}: {args.rows} dòng, {os.path.getsize(args.output) / 2 ** 20:.1f}MB")
+
+if __name__ == '__main__':
+    main()
@@ -6,12 +6,13 @@ author_urls:
 description: A tool for reading database information and executing SQL queries, supporting multiple databases such as MySQL, PostgreSQL, SQLite, and Oracle. It provides functionalities for listing all tables, describing table schemas, and returning query results in CSV format. A versatile DB Agent for seamless database interactions.
 required_open_webui_version: 0.5.4
 requirements: pymysql, sqlalchemy, cx_Oracle, python-dotenv
-version: 0.1.6
+version: 0.1.7
 licence: MIT
 """
 
 import os
-from typing import List, Dict, Any
+import threading
+from typing import List, Dict, Any, Tuple
 from pydantic import BaseModel, Field
 import re
 from sqlalchemy import create_engine, text
@@ -22,6 +23,22 @@ from dotenv import load_dotenv
 # Load biến môi trường từ .env
 load_dotenv()
 
+# Engines shared by every Tools instance, keyed by the effective connection/pool settings.
+# Open WebUI re-assigns the valves on each call, so the pool must outlive a single instance.
+_ENGINES: Dict[Tuple, Engine] = {}
+_ENGINES_LOCK = threading.Lock()
+
+
+def dispose_engines() -> None:
+    """
+    Close every cached engine and its pooled connections.
+    """
+    with _ENGINES_LOCK:
+        engines = list(_ENGINES.values())
+        _ENGINES.clear()
+    for engine in engines:
+        engine.dispose()
+
 
 class Tools:
     class Valves(BaseModel):
@@ -49,6 +66,22 @@ class Tools:
             default=os.getenv("DB_TYPE"),
             description="The type of the database (e.g., mysql, postgresql, sqlite, oracle).",
         )
+        db_pool_size: int = Field(
+            default=int(os.getenv("DB_POOL_SIZE", "5")),
+            description="Number of connections kept open in the pool (ignored for sqlite).",
+        )
+        db_max_overflow: int = Field(
+            default=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            description="Extra connections allowed above the pool size under load (ignored for sqlite).",
+        )
+        db_pool_pre_ping: bool = Field(
+            default=os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes"),
+            description="Check a pooled connection is alive before using it.",
+        )
+        db_pool_recycle: int = Field(
+            default=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+            description="Replace pooled connections older than this many seconds (-1 to disable).",
+        )
 
     def __init__(self):
         """
@@ -58,22 +91,53 @@ class Tools:
         self.citation = True
         self.valves = Tools.Valves()
 
-    def _get_engine(self) -> Engine:
+    def _get_db_url(self) -> str:
         """
-        Create and return a database engine using the current configuration.
+        Build the SQLAlchemy URL from the current valves.
         """
         if self.valves.db_type == "mysql":
-            db_url = f"mysql+pymysql://{self.valves.db_user}:{self.valves.db_password}@{self.valves.db_host}:{self.valves.db_port}/{self.valves.db_name}"
+            return f"mysql+pymysql://{self.valves.db_user}:{self.valves.db_password}@{self.valves.db_host}:{self.valves.db_port}/{self.valves.db_name}"
         elif self.valves.db_type == "postgresql":
-            db_url = f"postgresql://{self.valves.db_user}:{self.valves.db_password}@{self.valves.db_host}:{self.valves.db_port}/{self.valves.db_name}"
+            return f"postgresql://{self.valves.db_user}:{self.valves.db_password}@{self.valves.db_host}:{self.valves.db_port}/{self.valves.db_name}"
         elif self.valves.db_type == "sqlite":
-            db_url = f"sqlite:///{self.valves.db_name}"
+            return f"sqlite:///{self.valves.db_name}"
         elif self.valves.db_type == "oracle":
-            db_url = f"oracle+cx_oracle://{self.valves.db_user}:{self.valves.db_password}@{self.valves.db_host}:{self.valves.db_port}/?service_name={self.valves.db_name}"
+            return f"oracle+cx_oracle://{self.valves.db_user}:{self.valves.db_password}@{self.valves.db_host}:{self.valves.db_port}/?service_name={self.valves.db_name}"
         else:
             raise ValueError(f"Unsupported database type: {self.valves.db_type}")
 
-        return create_engine(db_url)
+    def _get_engine_options(self) -> Dict[str, Any]:
+        """
+        Connection pool options from the current valves.
+        """
+        options = {
+            "pool_pre_ping": self.valves.db_pool_pre_ping,
+            "pool_recycle": self.valves.db_pool_recycle,
+        }
+        # The sqlite dialect picks its own pool class, which may not accept a size
+        if self.valves.db_type != "sqlite":
+            options["pool_size"] = self.valves.db_pool_size
+            options["max_overflow"] = self.valves.db_max_overflow
+        return options
+
+    def _get_engine(self) -> Engine:
+        """
+        Return the pooled engine for the current configuration, creating it on first use.
+        Engines built for previous valve values are disposed when the valves change.
+        """
+        db_url = self._get_db_url()
+        options = self._get_engine_options()
+        key = (db_url, tuple(sorted(options.items())))
+        stale = []
+        with _ENGINES_LOCK:
+            engine = _ENGINES.get(key)
+            if engine is None:
+                stale = [_ENGINES.pop(other) for other in list(_ENGINES)]
+                engine = _ENGINES[key] = create_engine(db_url, **options)
+        # Connections still checked out from a disposed engine are closed when returned
+        for old_engine in stale:
+            old_engine.dispose()
+        return engine
 
     def list_all_tables(self, db_name: str) -> str:
         """
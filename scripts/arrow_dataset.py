@@ -0,0 +1,124 @@
+import os
+from typing import Any, Dict, List
+
+import pandas as pd
+
+from normalizer import MESSAGE_COLUMNS
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # Thiếu pyarrow: main cảnh báo (hoặc dừng nếu đặt ARROW_EXPORT=1)
+    pa = None
+    pc = None
+
+# Dataset dạng cột: file Arrow IPC (không nén) cạnh file JSONL cùng tên
+ARROW_EXTENSION = '.arrow'
+
+def arrow_available() -> bool:
+    """pyarrow đã được cài đặt hay chưa"""
+    return pa is not None
+
+def arrow_path_for(jsonl_path: str) -> str:
+    """Đường dẫn file Arrow tương ứng với một file JSONL"""
+    return os.path.splitext(jsonl_path)[0] + ARROW_EXTENSION
+
+class ArrowDatasetWriter:
+    def __init__(self, path: str):
+        """
+        Ghi dataset dạng Arrow IPC theo từng chunk (mỗi chunk là một record batch)
+        Hai cột user_message, assistant_message, có thể map trực tiếp làm prompt/response khi training
+        """
+        if pa is None:
+            raise RuntimeError('Cần cài đặt pyarrow để xuất dataset Arrow')
+        self.path = path
+        self.rows = 0
+        self.schema = pa.schema([(column, pa.string()) for column in MESSAGE_COLUMNS])
+        self._sink = pa.OSFile(path, 'wb')
+        self._writer = pa.ipc.new_file(self._sink, self.schema)
+
+    def write(self, normalized: pd.DataFrame) -> None:
+        """Ghi một chunk đã chuẩn hóa (kết quả của normalize_frame)"""
+        if normalized.empty:
+            return
+        batch = pa.RecordBatch.from_pandas(
+            normalized[list(MESSAGE_COLUMNS)], schema=self.schema, preserve_index=False
+        )
+        self._writer.write_batch(batch)
+        self.rows += len(normalized)
+
+    def close(self) -> None:
+        """Ghi footer và đóng file"""
+        self._writer.close()
+        self._sink.close()
+
+    def abort(self) -> None:
+        """Đóng và xóa file đang ghi dở"""
+        try:
+            self.close()
+        finally:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+class ArrowDataset:
+    def __init__(self, path: str):
+        """
+        Mở dataset Arrow bằng memory map: không parse lại text, không copy dữ liệu vào bộ nhớ,
+        hệ điều hành chỉ nạp các trang được truy cập
+        """
+        if pa is None:
+            raise RuntimeError('Cần cài đặt pyarrow để đọc dataset Arrow')
+        self.path = path
+        self._source = pa.memory_map(path, 'r')
+        # read_all trên memory map là zero-copy: các cột trỏ thẳng vào vùng nhớ của file
+        self.table = pa.ipc.open_file(self._source).read_all()
+        self._stats = None
+
+    def __len__(self) -> int:
+        """Số mẫu, lấy từ metadata của các record batch"""
+        return self.table.num_rows
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        """Một conversation ở vị trí index (cùng định dạng với một dòng JSONL)"""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.read(index, 1)[0]
+
+    def read(self, start: int, limit: int) -> List[Dict[str, Any]]:
+        """Đọc các mẫu [start, start + limit) theo định dạng conversation của JSONL"""
+        start = max(start, 0)
+        rows = self.table.slice(start, max(limit, 0)).to_pylist()
+        return [
+            {
+                "messages": [
+                    {"role": "user", "content": row['user_message']},
+                    {"role": "assistant", "content": row['assistant_message']}
+                ]
+            }
+            for row in rows
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Số mẫu và thống kê độ dài (byte UTF-8) của từng cột.
+        Độ dài tính từ buffer offset của cột chuỗi, không đọc nội dung text
+        """
+        if self._stats is None:
+            stats = {'rows': len(self)}
+            for column in MESSAGE_COLUMNS:
+                lengths = pc.binary_length(self.table[column])
+                min_max = pc.min_max(lengths).as_py()
+                stats[column] = {
+                    'min_bytes': min_max['min'],
+                    'max_bytes': min_max['max'],
+                    'mean_bytes': pc.mean(lengths).as_py(),
+                    'total_bytes': pc.sum(lengths).as_py()
+                }
+            self._stats = stats
+        return dict(self._stats)
+
+    def close(self) -> None:
+        self.table = None
+        self._source.close()
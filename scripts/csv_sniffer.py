@@ -0,0 +1,185 @@
+import codecs
+import csv
+import io
+import os
+import unicodedata
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from normalizer import MESSAGE_COLUMNS
+
+# Chỉ đọc phần đầu file để tìm header, delimiter và encoding
+SNIFF_BYTES = 64 * 1024
+DELIMITERS = (',', ';', '\t', '|')
+
+# Tên cột được chấp nhận (so sánh không phân biệt hoa/thường, dấu, '_' / '-' / khoảng trắng).
+# Chỉ gồm tên rõ nghĩa: tên ngắn/chung chung (q, a, user, input, output...) dễ khớp nhầm header của
+# một bảng không liên quan và âm thầm đưa dữ liệu sai vào training
+COLUMN_ALIASES = {
+    'user_message': (
+        'user_message', 'user message', 'question', 'questions', 'prompt',
+        'cau hoi', 'khach hoi', 'noi dung hoi'
+    ),
+    'assistant_message': (
+        'assistant_message', 'assistant message', 'answer', 'answers', 'completion',
+        'cau tra loi', 'tra loi', 'noi dung tra loi'
+    )
+}
+
+# BOM -> (codec đọc phần sau BOM, độ dài BOM)
+BOMS = (
+    (codecs.BOM_UTF8, 'utf-8', 3),
+    (codecs.BOM_UTF16_LE, 'utf-16-le', 2),
+    (codecs.BOM_UTF16_BE, 'utf-16-be', 2)
+)
+# Không có BOM: thử UTF-8 trước, sau đó bảng mã tiếng Việt của Windows
+FALLBACK_ENCODINGS = ('utf-8', 'cp1258')
+
+class UnusableFileError(ValueError):
+    """File không có dữ liệu hội thoại dùng được (phát hiện trước khi đọc toàn bộ file)"""
+
+def _header_key(cell: Any) -> str:
+    text = unicodedata.normalize('NFD', str(cell)).replace('đ', 'd').replace('Đ', 'D')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).casefold()
+    return ' '.join(text.replace('_', ' ').replace('-', ' ').split())
+
+_ALIAS_COLUMNS = {
+    _header_key(alias): column for column, aliases in COLUMN_ALIASES.items() for alias in aliases
+}
+
+def match_columns(header: Sequence[Any]) -> Dict[str, int]:
+    """
+    Vị trí các cột user_message/assistant_message trong một dòng header,
+    tên chuẩn được ưu tiên hơn alias khi có cả hai
+    """
+    positions: Dict[str, int] = {}
+    keys = [_header_key(cell) if cell is not None else '' for cell in header]
+    for column in MESSAGE_COLUMNS:
+        if column in keys:
+            positions[column] = keys.index(column)
+    for index, key in enumerate(keys):
+        column = _ALIAS_COLUMNS.get(key)
+        if column and column not in positions and index not in positions.values():
+            positions[column] = index
+    return positions
+
+def detect_encoding(sample: bytes) -> Tuple[str, int]:
+    """
+    Encoding của file từ các byte đầu
+    Returns:
+        tuple: (codec đọc phần sau BOM, độ dài BOM)
+    """
+    for bom, codec, length in BOMS:
+        if sample.startswith(bom):
+            return codec, length
+    for codec in FALLBACK_ENCODINGS:
+        try:
+            # final=False: mẫu có thể cắt giữa một ký tự nhiều byte
+            codecs.getincrementaldecoder(codec)().decode(sample, final=False)
+            return codec, 0
+        except UnicodeDecodeError:
+            continue
+    return FALLBACK_ENCODINGS[-1], 0
+
+def _byte_offset(data: bytes, encoding: str, chars: int) -> int:
+    """
+    Số byte đầu của data giải mã ra đúng chars ký tự, tính trên byte gốc: byte lỗi được thay
+    bằng U+FFFD khi giải mã nên mã hóa lại text không cho lại đúng vị trí trong file
+    """
+    if not chars:
+        return 0
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    decoded = 0
+    for position in range(len(data)):
+        decoded += len(decoder.decode(data[position:position + 1]))
+        if decoded >= chars:
+            return position + 1
+    return len(data)
+
+class CsvLayout:
+    def __init__(self, encoding: str, delimiter: str, offset: int, header: List[str], positions: Dict[str, int],
+                 preamble_lines: int):
+        """
+        Kết quả dò một file CSV
+        Args:
+            offset: Vị trí byte đầu dòng header (sau BOM và các dòng mở đầu)
+            positions: Cột (theo thứ tự trong header) chứa user_message/assistant_message
+        """
+        self.encoding = encoding
+        self.delimiter = delimiter
+        self.offset = offset
+        self.header = header
+        self.positions = positions
+        self.preamble_lines = preamble_lines
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'encoding': self.encoding,
+            'delimiter': self.delimiter,
+            'offset': self.offset,
+            'preamble_lines': self.preamble_lines,
+            'columns': {column: self.header[index] for column, index in self.positions.items()}
+        }
+
+def sniff_csv(path: str, sniff_bytes: int = SNIFF_BYTES) -> CsvLayout:
+    """
+    Dò encoding, dòng header (bỏ qua các dòng mở đầu), delimiter và cột hội thoại
+    chỉ từ sniff_bytes đầu tiên của file
+    Raises:
+        UnusableFileError: Không tìm thấy header có cột câu hỏi và cột câu trả lời
+    """
+    with open(path, 'rb') as f:
+        sample = f.read(sniff_bytes)
+        truncated = bool(f.read(1))
+    if not sample.strip():
+        raise UnusableFileError('File rỗng')
+    encoding, bom_length = detect_encoding(sample)
+    text = codecs.getincrementaldecoder(encoding)(errors='replace').decode(sample[bom_length:], final=not truncated)
+    lines = io.StringIO(text, newline='').readlines()
+    if truncated and len(lines) > 1:
+        # Dòng cuối của mẫu có thể bị cắt
+        lines.pop()
+
+    for delimiter in DELIMITERS:
+        reader = csv.reader(lines, delimiter=delimiter)
+        # Dòng (vật lý) bắt đầu của mỗi bản ghi, bản ghi có ô nhiều dòng chiếm nhiều dòng
+        start_line = 0
+        for index, row in enumerate(reader):
+            positions = match_columns(row)
+            if len(positions) == len(MESSAGE_COLUMNS):
+                chars = len(''.join(lines[:start_line]))
+                offset = bom_length + _byte_offset(sample[bom_length:], encoding, chars)
+                return CsvLayout(encoding, delimiter, offset, row, positions, index)
+            start_line = reader.line_num
+    raise UnusableFileError(
+        f'Không tìm thấy dòng header có cột câu hỏi và câu trả lời trong {sniff_bytes // 1024}KB đầu '
+        f'(cần user_message/assistant_message hoặc question/answer, câu hỏi/trả lời...)'
+    )
+
+def read_csv_chunks(path: str, chunk_rows: int, layout: Optional[CsvLayout] = None
+                    ) -> Iterator[Tuple[pd.DataFrame, float]]:
+    """
+    Đọc file CSV theo từng chunk bắt đầu từ dòng header đã dò, chỉ lấy hai cột hội thoại
+    (đổi tên về user_message/assistant_message). Dòng lệch số cột không làm hỏng cả file
+    Yields:
+        tuple: (chunk, tỉ lệ đã đọc của file từ 0 tới 1)
+    """
+    layout = layout or sniff_csv(path)
+    names = {index: column for column, index in layout.positions.items()}
+    total_bytes = os.path.getsize(path) or 1
+    with open(path, 'rb') as f:
+        f.seek(layout.offset)
+        reader = pd.read_csv(
+            f,
+            sep=layout.delimiter,
+            encoding=layout.encoding,
+            header=0,
+            usecols=sorted(names),
+            dtype=str,
+            chunksize=chunk_rows,
+            on_bad_lines='skip'
+        )
+        for df in reader:
+            df.columns = [names[index] for index in sorted(names)]
+            yield df, f.tell() / total_bytes
@@ -0,0 +1,92 @@
+import heapq
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import Any, Dict, List
+
+import numpy as np
+
+# Tỉ lệ eval được so với hash của cặp theo đơn vị 1/SPLIT_BUCKETS
+SPLIT_BUCKETS = 10000
+MANIFEST_FILE = 'manifest.json'
+
+def eval_mask(hashes: List[int], eval_ratio: float) -> np.ndarray:
+    """
+    Cặp nào thuộc tập eval: chỉ phụ thuộc hash nội dung của cặp (pair_hash), nên một cặp
+    luôn ở cùng một tập dù dataset lớn dần hay được xử lý lại theo thứ tự khác
+    """
+    buckets = np.asarray(hashes, dtype=np.uint64) % np.uint64(SPLIT_BUCKETS)
+    return buckets < np.uint64(round(eval_ratio * SPLIT_BUCKETS))
+
+def shards_dir_for(jsonl_path: str) -> str:
+    """Thư mục shard tương ứng với một file JSONL"""
+    return os.path.splitext(jsonl_path)[0] + '.shards'
+
+def write_splits(jsonl_path: str, hashes: List[int], num_shards: int, eval_ratio: float) -> Dict[str, Any]:
+    """
+    Chia dataset JSONL thành train/eval theo hash và ghi mỗi tập thành tối đa num_shards shard
+    cân bằng theo số byte (mỗi dòng vào shard đang nhỏ nhất), kèm manifest.json
+    Args:
+        hashes: pair_hash của từng dòng trong jsonl_path, theo đúng thứ tự
+    Returns:
+        dict: Nội dung manifest (đường dẫn shard tương đối với thư mục shard)
+    """
+    shards_dir = shards_dir_for(jsonl_path)
+    tmp_dir = shards_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    try:
+        splits = _write_shards(jsonl_path, eval_mask(hashes, eval_ratio), num_shards, tmp_dir)
+        manifest = {
+            'source': os.path.basename(jsonl_path),
+            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'split': {'method': f'pair_hash % {SPLIT_BUCKETS}', 'eval_ratio': eval_ratio},
+            'num_shards': num_shards,
+            'splits': splits
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    # Công bố cả thư mục một lần, người đọc không thấy shard ghi dở
+    os.replace(tmp_dir, shards_dir)
+    return manifest
+
+def _write_shards(jsonl_path: str, is_eval: np.ndarray, num_shards: int, directory: str) -> Dict[str, Any]:
+    """Ghi từng dòng vào shard đang nhỏ nhất (theo byte) của tập tương ứng"""
+    splits: Dict[str, Dict[str, Any]] = {}
+    heaps: Dict[str, List[tuple]] = {}
+    files = {}
+    try:
+        for split, split_rows in (('train', int((~is_eval).sum())), ('eval', int(is_eval.sum()))):
+            count = min(num_shards, split_rows)
+            splits[split] = {
+                'rows': split_rows,
+                'bytes': 0,
+                'shards': [
+                    {'path': f'{split}-{index:05d}-of-{count:05d}.jsonl', 'rows': 0, 'bytes': 0}
+                    for index in range(count)
+                ]
+            }
+            heaps[split] = [(0, index) for index in range(count)]
+            for shard in splits[split]['shards']:
+                files[shard['path']] = open(os.path.join(directory, shard['path']), 'wb')
+
+        with open(jsonl_path, 'rb') as source:
+            for line, in_eval in zip(source, is_eval.tolist()):
+                split = 'eval' if in_eval else 'train'
+                size, index = heapq.heappop(heaps[split])
+                shard = splits[split]['shards'][index]
+                files[shard['path']].write(line)
+                shard['rows'] += 1
+                shard['bytes'] += len(line)
+                heapq.heappush(heaps[split], (size + len(line), index))
+    finally:
+        for f in files.values():
+            f.close()
+
+    for split in splits.values():
+        split['bytes'] = sum(shard['bytes'] for shard in split['shards'])
+    return splits
@@ -0,0 +1,176 @@
+import fcntl
+import os
+import threading
+import unicodedata
+from hashlib import blake2b
+from typing import Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from near_dedup import NearDupIndex
+
+# Số cặp ghi xuống đĩa mỗi lần khi commit
+COMMIT_BATCH_SIZE = 10000
+
+def pair_key(user_msg: str, assistant_msg: str) -> str:
+    """Khóa chuẩn hóa của một cặp hội thoại: NFC, gộp khoảng trắng, không phân biệt hoa/thường"""
+    def canonical(text: str) -> str:
+        return ' '.join(unicodedata.normalize('NFC', text).split()).casefold()
+    return canonical(user_msg) + '\x1f' + canonical(assistant_msg)
+
+def pair_hash(user_msg: str, assistant_msg: str) -> int:
+    """Hash 64-bit của một cặp hội thoại"""
+    digest = blake2b(pair_key(user_msg, assistant_msg).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+class DedupIndex:
+    def __init__(self, index_path: str, canonical_path: str, near_dup: Optional[NearDupIndex] = None):
+        """
+        Chỉ mục hash (lưu trên đĩa) của các cặp hội thoại đã có trong dataset tổng hợp
+        Args:
+            index_path: File nhị phân chứa các hash 64-bit, chỉ ghi nối
+            canonical_path: File JSONL tổng hợp các cặp không trùng lặp
+            near_dup: Chỉ mục MinHash/LSH để loại thêm các cặp gần trùng (tùy chọn)
+        """
+        self.index_path = index_path
+        self.canonical_path = canonical_path
+        self.near_dup = near_dup
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._hashes: Set[int] = set()
+        # Số byte của file chỉ mục đã nạp, phần ghi thêm bởi worker khác được nạp khi cần
+        self._loaded_bytes = 0
+        self._refresh()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._hashes)
+
+    def __contains__(self, hash_value: int) -> bool:
+        with self._lock:
+            return hash_value in self._hashes
+
+    def begin(self) -> 'DedupBatch':
+        """Bắt đầu một lượt xử lý: lọc trùng theo chunk, ghi vào dataset tổng hợp khi commit"""
+        return DedupBatch(self)
+
+    def _refresh(self) -> None:
+        """Nạp các hash được tiến trình khác ghi thêm vào file chỉ mục (gọi khi giữ self._lock)"""
+        try:
+            size = os.path.getsize(self.index_path)
+        except OSError:
+            return
+        # Chỉ đọc các bản ghi 8 byte đã ghi trọn
+        size -= size % 8
+        if size > self._loaded_bytes:
+            with open(self.index_path, 'rb') as f:
+                f.seek(self._loaded_bytes)
+                data = f.read(size - self._loaded_bytes)
+            self._hashes.update(np.frombuffer(data, dtype='<u8').tolist())
+            self._loaded_bytes = size
+        if self.near_dup is not None:
+            self.near_dup.sync(self._loaded_bytes // 8)
+
+    def _commit(self, pairs: Iterable[Tuple[int, str, Optional[np.ndarray]]]) -> int:
+        """Ghi nối các cặp (hash, dòng JSONL, chữ ký MinHash) chưa có vào dataset tổng hợp và chỉ mục"""
+        written = 0
+        with self._lock, \
+                open(self.canonical_path, 'a', encoding='utf-8') as canonical_file, \
+                open(self.index_path, 'ab') as index_file:
+            # Khóa file để các worker (tiến trình) khác không commit xen vào
+            fcntl.flock(index_file.fileno(), fcntl.LOCK_EX)
+            self._refresh()
+            new_hashes: List[int] = []
+            new_lines: List[str] = []
+            new_signatures: List[np.ndarray] = []
+
+            def write_batch():
+                # Ghi dataset trước chỉ mục: nếu lỗi giữa chừng chỉ có thể trùng, không mất dữ liệu
+                canonical_file.write(''.join(new_lines))
+                canonical_file.flush()
+                if self.near_dup is not None:
+                    self.near_dup.append(np.stack(new_signatures), self._loaded_bytes // 8)
+                np.asarray(new_hashes, dtype='<u8').tofile(index_file)
+                index_file.flush()
+                self._loaded_bytes += len(new_hashes) * 8
+                new_hashes.clear()
+                new_lines.clear()
+                new_signatures.clear()
+
+            # Trạng thái trước commit, để hoàn tác nếu lỗi giữa chừng (vd. hết dung lượng đĩa)
+            canonical_bytes = os.fstat(canonical_file.fileno()).st_size
+            loaded_bytes = self._loaded_bytes
+            added: List[int] = []
+            try:
+                for hash_value, line, signature in pairs:
+                    # Kiểm tra lại vì một lượt khác có thể đã commit cùng cặp
+                    if hash_value in self._hashes:
+                        continue
+                    self._hashes.add(hash_value)
+                    added.append(hash_value)
+                    new_hashes.append(hash_value)
+                    new_lines.append(line)
+                    new_signatures.append(signature)
+                    written += 1
+                    if len(new_hashes) >= COMMIT_BATCH_SIZE:
+                        write_batch()
+                if new_hashes:
+                    write_batch()
+            except BaseException:
+                # Không để lại một phần lượt trong dataset tổng hợp: gửi lại sẽ commit đủ các cặp
+                canonical_file.truncate(canonical_bytes)
+                index_file.truncate(loaded_bytes)
+                self._hashes.difference_update(added)
+                self._loaded_bytes = loaded_bytes
+                if self.near_dup is not None:
+                    self.near_dup.rollback(loaded_bytes // 8)
+                raise
+        return written
+
+class DedupBatch:
+    def __init__(self, index: DedupIndex):
+        """Trạng thái lọc trùng của một lượt xử lý (một file upload hoặc một webhook)"""
+        self.index = index
+        self.hashes: List[int] = []
+        self.duplicates = 0
+        self._seen: Set[int] = set()
+        # Lọc gần trùng sau khi lọc trùng tuyệt đối, chữ ký của cặp được giữ thẳng hàng với hashes
+        self.near_dup = index.near_dup.begin() if index.near_dup is not None else None
+
+    def filter(self, normalized: pd.DataFrame) -> Tuple[pd.DataFrame, int]:
+        """
+        Loại các cặp đã có trong chỉ mục hoặc đã gặp trong lượt này
+        (và các cặp gần trùng nếu có chỉ mục MinHash, đếm riêng ở near_dup.duplicates)
+        Returns:
+            tuple: (DataFrame các cặp mới, số cặp trùng tuyệt đối)
+        """
+        hashes = [
+            pair_hash(user_msg, assistant_msg)
+            for user_msg, assistant_msg in zip(normalized['user_message'], normalized['assistant_message'])
+        ]
+        keep = []
+        with self.index._lock:
+            self.index._refresh()
+            committed = self.index._hashes
+            for hash_value in hashes:
+                is_new = hash_value not in committed and hash_value not in self._seen
+                if is_new:
+                    self._seen.add(hash_value)
+                keep.append(is_new)
+            keep = np.asarray(keep, dtype=bool)
+            duplicates = len(keep) - int(keep.sum())
+            if self.near_dup is not None and keep.any():
+                candidates = normalized.loc[keep]
+                signatures = self.index.near_dup.hasher.signatures(candidates)
+                keep[keep] = self.near_dup.filter(candidates, signatures)
+            self.hashes.extend(hash_value for hash_value, is_new in zip(hashes, keep) if is_new)
+        self.duplicates += duplicates
+        return normalized.loc[keep], duplicates
+
+    def commit(self, jsonl_path: str) -> int:
+        """Ghi các cặp mới (theo đúng thứ tự trong file JSONL của lượt này) vào dataset tổng hợp"""
+        with open(jsonl_path, 'r', encoding='utf-8') as f:
+            if self.near_dup is None:
+                return self.index._commit((hash_value, line, None) for hash_value, line in zip(self.hashes, f))
+            return self.index._commit(zip(self.hashes, f, self.near_dup.signatures.signatures))
@@ -0,0 +1,162 @@
+import threading
+from collections import deque
+from typing import Callable, Deque, Iterable, List, Optional, Tuple
+
+# Một event đã phát: (id, loại event, dữ liệu JSON)
+Event = Tuple[int, str, str]
+
+class Subscriber:
+    def __init__(self, max_queue_size: int, on_drop: Optional[Callable[[], None]] = None):
+        """
+        Hàng đợi riêng (có giới hạn) của một client SSE
+        Args:
+            on_drop: Gọi mỗi khi một event bị bỏ vì client đọc chậm
+        """
+        self.max_queue_size = max_queue_size
+        self.on_drop = on_drop
+        self.queue: Deque[Event] = deque()
+        self.dropped = 0
+        self.closed = False
+        # Id event cuối đã nhận, bỏ qua event trùng (vừa phát lại vừa được publish)
+        self.last_id = 0
+        self._cond = threading.Condition()
+
+    def put(self, event: Event) -> None:
+        """Đưa event vào hàng đợi, gộp/bỏ event cũ nếu client đọc chậm"""
+        with self._cond:
+            if event[0] <= self.last_id:
+                return
+            self.last_id = event[0]
+            if len(self.queue) >= self.max_queue_size:
+                self._make_room(event[1])
+            self.queue.append(event)
+            self._cond.notify()
+
+    def get(self, timeout: Optional[float] = None) -> List[Event]:
+        """
+        Chờ (không polling) tới khi có event mới
+        Returns:
+            list: Các event đang chờ, rỗng nếu hết timeout hoặc đã đóng
+        """
+        with self._cond:
+            if not self.queue and not self.closed:
+                self._cond.wait(timeout)
+            events = list(self.queue)
+            self.queue.clear()
+            return events
+
+    def close(self) -> None:
+        """Đóng hàng đợi và đánh thức luồng đang chờ"""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def _make_room(self, event_type: str) -> None:
+        """Ưu tiên bỏ event cũ nhất cùng loại (trạng thái mới thay thế trạng thái cũ)"""
+        for index, queued in enumerate(self.queue):
+            if queued[1] == event_type:
+                del self.queue[index]
+                break
+        else:
+            self.queue.popleft()
+        self.dropped += 1
+        if self.on_drop is not None:
+            self.on_drop()
+
+class EventBroker:
+    def __init__(self, max_queue_size: int = 100, history_size: int = 500,
+                 replay: Optional[Callable[[int], List[Event]]] = None):
+        """
+        Phân phối event tới từng client SSE
+        Args:
+            max_queue_size: Số event tối đa chờ trong hàng đợi của mỗi client
+            history_size: Số event gần nhất giữ lại để phát lại khi client kết nối lại
+            replay: Hàm lấy các event sau một id từ nguồn dùng chung (bus nhiều worker),
+                dùng khi lịch sử trong bộ nhớ không còn đủ; được gọi ngoài khóa của broker
+        """
+        self.max_queue_size = max_queue_size
+        self.replay = replay
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._history: Deque[Event] = deque(maxlen=history_size)
+        self._subscribers: List[Subscriber] = []
+        # Tổng số event đã bỏ từ khi khởi động, không giảm khi client ngắt kết nối.
+        # Khóa riêng vì event có thể bị bỏ khi đang giữ self._lock (phát lại trong subscribe)
+        self._dropped_total = 0
+        self._dropped_lock = threading.Lock()
+
+    def publish(self, event_type: str, data: str, event_id: Optional[int] = None) -> int:
+        """
+        Gửi event tới tất cả client
+        Args:
+            event_id: Id do bus cấp (chế độ nhiều worker), mặc định tự gán id tăng dần
+        """
+        with self._lock:
+            self._last_id = self._last_id + 1 if event_id is None else max(self._last_id, event_id)
+            event = (self._last_id if event_id is None else event_id, event_type, data)
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.put(event)
+        return event[0]
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> Subscriber:
+        """
+        Đăng ký một client mới
+        Args:
+            last_event_id: Id event cuối client đã nhận (header Last-Event-ID),
+                các event sau id này còn trong lịch sử sẽ được phát lại
+        """
+        subscriber = Subscriber(self.max_queue_size, self._count_drop)
+        replayed: List[Event] = []
+        if last_event_id is not None and self.replay is not None:
+            with self._lock:
+                needs_replay = self._needs_replay(last_event_id)
+                # Chỉ đọc từ nguồn dùng chung các event sẽ được giữ lại (tối đa history_size)
+                after_id = max(last_event_id, self._last_id - (self._history.maxlen or 0))
+            if needs_replay:
+                # Đọc bus ngoài khóa để không chặn publish và các client khác
+                replayed = self.replay(after_id)[-(self._history.maxlen or 0):]
+        with self._lock:
+            for event in replayed:
+                subscriber.put(event)
+            if last_event_id is not None:
+                # Event phát trong lúc đọc bus nằm trong lịch sử, event trùng bị bỏ qua ở put
+                for event in self._missed_events(last_event_id):
+                    subscriber.put(event)
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        """Hủy đăng ký client"""
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+        subscriber.close()
+
+    def _count_drop(self) -> None:
+        with self._dropped_lock:
+            self._dropped_total += 1
+
+    def stats(self) -> dict:
+        """Thống kê số client và tổng số event đã bỏ vì client đọc chậm (kể cả client đã ngắt kết nối)"""
+        with self._lock:
+            stats = {
+                'last_event_id': self._last_id,
+                'subscribers': len(self._subscribers),
+                'queued': sum(len(s.queue) for s in self._subscribers)
+            }
+        with self._dropped_lock:
+            stats['dropped'] = self._dropped_total
+        return stats
+
+    def _needs_replay(self, last_event_id: int) -> bool:
+        """Lịch sử trong bộ nhớ bắt đầu sau last_event_id (worker mới khởi động), gọi khi giữ self._lock"""
+        return last_event_id <= self._last_id and (not self._history or self._history[0][0] > last_event_id + 1)
+
+    def _missed_events(self, last_event_id: int) -> Iterable[Event]:
+        """Các event trong lịch sử có id lớn hơn last_event_id"""
+        if last_event_id > self._last_id:
+            # Id từ một phiên server trước: phát lại toàn bộ lịch sử hiện có
+            return list(self._history)
+        return [event for event in self._history if event[0] > last_event_id]
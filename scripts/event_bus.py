@@ -0,0 +1,233 @@
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+# listener(event_id, event_type, payload)
+Listener = Callable[[int, str, Dict[str, Any]], None]
+
+class LocalEventBus:
+    def __init__(self):
+        """
+        Bus trong một tiến trình: giao event theo thứ tự id tới các listener, ngoài khóa cấp id
+        Luồng publish đầu tiên giao lần lượt các event đang chờ, các luồng publish đồng thời
+        chỉ xếp event vào hàng đợi rồi trả về ngay (không chờ listener của event khác)
+        """
+        self._listeners: List[Listener] = []
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._pending: Deque[Tuple[int, str, Dict[str, Any]]] = deque()
+        self._delivering = False
+
+    def subscribe(self, listener: Listener) -> None:
+        self._listeners.append(listener)
+
+    def publish(self, event_type: str, payload: Dict[str, Any]) -> int:
+        """Gán id tăng dần và xếp event chờ giao, giao luôn nếu chưa có luồng nào đang giao"""
+        with self._lock:
+            self._last_id += 1
+            event_id = self._last_id
+            self._pending.append((event_id, event_type, payload))
+            if self._delivering:
+                # Luồng đang giao (hoặc chính listener đang chạy publish lồng nhau) sẽ giao event này
+                return event_id
+            self._delivering = True
+        while True:
+            with self._lock:
+                if not self._pending:
+                    # Cùng khóa với lúc xếp hàng: không có event nào bị bỏ lại trong hàng đợi
+                    self._delivering = False
+                    return event_id
+                event = self._pending.popleft()
+            try:
+                _deliver(self._listeners, *event)
+            except BaseException:
+                with self._lock:
+                    self._delivering = False
+                raise
+
+    def replay(self, after_id: int, until_id: Optional[int] = None,
+               limit: int = 1000) -> List[Tuple[int, str, Dict[str, Any]]]:
+        """Bus cục bộ không lưu event"""
+        return []
+
+    def last_id(self) -> int:
+        return self._last_id
+
+    def start(self, after_id: Optional[int] = None) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+class SQLiteEventBus:
+    def __init__(self, db_path: str, poll_interval: float = 0.05, retention: int = 10000):
+        """
+        Bus giữa nhiều tiến trình trên cùng máy, dựa trên một bảng SQLite (WAL)
+        Mỗi tiến trình có một luồng đọc event mới và giao cho listener,
+        nên mọi worker đều nhận đủ event và cùng dùng một dãy id
+        Args:
+            db_path: Đường dẫn file SQLite dùng chung
+            poll_interval: Chu kỳ (giây) luồng đọc kiểm tra event mới
+            retention: Số event gần nhất được giữ lại để phát lại
+        """
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._listeners: List[Listener] = []
+        self._write_lock = threading.Lock()
+        self._write_conn = self._connect()
+        with self._write_lock, self._write_conn:
+            self._write_conn.execute('PRAGMA journal_mode=WAL')
+            self._write_conn.execute(
+                'CREATE TABLE IF NOT EXISTS events ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, type TEXT NOT NULL, '
+                'payload TEXT NOT NULL, created_at REAL NOT NULL)'
+            )
+        self._wake = threading.Event()
+        self._stopped = False
+        self._poller: Optional[threading.Thread] = None
+        self._delivered_id = 0
+
+    def subscribe(self, listener: Listener) -> None:
+        self._listeners.append(listener)
+
+    def publish(self, event_type: str, payload: Dict[str, Any]) -> int:
+        """Ghi event vào bảng dùng chung, các tiến trình sẽ nhận qua luồng đọc"""
+        data = json.dumps(payload, ensure_ascii=False)
+        with self._write_lock, self._write_conn:
+            cursor = self._write_conn.execute(
+                'INSERT INTO events (type, payload, created_at) VALUES (?, ?, ?)',
+                (event_type, data, time.time())
+            )
+        # Đánh thức luồng đọc của tiến trình này để giao event ngay
+        self._wake.set()
+        return cursor.lastrowid
+
+    def replay(self, after_id: int, until_id: Optional[int] = None,
+               limit: int = 1000) -> List[Tuple[int, str, Dict[str, Any]]]:
+        """Các event có id trong (after_id, until_id] còn được lưu"""
+        query = 'SELECT id, type, payload FROM events WHERE id > ?'
+        params: list = [after_id]
+        if until_id is not None:
+            query += ' AND id <= ?'
+            params.append(until_id)
+        query += ' ORDER BY id LIMIT ?'
+        params.append(limit)
+        with self._write_lock:
+            rows = self._write_conn.execute(query, params).fetchall()
+        return [(row[0], row[1], json.loads(row[2])) for row in rows]
+
+    def last_id(self) -> int:
+        with self._write_lock:
+            row = self._write_conn.execute('SELECT MAX(id) FROM events').fetchone()
+        return row[0] or 0
+
+    def delivered_id(self) -> int:
+        """Id event cuối cùng đã giao cho listener ở tiến trình này"""
+        return self._delivered_id
+
+    def start(self, after_id: Optional[int] = None) -> None:
+        """Bắt đầu luồng đọc từ sau after_id (mặc định: chỉ event mới)"""
+        if self._poller is not None:
+            return
+        self._delivered_id = self.last_id() if after_id is None else after_id
+        self._poller = threading.Thread(target=self._poll_loop, name='event-bus-poller', daemon=True)
+        self._poller.start()
+
+    def close(self) -> None:
+        self._stopped = True
+        self._wake.set()
+        if self._poller is not None and self._poller is not threading.current_thread():
+            self._poller.join(timeout=5)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+
+    def _poll_loop(self) -> None:
+        conn = self._connect()
+        delivered_since_prune = 0
+        while not self._stopped:
+            try:
+                rows = conn.execute(
+                    'SELECT id, type, payload FROM events WHERE id > ? ORDER BY id LIMIT 500',
+                    (self._delivered_id,)
+                ).fetchall()
+            except sqlite3.Error as e:
+                print(f"Error reading event bus: {str(e)}")
+                rows = []
+            for event_id, event_type, data in rows:
+                _deliver(self._listeners, event_id, event_type, json.loads(data))
+                self._delivered_id = event_id
+            delivered_since_prune += len(rows)
+            if delivered_since_prune >= self.retention // 10:
+                delivered_since_prune = 0
+                self._prune()
+            if not rows:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+        conn.close()
+
+    def _prune(self) -> None:
+        """Xóa event cũ, chỉ giữ retention event gần nhất"""
+        try:
+            with self._write_lock, self._write_conn:
+                self._write_conn.execute(
+                    'DELETE FROM events WHERE id <= (SELECT MAX(id) FROM events) - ?',
+                    (self.retention,)
+                )
+        except sqlite3.Error as e:
+            print(f"Error pruning event bus: {str(e)}")
+
+class LeaderElection:
+    def __init__(self, lock_path: str, on_elected: Callable[[], None], retry_interval: float = 2.0):
+        """
+        Chọn một tiến trình leader trên máy bằng file lock (flock)
+        Leader là tiến trình duy nhất ghi logs xuống đĩa, gửi Telegram và chạy training
+        Args:
+            lock_path: File lock dùng chung
+            on_elected: Hàm gọi (một lần) khi tiến trình này trở thành leader
+            retry_interval: Chu kỳ (giây) thử lại khi chưa giành được lock
+        """
+        self.lock_path = lock_path
+        self.on_elected = on_elected
+        self.retry_interval = retry_interval
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        self._file = open(lock_path, 'a')
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Thử giành lock ngay, nếu không được thì thử lại ở luồng nền"""
+        if self._try_acquire():
+            return
+        self._thread = threading.Thread(target=self._retry_loop, name='leader-election', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _try_acquire(self) -> bool:
+        try:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        self.on_elected()
+        return True
+
+    def _retry_loop(self) -> None:
+        while not self._stopped.wait(self.retry_interval):
+            if self._try_acquire():
+                return
+
+def _deliver(listeners: List[Listener], event_id: int, event_type: str, payload: Dict[str, Any]) -> None:
+    for listener in listeners:
+        try:
+            listener(event_id, event_type, payload)
+        except Exception as e:
+            print(f"Error handling event {event_id} ({event_type}): {str(e)}")
@@ -0,0 +1,330 @@
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+# Trạng thái của một training job
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+SUPERSEDED = 'superseded'
+REJECTED = 'rejected'
+
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED, SUPERSEDED, REJECTED)
+
+def _format_time(value: Optional[float]) -> Optional[str]:
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value).strftime('%Y-%m-%d %H:%M:%S')
+
+class TrainingJob:
+    def __init__(self, job_id: int, dataset: str, key: str, source: str,
+                 config: Optional[Dict[str, Any]] = None):
+        """Một lượt training trên một dataset"""
+        self.id = job_id
+        self.dataset = dataset
+        # Các dataset đã được gộp vào job này (dataset cuối là mới nhất)
+        self.datasets = [dataset]
+        self.key = key
+        self.source = source
+        # Snapshot cấu hình training tại thời điểm tạo job
+        self.config = config
+        self.state = QUEUED
+        self.error: Optional[str] = None
+        self.superseded_by: Optional[int] = None
+        self.submitted_at = time.time()
+        self.first_submitted_at = self.submitted_at
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.ready_at = self.submitted_at
+        self.cancel_event = threading.Event()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'state': self.state,
+            'dataset': self.dataset,
+            'datasets': list(self.datasets),
+            'key': self.key,
+            'source': self.source,
+            'error': self.error,
+            'superseded_by': self.superseded_by,
+            'cancel_requested': self.cancel_event.is_set(),
+            'submitted_at': _format_time(self.submitted_at),
+            'started_at': _format_time(self.started_at),
+            'finished_at': _format_time(self.finished_at)
+        }
+
+class TrainingScheduler:
+    def __init__(self, run_job: Callable[[TrainingJob], None], workers: int = 1,
+                 max_queue_size: int = 10, debounce_seconds: float = 5.0,
+                 max_delay_seconds: float = 60.0, cancel_running: bool = False,
+                 history_size: int = 100, store=None):
+        """
+        Hàng đợi training job có giới hạn, thay cho việc tạo một thread mỗi request
+        Args:
+            run_job: Hàm chạy training cho một job (nên kiểm tra job.cancel_event)
+            workers: Số job được chạy đồng thời
+            max_queue_size: Số job tối đa đang chờ, vượt quá thì job mới bị từ chối
+            debounce_seconds: Job chỉ bắt đầu khi không có dataset mới cùng key trong khoảng này
+            max_delay_seconds: Thời gian chờ tối đa kể từ dataset đầu tiên, kể cả khi dữ liệu mới liên tục tới
+            cancel_running: Hủy job đang chạy khi có dataset mới hơn cùng key
+            history_size: Số job đã kết thúc được giữ lại để xem
+            store: JobStore để lưu job bền vững (tùy chọn), khi có thì id job do store cấp
+        """
+        self.run_job = run_job
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.cancel_running = cancel_running
+        self.history_size = history_size
+        self.store = store
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._jobs: Dict[int, TrainingJob] = {}
+        self._queued: List[TrainingJob] = []
+        self._running: List[TrainingJob] = []
+        self._history: Deque[TrainingJob] = deque(maxlen=history_size)
+        self._stats = {'submitted': 0, 'coalesced': 0, 'rejected': 0, 'cancelled': 0}
+        self._stopped = False
+        self._threads = [
+            threading.Thread(target=self._worker, name=f'training-worker-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, dataset: str, key: str, source: str = 'upload',
+               config: Optional[Dict[str, Any]] = None) -> TrainingJob:
+        """
+        Đưa dataset vào hàng đợi training
+        Args:
+            dataset: Đường dẫn file JSONL
+            key: Khóa gộp job, các dataset cùng key tới gần nhau được gộp thành một lượt chạy
+            source: Nguồn dữ liệu (upload, webhook)
+            config: Snapshot cấu hình training
+        Returns:
+            TrainingJob: Job mới (state queued hoặc rejected)
+        """
+        with self._cond:
+            job = TrainingJob(0, dataset, key, source, config)
+            job.id = self.store.create_job(job) if self.store else next(self._ids)
+            self._stats['submitted'] += 1
+            return self._enqueue(job)
+
+    def create(self, dataset: str, key: str, source: str = 'upload',
+               config: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Chỉ tạo job (state queued) trong store, chưa đưa vào hàng đợi.
+        Dùng ở chế độ nhiều worker: worker nhận request tạo job, leader nhận job qua adopt
+        """
+        return self.store.create_job(TrainingJob(0, dataset, key, source, config))
+
+    def adopt(self, job_id: int) -> Optional[TrainingJob]:
+        """Đưa một job đã tạo trong store (qua create) vào hàng đợi, gộp như submit"""
+        if not self.store:
+            return None
+        row = self.store.get_row(job_id)
+        with self._cond:
+            if job_id in self._jobs:
+                return self._jobs[job_id]
+            if row is None or row['state'] != QUEUED:
+                return None
+            job = self._job_from_row(row)
+            self._stats['submitted'] += 1
+            return self._enqueue(job)
+
+    def _enqueue(self, job: TrainingJob) -> TrainingJob:
+        """Gộp với job đang chờ cùng key rồi đưa job vào hàng đợi (gọi khi giữ self._cond)"""
+        now = time.time()
+        key = job.key
+        # Gộp: job đang chờ cùng key bị thay thế bởi job mới, job mới train trên dataset của cả hai
+        superseded = [queued for queued in self._queued if queued.key == key]
+        for old in superseded:
+            self._queued.remove(old)
+            old.state = SUPERSEDED
+            old.superseded_by = job.id
+            old.finished_at = now
+            old.cancel_event.set()
+            job.datasets = old.datasets + job.datasets
+            job.first_submitted_at = min(job.first_submitted_at, old.first_submitted_at)
+            self._history.append(old)
+            self._persist(old)
+            self._stats['coalesced'] += 1
+
+        if len(self._queued) >= self.max_queue_size:
+            job.state = REJECTED
+            job.error = 'Hàng đợi training đã đầy'
+            job.finished_at = now
+            self._stats['rejected'] += 1
+            self._history.append(job)
+            self._jobs[job.id] = job
+            self._persist(job)
+            return job
+
+        if self.cancel_running:
+            for running in self._running:
+                if running.key == key and not running.cancel_event.is_set():
+                    running.superseded_by = job.id
+                    running.cancel_event.set()
+                    # Lượt chạy bị dừng giữa chừng: dữ liệu của nó được train lại trong job mới
+                    job.datasets = running.datasets + [
+                        dataset for dataset in job.datasets if dataset not in running.datasets
+                    ]
+
+        job.ready_at = min(now + self.debounce_seconds, job.first_submitted_at + self.max_delay_seconds)
+        self._queued.append(job)
+        self._jobs[job.id] = job
+        self._persist(job)
+        self._prune()
+        self._cond.notify_all()
+        return job
+
+    def cancel(self, job_id: int) -> Optional[TrainingJob]:
+        """Hủy job đang chờ, hoặc yêu cầu job đang chạy dừng lại"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.state in FINISHED_STATES:
+                return job
+            job.cancel_event.set()
+            if job.state == QUEUED:
+                self._queued.remove(job)
+                job.state = CANCELLED
+                job.finished_at = time.time()
+                self._history.append(job)
+                self._persist(job)
+                self._stats['cancelled'] += 1
+                self._cond.notify_all()
+            return job
+
+    def get(self, job_id: int) -> Optional[TrainingJob]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Trạng thái hàng đợi: job đang chờ, đang chạy, đã kết thúc gần đây"""
+        with self._cond:
+            return {
+                'workers': self.workers,
+                'max_queue_size': self.max_queue_size,
+                'debounce_seconds': self.debounce_seconds,
+                'max_delay_seconds': self.max_delay_seconds,
+                'queued': [job.to_dict() for job in self._queued],
+                'running': [job.to_dict() for job in self._running],
+                'recent': [job.to_dict() for job in reversed(self._history)],
+                'stats': dict(self._stats)
+            }
+
+    def stop(self) -> None:
+        """Dừng các worker sau khi job hiện tại kết thúc"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def _next_job(self) -> Optional[TrainingJob]:
+        """Chờ tới khi có job đến hạn chạy (không polling)"""
+        with self._cond:
+            while not self._stopped:
+                now = time.time()
+                ready = [job for job in self._queued if job.ready_at <= now]
+                if ready:
+                    job = min(ready, key=lambda queued: queued.ready_at)
+                    self._queued.remove(job)
+                    job.state = RUNNING
+                    job.started_at = now
+                    self._running.append(job)
+                    self._persist(job)
+                    return job
+                timeout = min((job.ready_at for job in self._queued), default=now + 60) - now
+                self._cond.wait(max(timeout, 0.01))
+            return None
+
+    def _worker(self) -> None:
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                self.run_job(job)
+                state = CANCELLED if job.cancel_event.is_set() else COMPLETED
+            except Exception as e:
+                job.error = str(e)
+                state = FAILED
+            with self._cond:
+                self._running.remove(job)
+                job.state = state
+                job.finished_at = time.time()
+                if state == CANCELLED:
+                    self._stats['cancelled'] += 1
+                self._history.append(job)
+                self._persist(job)
+                self._cond.notify_all()
+
+    def recover(self) -> Dict[str, int]:
+        """
+        Khôi phục job từ store sau khi khởi động lại:
+        job đang chờ được đưa lại vào hàng đợi, job đang chạy dở bị đánh dấu lỗi
+        """
+        recovered = {'requeued': 0, 'orphaned': 0}
+        if not self.store:
+            return recovered
+        with self._cond:
+            now = time.time()
+            for row in self.store.list_unfinished():
+                if row['id'] in self._jobs:
+                    continue
+                job = self._job_from_row(row)
+                job.state = row['state']
+                self._jobs[job.id] = job
+
+                if row['state'] == QUEUED and row['dataset'] and os.path.exists(row['dataset']):
+                    job.ready_at = now + self.debounce_seconds
+                    self._queued.append(job)
+                    recovered['requeued'] += 1
+                    continue
+
+                job.state = FAILED
+                job.started_at = row['started_at']
+                job.finished_at = now
+                if row['state'] == RUNNING:
+                    job.error = 'Tiến trình bị dừng khi job đang chạy (orphaned)'
+                    recovered['orphaned'] += 1
+                else:
+                    job.error = 'Không tìm thấy dataset khi khôi phục job'
+                self._history.append(job)
+                self._persist(job)
+            self._cond.notify_all()
+        return recovered
+
+    @staticmethod
+    def _job_from_row(row) -> TrainingJob:
+        """Dựng lại TrainingJob (state queued) từ một dòng trong store"""
+        job = TrainingJob(row['id'], row['dataset'], row['key'], row['source'],
+                          json.loads(row['config'] or 'null'))
+        job.datasets = json.loads(row['datasets'] or '[]') or [row['dataset']]
+        job.submitted_at = row['submitted_at']
+        job.first_submitted_at = row['submitted_at']
+        return job
+
+    def _persist(self, job: TrainingJob) -> None:
+        """Lưu trạng thái job vào store (nếu có)"""
+        if self.store:
+            try:
+                self.store.save_job(job)
+            except Exception as e:
+                print(f"Error saving training job {job.id}: {str(e)}")
+
+    def _prune(self) -> None:
+        """Chỉ giữ job còn hoạt động hoặc còn trong lịch sử để bộ nhớ không tăng mãi"""
+        active = {job.id for job in self._queued}
+        active.update(job.id for job in self._running)
+        active.update(job.id for job in self._history)
+        for job_id in [job_id for job_id in self._jobs if job_id not in active]:
+            del self._jobs[job_id]
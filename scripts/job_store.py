@@ -0,0 +1,200 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL,
+    source TEXT,
+    dataset TEXT,
+    datasets TEXT,
+    config TEXT,
+    state TEXT NOT NULL,
+    error TEXT,
+    superseded_by INTEGER,
+    submitted_at REAL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS job_transitions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_job_transitions_job ON job_transitions (job_id, id);
+CREATE TABLE IF NOT EXISTS job_progress (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NOT NULL,
+    at REAL NOT NULL,
+    status TEXT,
+    progress INTEGER,
+    message TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_job_progress_job ON job_progress (job_id, id);
+"""
+
+def _format_time(value: Optional[float]) -> Optional[str]:
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value).strftime('%Y-%m-%d %H:%M:%S')
+
+class JobStore:
+    def __init__(self, db_path: str):
+        """
+        Lưu training job vào SQLite (WAL) để không mất trạng thái khi restart
+        Args:
+            db_path: Đường dẫn file SQLite
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(SCHEMA)
+
+    def create_job(self, job) -> int:
+        """Thêm job mới, trả về id do SQLite cấp"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                'INSERT INTO jobs (key, source, dataset, datasets, config, state, error, superseded_by, '
+                'submitted_at, started_at, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (job.key, job.source, job.dataset, json.dumps(job.datasets, ensure_ascii=False),
+                 json.dumps(job.config, ensure_ascii=False), job.state, job.error, job.superseded_by,
+                 job.submitted_at, job.started_at, job.finished_at)
+            )
+            job_id = cursor.lastrowid
+            self._conn.execute(
+                'INSERT INTO job_transitions (job_id, state, at) VALUES (?, ?, ?)',
+                (job_id, job.state, job.submitted_at)
+            )
+            return job_id
+
+    def save_job(self, job) -> None:
+        """Cập nhật job, ghi lại chuyển trạng thái nếu state thay đổi"""
+        with self._lock, self._conn:
+            row = self._conn.execute('SELECT state FROM jobs WHERE id = ?', (job.id,)).fetchone()
+            self._conn.execute(
+                'UPDATE jobs SET dataset = ?, datasets = ?, state = ?, error = ?, superseded_by = ?, '
+                'started_at = ?, finished_at = ? WHERE id = ?',
+                (job.dataset, json.dumps(job.datasets, ensure_ascii=False), job.state, job.error,
+                 job.superseded_by, job.started_at, job.finished_at, job.id)
+            )
+            if row is not None and row['state'] != job.state:
+                self._conn.execute(
+                    'INSERT INTO job_transitions (job_id, state, at) VALUES (?, ?, ?)',
+                    (job.id, job.state, time.time())
+                )
+
+    def add_progress(self, job_id: int, status: str, progress: Optional[int], message: str) -> int:
+        """Ghi một mẫu tiến độ của job"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                'INSERT INTO job_progress (job_id, at, status, progress, message) VALUES (?, ?, ?, ?, ?)',
+                (job_id, time.time(), status, progress, message)
+            )
+            return cursor.lastrowid
+
+    def get_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Lấy job kèm lịch sử chuyển trạng thái và tiến độ mới nhất"""
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is None:
+                return None
+            transitions = self._conn.execute(
+                'SELECT state, at FROM job_transitions WHERE job_id = ? ORDER BY id', (job_id,)
+            ).fetchall()
+            latest = self._conn.execute(
+                'SELECT * FROM job_progress WHERE job_id = ? ORDER BY id DESC LIMIT 1', (job_id,)
+            ).fetchone()
+        job = self._row_to_dict(row)
+        job['transitions'] = [
+            {'state': transition['state'], 'at': _format_time(transition['at'])}
+            for transition in transitions
+        ]
+        job['progress'] = self._progress_to_dict(latest) if latest else None
+        return job
+
+    def get_row(self, job_id: int) -> Optional[sqlite3.Row]:
+        """Dòng job thô (dùng để dựng lại TrainingJob)"""
+        with self._lock:
+            return self._conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+
+    def list_jobs(self, states: List[str], limit: int = 100) -> List[Dict[str, Any]]:
+        """Các job theo trạng thái (không kèm cấu hình), mới nhất trước"""
+        placeholders = ', '.join('?' for _ in states)
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT * FROM jobs WHERE state IN ({placeholders}) ORDER BY id DESC LIMIT ?',
+                (*states, limit)
+            ).fetchall()
+        jobs = []
+        for row in rows:
+            job = self._row_to_dict(row)
+            del job['config']
+            jobs.append(job)
+        return jobs
+
+    def get_progress(self, job_id: int, since: int = 0, limit: int = 500) -> Dict[str, Any]:
+        """
+        Lấy các mẫu tiến độ của job sau cursor since
+        Returns:
+            dict: samples và next_cursor (truyền lại vào since ở lần gọi sau)
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT * FROM job_progress WHERE job_id = ? AND id > ? ORDER BY id LIMIT ?',
+                (job_id, since, limit)
+            ).fetchall()
+        samples = [self._progress_to_dict(row) for row in rows]
+        return {
+            'job_id': job_id,
+            'samples': samples,
+            'next_cursor': samples[-1]['cursor'] if samples else since
+        }
+
+    def list_unfinished(self) -> List[sqlite3.Row]:
+        """Các job còn đang chờ hoặc đang chạy (dùng khi khởi động lại)"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT * FROM jobs WHERE state IN ('queued', 'running') ORDER BY id"
+            ).fetchall()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            'id': row['id'],
+            'state': row['state'],
+            'dataset': row['dataset'],
+            'datasets': json.loads(row['datasets'] or '[]'),
+            'key': row['key'],
+            'source': row['source'],
+            'error': row['error'],
+            'superseded_by': row['superseded_by'],
+            'config': json.loads(row['config'] or 'null'),
+            'submitted_at': _format_time(row['submitted_at']),
+            'started_at': _format_time(row['started_at']),
+            'finished_at': _format_time(row['finished_at'])
+        }
+
+    @staticmethod
+    def _progress_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            'cursor': row['id'],
+            'timestamp': _format_time(row['at']),
+            'status': row['status'],
+            'progress': row['progress'],
+            'message': row['message']
+        }
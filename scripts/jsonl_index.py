@@ -0,0 +1,87 @@
+import json
+import os
+import threading
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Kích thước block đọc khi quét file để dựng chỉ mục
+SCAN_BLOCK_SIZE = 1024 * 1024
+
+class JsonlIndex:
+    def __init__(self, path: str):
+        """
+        Chỉ mục offset theo dòng của một file JSONL, lưu kèm file <path>.idx
+        offsets[i] là vị trí byte đầu dòng i, phần tử cuối là kích thước file
+        """
+        self.path = path
+        self.index_path = path + '.idx'
+        self.offsets = self._load() or self._build()
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def read(self, start: int, limit: int) -> List[Dict[str, Any]]:
+        """Đọc các dòng [start, start + limit) bằng một lần seek, không quét file"""
+        start = max(start, 0)
+        end = min(start + max(limit, 0), len(self))
+        if start >= end:
+            return []
+        with open(self.path, 'rb') as f:
+            f.seek(self.offsets[start])
+            chunk = f.read(self.offsets[end] - self.offsets[start])
+        return [json.loads(line) for line in chunk.splitlines() if line.strip()]
+
+    def _load(self) -> Optional[array]:
+        """Nạp chỉ mục đã lưu, bỏ qua nếu không khớp kích thước file hiện tại"""
+        try:
+            offsets = array('Q')
+            with open(self.index_path, 'rb') as f:
+                offsets.frombytes(f.read())
+        except (OSError, ValueError):
+            return None
+        if not offsets or offsets[-1] != os.path.getsize(self.path):
+            return None
+        return offsets
+
+    def _build(self) -> array:
+        """Quét file một lần theo block để tìm vị trí các ký tự xuống dòng"""
+        offsets = array('Q', [0])
+        position = 0
+        with open(self.path, 'rb') as f:
+            while True:
+                block = f.read(SCAN_BLOCK_SIZE)
+                if not block:
+                    break
+                newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == 10)
+                offsets.extend((newlines + position + 1).tolist())
+                position += len(block)
+        if offsets[-1] != position:
+            # Dòng cuối không có ký tự xuống dòng
+            offsets.append(position)
+
+        try:
+            tmp_path = self.index_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                offsets.tofile(f)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            pass
+        return offsets
+
+_cache: Dict[str, Tuple[Tuple[int, float], JsonlIndex]] = {}
+_cache_lock = threading.Lock()
+
+def get_index(path: str) -> JsonlIndex:
+    """Lấy chỉ mục của file (có cache, tự dựng lại khi file thay đổi)"""
+    stat = os.stat(path)
+    key = (stat.st_size, stat.st_mtime)
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+    index = JsonlIndex(path)
+    with _cache_lock:
+        _cache[path] = (key, index)
+    return index
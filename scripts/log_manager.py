@@ -1,168 +1,671 @@
+import atexit
+import fcntl
 import json
 import os
+import threading
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from itertools import islice
 from datetime import datetime
-from typing import Dict, List, Optional, Any
-from telegram_notifier import notifier
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from telegram_notifier import dispatcher
+from metrics import STAGE_SECONDS
+
+DEFAULT_STATUS = {
+    'status': 'Not Started',
+    'message': 'Chưa có hoạt động',
+    'status_class': 'secondary',
+    'progress': 0
+}
+
+# Snapshot dữ liệu đã xử lý chỉ giữ thống kê và đường dẫn tới file JSONL (và bản Arrow nếu có)
+EMPTY_PROCESSED_DATA = {
+    'file_path': None,
+    'arrow_path': None,
+    'manifest_path': None,
+    'timestamp': None,
+    'source': None,
+    'stats': None
+}
+
+def _write_atomic(path: str, content: str) -> None:
+    """Ghi file tạm rồi đổi tên: người đọc chỉ thấy nội dung cũ hoặc mới, không thấy file ghi dở"""
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
 
 class LogManager:
-    def __init__(self, log_dir: str):
-        """Khởi tạo LogManager với thư mục lưu logs"""
+    def __init__(self, log_dir: str, buffer_size: int = 1000,
+                 flush_interval: float = 1.0, flush_batch_size: int = 100,
+                 max_file_entries: int = 100000):
+        """Khởi tạo LogManager với thư mục lưu logs
+        Args:
+            log_dir: Thư mục lưu logs
+            buffer_size: Số log gần nhất giữ trong bộ nhớ cho mỗi loại log
+            flush_interval: Chu kỳ (giây) ghi các log đang chờ xuống đĩa
+            flush_batch_size: Số log đang chờ để kích hoạt ghi sớm
+            max_file_entries: Số entry tối đa của một file log (và chỉ mục offset trong bộ nhớ),
+                vượt quá thì phần cũ được chuyển sang file lưu trữ <type>_logs.1.jsonl (không phân trang)
+        """
         self.log_dir = log_dir
         os.makedirs(log_dir, exist_ok=True)
         
-        # File paths cho từng loại log
+        # File paths cho từng loại log (JSONL: mỗi dòng một entry, chỉ ghi nối)
         self.log_files = {
-            'webhook': os.path.join(log_dir, 'webhook_logs.json'),
-            'training': os.path.join(log_dir, 'training_logs.json'),
-            'upload': os.path.join(log_dir, 'upload_logs.json')
+            'webhook': os.path.join(log_dir, 'webhook_logs.jsonl'),
+            'training': os.path.join(log_dir, 'training_logs.jsonl'),
+            'upload': os.path.join(log_dir, 'upload_logs.jsonl')
         }
         
         # File path cho processed data
         self.processed_data_file = os.path.join(log_dir, 'processed_data.json')
         
+        # Khóa giữa các tiến trình: mỗi file log có một file .lock riêng,
+        # không bị thay thế khi file log được ghi đè
+        self._lock_files = {
+            log_type: open(log_file + '.lock', 'a')
+            for log_type, log_file in self.log_files.items()
+        }
+        
+        # Chuyển đổi file logs dạng JSON array cũ sang JSONL
+        for log_type in self.log_files:
+            self._migrate_legacy_logs(log_type)
+        
         # Khởi tạo file logs nếu chưa tồn tại
         for log_file in self.log_files.values():
             if not os.path.exists(log_file):
-                with open(log_file, 'w', encoding='utf-8') as f:
-                    json.dump([], f, ensure_ascii=False)
+                open(log_file, 'a', encoding='utf-8').close()
                     
         # Khởi tạo file processed data nếu chưa tồn tại
         if not os.path.exists(self.processed_data_file):
-            self._write_processed_data({
-                'raw': None,
-                'normalized': None,
-                'file_path': None,
-                'timestamp': None,
-                'source': None,
-                'stats': None
-            })
+            self._write_processed_data(EMPTY_PROCESSED_DATA)
+        self._processed_data = self._read_processed_data()
+        
+        # Bộ đệm vòng (ring buffer) và cache trạng thái trong bộ nhớ,
+        # nạp một lần từ đĩa khi khởi động
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+        self.max_file_entries = max(max_file_entries, 2 * buffer_size)
+        self._lock = threading.Lock()
+        self._buffers = {}
+        
+        # Chỉ mục offset: vị trí byte và timestamp của từng entry theo thứ tự,
+        # dùng để đọc một trang logs mà không phải quét lại file. Kích thước bị chặn bởi
+        # max_file_entries (file được xoay vòng), inode để nhận ra file đã bị thay bởi tiến trình khác
+        self._offsets = {}
+        self._end_offsets = {}
+        self._timestamps = {}
+        self._inodes = {}
+        # Id event (bus nhiều worker) cuối cùng đã có trong bộ nhớ / đã ghi hoặc chờ ghi xuống đĩa
+        self._event_ids = {}
+        self._persisted_ids = {}
+        for log_type in self.log_files:
+            self._build_index(log_type)
+        self._status = {
+            log_type: self._read_status(log_type)
+            for log_type in self.log_files
+        }
+        
+        # Các thay đổi chưa ghi xuống đĩa (write-behind)
+        self._pending_logs = {log_type: [] for log_type in self.log_files}
+        self._pending_count = 0
+        self._dirty_status = set()
+        # Lô đang được luồng nền ghi (đã tách khỏi _pending_logs, chưa có trong chỉ mục offset)
+        self._flushing = {log_type: [] for log_type in self.log_files}
+        # Chỉ một lượt ghi đĩa tại một thời điểm; clear_logs chờ lô đang ghi xong.
+        # Thứ tự khóa: self._flush_lock -> khóa file -> self._lock
+        self._flush_lock = threading.Lock()
+        
+        # Luồng nền ghi dữ liệu xuống đĩa theo lô
+        self._flush_event = threading.Event()
+        self._stopped = False
+        self._flusher = threading.Thread(target=self._flush_loop, name='log-flusher', daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
 
     def add_log(self, log_type: str, data: Dict[str, Any]) -> None:
         """Thêm một log mới"""
-        if log_type not in self.log_files:
-            return
-            
         # Thêm timestamp vào log
-        log_entry = {
+        self.ingest(log_type, {
             'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             **data
-        }
-        
-        # Đọc logs hiện tại
-        logs = self._read_logs(log_type)
-        logs.append(log_entry)
-        
-        # Lưu logs
-        self._write_logs(log_type, logs)
+        })
+
+    def ingest(self, log_type: str, log_entry: Dict[str, Any],
+               event_id: Optional[int] = None, persist: bool = True) -> Optional[int]:
+        """
+        Thêm một log entry đã có timestamp
+        Args:
+            log_type: Loại log
+            log_entry: Entry cần thêm
+            event_id: Id event trên bus dùng chung (chế độ nhiều worker), được lưu kèm entry
+            persist: Ghi xuống đĩa và gửi Telegram. Worker không phải leader truyền False,
+                chỉ cập nhật ring buffer và trạng thái trong bộ nhớ
+        Returns:
+            int: Số thứ tự của entry (cùng cách đánh số với cursor của get_logs_page),
+                None nếu không phải loại log hoặc entry đã có
+        """
+        if log_type not in self.log_files:
+            return None
+        status = {key: value for key, value in log_entry.items() if key not in ('timestamp', 'event_id')}
         
-        # Cập nhật trạng thái hiện tại
-        self._update_current_status(log_type, data)
+        with self._lock:
+            if event_id is not None:
+                if event_id <= self._event_ids[log_type]:
+                    # Entry đã có (nạp từ file hoặc đã nhận trước đó)
+                    return None
+                self._event_ids[log_type] = event_id
+                log_entry = {**log_entry, 'event_id': event_id}
+            
+            # Cập nhật bộ nhớ, việc ghi đĩa do luồng nền đảm nhận
+            self._buffers[log_type].append(log_entry)
+            self._timestamps[log_type].append(log_entry['timestamp'])
+            index = len(self._timestamps[log_type]) - 1
+            
+            # Cập nhật trạng thái hiện tại
+            self._status[log_type] = status
+            
+            if persist:
+                self._pending_logs[log_type].append(log_entry)
+                self._pending_count += 1
+                self._dirty_status.add(log_type)
+                if event_id is not None:
+                    self._persisted_ids[log_type] = event_id
+                if self._pending_count >= self.flush_batch_size:
+                    self._flush_event.set()
         
         # Gửi thông báo Telegram cho webhook và training
-        if log_type in ['webhook', 'training']:
-            self._send_telegram_notification(log_type, data)
+        if persist and log_type in ['webhook', 'training']:
+            self._send_telegram_notification(log_type, status)
+        return index
+
+    def persist_missing(self, log_type: str,
+                        replay: Callable[[int], Iterable[Tuple[int, Dict[str, Any]]]]) -> int:
+        """
+        Khi trở thành leader: ghi các entry đã có trong bộ nhớ nhưng leader cũ chưa kịp ghi
+        Args:
+            log_type: Loại log
+            replay: Hàm trả về các (event_id, entry) sau một id, theo thứ tự id
+        Returns:
+            int: Số entry được đưa vào hàng chờ ghi
+        """
+        with self._flush_lock, self._lock:
+            self._extend_index(log_type)
+            written = 0
+            for event_id, log_entry in replay(self._persisted_ids[log_type]):
+                if self._persisted_ids[log_type] < event_id <= self._event_ids[log_type]:
+                    self._pending_logs[log_type].append({**log_entry, 'event_id': event_id})
+                    self._persisted_ids[log_type] = event_id
+                    written += 1
+            if written:
+                self._pending_count += written
+                self._dirty_status.add(log_type)
+                self._flush_event.set()
+            return written
+
+    def last_event_id(self, log_type: str) -> int:
+        """Id event cuối cùng của loại log này đã có trong bộ nhớ"""
+        with self._lock:
+            return self._event_ids[log_type]
 
     def get_logs(self, log_type: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
-        """Lấy tất cả logs hoặc logs của một loại cụ thể"""
-        if log_type:
-            if log_type not in self.log_files:
-                return []
-            return self._read_logs(log_type)
-            
-        # Trả về tất cả logs
-        return {
-            log_type: self._read_logs(log_type)
-            for log_type in self.log_files.keys()
-        }
+        """Lấy các logs gần nhất (từ bộ nhớ) của tất cả hoặc một loại cụ thể"""
+        with self._lock:
+            if log_type:
+                if log_type not in self.log_files:
+                    return []
+                return list(self._buffers[log_type])
+                
+            # Trả về tất cả logs
+            return {
+                log_type: list(buffer)
+                for log_type, buffer in self._buffers.items()
+            }
 
-    def clear_logs(self, log_type: Optional[str] = None) -> None:
-        """Xóa logs"""
+    def clear_logs(self, log_type: Optional[str] = None, persist: bool = True) -> None:
+        """Xóa logs (persist=False: chỉ xóa trong bộ nhớ, file do leader xóa)"""
         if log_type:
-            if log_type in self.log_files:
-                self._write_logs(log_type, [])
-                # Reset status
-                self._update_current_status(log_type, {
-                    'status': 'Not Started',
-                    'message': 'Chưa có hoạt động',
-                    'status_class': 'secondary',
-                    'progress': 0
-                })
+            if log_type not in self.log_files:
+                return
+            log_types = [log_type]
         else:
             # Xóa tất cả logs
-            for log_type in self.log_files:
-                self._write_logs(log_type, [])
-                self._update_current_status(log_type, {
-                    'status': 'Not Started',
-                    'message': 'Chưa có hoạt động',
-                    'status_class': 'secondary',
-                    'progress': 0
-                })
+            log_types = list(self.log_files)
+            
+        # Giữ self._flush_lock: lô đang ghi (nếu có) ghi xong trước, không lô nào ghi nối vào file vừa xóa
+        with self._flush_lock:
+            for log_type in log_types:
+                if persist:
+                    with self._file_lock(log_type):
+                        self._write_logs(log_type, [])
+                        archive_file = os.path.splitext(self.log_files[log_type])[0] + '.1.jsonl'
+                        if os.path.exists(archive_file):
+                            os.remove(archive_file)
+                    self._update_current_status(log_type, DEFAULT_STATUS)
+            with self._lock:
+                for log_type in log_types:
+                    self._buffers[log_type].clear()
+                    self._pending_count -= len(self._pending_logs[log_type])
+                    self._pending_logs[log_type] = []
+                    self._offsets[log_type] = []
+                    self._end_offsets[log_type] = 0
+                    self._timestamps[log_type] = []
+                    self._inodes[log_type] = self._file_inode(log_type)
+                    # Reset status
+                    self._status[log_type] = dict(DEFAULT_STATUS)
+                    self._dirty_status.discard(log_type)
 
-    def get_current_status(self, log_type: str) -> Dict[str, Any]:
-        """Lấy trạng thái hiện tại của một loại log"""
-        status_file = os.path.join(self.log_dir, f'{log_type}_status.json')
-        
-        if not os.path.exists(status_file):
-            return {
-                'status': 'Not Started',
-                'message': 'Chưa có hoạt động',
-                'status_class': 'secondary',
-                'progress': 0
-            }
+    def get_logs_page(self, log_type: str, cursor: int = 0, limit: int = 100,
+                      since: Optional[str] = None, tail: bool = False) -> Dict[str, Any]:
+        """
+        Lấy một trang logs của một loại log
+        Args:
+            log_type: Loại log
+            cursor: Số thứ tự entry bắt đầu (next_cursor của trang trước)
+            limit: Số entry tối đa trong trang
+            since: Chỉ lấy các entry có timestamp >= since ('%Y-%m-%d %H:%M:%S')
+            tail: Lấy limit entry mới nhất (bỏ qua cursor), thường nằm trong ring buffer
+        Returns:
+            dict: entries, cursor, next_cursor và total
+        """
+        with self._lock:
+            if not self._flushing[log_type] and self._file_inode(log_type) != self._inodes[log_type]:
+                # Leader (tiến trình khác) đã xoay vòng hoặc xóa file: chỉ mục cũ không còn đúng
+                self._reload_replaced(log_type)
+            timestamps = self._timestamps[log_type]
+            total = len(timestamps)
+            start = max(total - max(limit, 0), 0) if tail else max(cursor, 0)
+            if since:
+                start = max(start, bisect_left(timestamps, since))
+            start = min(start, total)
+            end = min(start + max(limit, 0), total)
+            
+            buffer = self._buffers[log_type]
+            buffer_start = total - len(buffer)
+            if start >= buffer_start:
+                # Trang nằm trong ring buffer: phục vụ từ bộ nhớ
+                entries = list(islice(buffer, start - buffer_start, end - buffer_start))
+            else:
+                # Entry cũ hơn ring buffer: đọc đúng đoạn cần thiết qua chỉ mục offset
+                # (khi đang ghi một lô, phần cuối file là của lô đó, chưa đưa vào chỉ mục)
+                if end > len(self._offsets[log_type]) and not self._flushing[log_type]:
+                    self._extend_index(log_type)
+                flushed = len(self._offsets[log_type])
+                entries = self._read_range(log_type, start, min(end, flushed))
+                if end > flushed:
+                    # Phần chưa có trên đĩa: entry đang ghi/chờ ghi, hoặc (worker không phải leader)
+                    # entry leader chưa kịp ghi, lấy từ ring buffer
+                    tail_start = max(start, flushed)
+                    pending = self._flushing[log_type] + self._pending_logs[log_type]
+                    if pending:
+                        entries.extend(pending[tail_start - flushed:end - flushed])
+                    else:
+                        entries.extend(islice(buffer, max(tail_start - buffer_start, 0), end - buffer_start))
             
-        try:
-            with open(status_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
             return {
-                'status': 'Not Started',
-                'message': 'Chưa có hoạt động',
-                'status_class': 'secondary',
-                'progress': 0
+                'type': log_type,
+                'entries': entries,
+                'cursor': start,
+                'next_cursor': start + len(entries),
+                'total': total
             }
 
+    def get_current_status(self, log_type: str) -> Dict[str, Any]:
+        """Lấy trạng thái hiện tại của một loại log (từ cache trong bộ nhớ)"""
+        with self._lock:
+            return dict(self._status.get(log_type, DEFAULT_STATUS))
+
+    def flush(self) -> None:
+        """
+        Ghi toàn bộ logs và trạng thái đang chờ xuống đĩa. Lô cần ghi được tách ra trong self._lock,
+        việc ghi và fsync chạy ngoài khóa đó nên ingest/add_log và get_current_status không chờ đĩa
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending_logs = {
+                    log_type: entries
+                    for log_type, entries in self._pending_logs.items()
+                    if entries
+                }
+                self._flushing.update(pending_logs)
+                self._pending_logs = {log_type: [] for log_type in self.log_files}
+                self._pending_count = 0
+                dirty_status = {
+                    log_type: self._status[log_type]
+                    for log_type in self._dirty_status
+                }
+                self._dirty_status = set()
+            
+            try:
+                for log_type, entries in pending_logs.items():
+                    self._append_logs(log_type, entries)
+            finally:
+                with self._lock:
+                    for log_type in pending_logs:
+                        self._flushing[log_type] = []
+            for log_type in pending_logs:
+                if len(self._offsets[log_type]) > self.max_file_entries:
+                    self._rotate(log_type)
+            for log_type, status in dirty_status.items():
+                self._update_current_status(log_type, status)
+
+    def pending_count(self) -> int:
+        """Số log đang chờ ghi xuống đĩa"""
+        with self._lock:
+            return self._pending_count
+
+    def close(self) -> None:
+        """Dừng luồng nền và ghi nốt dữ liệu đang chờ"""
+        self._stopped = True
+        self._flush_event.set()
+        if self._flusher.is_alive() and self._flusher is not threading.current_thread():
+            self._flusher.join(timeout=5)
+        self.flush()
+
     def update_processed_data(self, data: Dict[str, Any]) -> None:
         """Cập nhật dữ liệu đã xử lý"""
+        with self._lock:
+            self._processed_data = dict(data)
         self._write_processed_data(data)
 
+    def reload_processed_data(self) -> None:
+        """Nạp lại snapshot từ file (do worker khác cập nhật)"""
+        data = self._read_processed_data()
+        with self._lock:
+            self._processed_data = data
+
     def get_processed_data(self) -> Dict[str, Any]:
-        """Lấy dữ liệu đã xử lý gần nhất"""
+        """Lấy dữ liệu đã xử lý gần nhất (từ cache trong bộ nhớ)"""
+        with self._lock:
+            return dict(self._processed_data)
+
+    def _read_processed_data(self) -> Dict[str, Any]:
+        """Đọc snapshot từ file, bỏ các trường raw/normalized của định dạng cũ"""
         try:
             with open(self.processed_data_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return {
-                'raw': None,
-                'normalized': None,
-                'file_path': None,
-                'timestamp': None,
-                'source': None,
-                'stats': None
-            }
+                data = json.load(f)
+        except (OSError, ValueError):
+            return dict(EMPTY_PROCESSED_DATA)
+        return {key: data.get(key) for key in EMPTY_PROCESSED_DATA}
 
     def _read_logs(self, log_type: str) -> List[Dict[str, Any]]:
-        """Đọc logs từ file"""
+        """Đọc logs từ file JSONL, bỏ qua các dòng hỏng"""
+        logs = []
         try:
             with open(self.log_files[log_type], 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        logs.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except OSError:
             return []
+        return logs
+
+    def _append_logs(self, log_type: str, entries: List[Dict[str, Any]]) -> None:
+        """
+        Ghi nối một lô log entry (đang nằm trong self._flushing) vào cuối file và cập nhật chỉ mục offset.
+        Giữ khóa file trong lúc ghi để các tiến trình khác không ghi xen vào, chỉ giữ self._lock
+        khi đối chiếu và cập nhật chỉ mục (không giữ trong lúc ghi đĩa)
+        """
+        lines = [(json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8') for entry in entries]
+        with STAGE_SECONDS.time(stage='log_append'), self._file_lock(log_type), \
+                open(self.log_files[log_type], 'ab') as f:
+            position = f.seek(0, os.SEEK_END)
+            with self._lock:
+                # Cuối bộ nhớ là các entry chưa có trên đĩa: lô này và các entry nhận thêm trong lúc ghi
+                unwritten = entries + self._pending_logs[log_type]
+                if position < self._end_offsets[log_type] or os.fstat(f.fileno()).st_ino != self._inodes[log_type]:
+                    # File đã bị tiến trình khác xóa/ghi đè: nạp lại từ file, giữ các entry chưa ghi
+                    self._reload_index(log_type, unwritten)
+                if position != self._end_offsets[log_type]:
+                    # Tiến trình khác đã ghi thêm: đưa các entry đó vào chỉ mục và bộ nhớ
+                    self._insert_before_pending(log_type, self._extend_index(log_type), len(unwritten))
+                if position != self._end_offsets[log_type]:
+                    # Dòng cuối bị ghi dở (tiến trình khác dừng giữa chừng): kết thúc dòng đó
+                    f.write(b'\n')
+                    position += 1
+            f.write(b''.join(lines))
+            f.flush()
+            with self._lock:
+                offsets = self._offsets[log_type]
+                for line in lines:
+                    offsets.append(position)
+                    position += len(line)
+                self._end_offsets[log_type] = position
+
+    def _insert_before_pending(self, log_type: str, entries: List[Dict[str, Any]], pending: int) -> None:
+        """Chèn entry do tiến trình khác ghi vào bộ nhớ, trước pending entry đang được ghi (cuối buffer)"""
+        if not entries:
+            return
+        timestamps = self._timestamps[log_type]
+        split = len(timestamps) - pending
+        timestamps[split:split] = [entry.get('timestamp', '') for entry in entries]
+        buffer = self._buffers[log_type]
+        tail = [buffer.pop() for _ in range(min(pending, len(buffer)))]
+        buffer.extend(entries)
+        buffer.extend(reversed(tail))
+
+    def _reload_index(self, log_type: str, pending: List[Dict[str, Any]]) -> None:
+        """Dựng lại chỉ mục và bộ nhớ từ file, rồi thêm lại các pending entry (chưa có trên đĩa)"""
+        self._build_index(log_type)
+        for entry in pending:
+            self._buffers[log_type].append(entry)
+            self._timestamps[log_type].append(entry.get('timestamp', ''))
+
+    def _rotate(self, log_type: str) -> None:
+        """
+        Xoay vòng file log quá max_file_entries entry: phần cũ được ghi nối vào <type>_logs.1.jsonl,
+        file chỉ giữ nửa mới và chỉ mục offset được dịch theo (không quét lại file). Đọc/ghi đĩa ngoài self._lock,
+        chỉ đổi file và chỉ mục trong khóa để trang logs không đọc chỉ mục cũ trên file mới
+        """
+        log_file = self.log_files[log_type]
+        with STAGE_SECONDS.time(stage='log_rotate'), self._file_lock(log_type):
+            with self._lock:
+                offsets = self._offsets[log_type]
+                drop = len(offsets) - self.max_file_entries // 2
+                if drop <= 0:
+                    return
+                cut = offsets[drop]
+                end = self._end_offsets[log_type]
+            with open(log_file, 'rb') as f:
+                data = f.read(end)
+            with open(os.path.splitext(log_file)[0] + '.1.jsonl', 'ab') as archive:
+                archive.write(data[:cut])
+                archive.flush()
+                os.fsync(archive.fileno())
+            tmp_path = f'{log_file}.{os.getpid()}.rotate.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data[cut:])
+                f.flush()
+                os.fsync(f.fileno())
+            with self._lock:
+                os.replace(tmp_path, log_file)
+                self._inodes[log_type] = self._file_inode(log_type)
+                self._offsets[log_type] = [offset - cut for offset in self._offsets[log_type][drop:]]
+                self._end_offsets[log_type] -= cut
+                del self._timestamps[log_type][:drop]
+
+    def _file_inode(self, log_type: str) -> Optional[int]:
+        try:
+            return os.stat(self.log_files[log_type]).st_ino
+        except OSError:
+            return None
+
+    def _reload_replaced(self, log_type: str) -> None:
+        """
+        Dựng lại chỉ mục khi file log bị thay (gọi khi giữ self._lock), giữ các entry trong bộ nhớ
+        mà leader chưa ghi xuống file mới
+        """
+        memory = list(self._buffers[log_type])
+        last_event_id = self._event_ids[log_type]
+        self._build_index(log_type)
+        written_id = self._event_ids[log_type]
+        for entry in memory:
+            if (entry.get('event_id') or 0) > written_id:
+                self._buffers[log_type].append(entry)
+                self._timestamps[log_type].append(entry.get('timestamp', ''))
+        self._event_ids[log_type] = max(written_id, last_event_id)
+
+    @contextmanager
+    def _file_lock(self, log_type: str):
+        """Khóa ghi file log giữa các tiến trình (lấy trước self._lock)"""
+        lock_file = self._lock_files[log_type]
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _build_index(self, log_type: str) -> None:
+        """Quét file một lần khi khởi động để dựng chỉ mục offset và ring buffer"""
+        offsets = []
+        timestamps = []
+        buffer = deque(maxlen=self.buffer_size)
+        position = 0
+        last_event_id = 0
+        with open(self.log_files[log_type], 'rb') as f:
+            self._inodes[log_type] = os.fstat(f.fileno()).st_ino
+            for line in f:
+                line_offset = position
+                position += len(line)
+                if not line.endswith(b'\n'):
+                    # Dòng cuối bị ghi dở: bỏ qua, lần ghi sau sẽ kết thúc dòng này trước
+                    position -= len(line)
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                offsets.append(line_offset)
+                timestamps.append(entry.get('timestamp', ''))
+                buffer.append(entry)
+                last_event_id = max(last_event_id, entry.get('event_id') or 0)
+        self._offsets[log_type] = offsets
+        self._end_offsets[log_type] = position
+        self._timestamps[log_type] = timestamps
+        self._buffers[log_type] = buffer
+        self._event_ids[log_type] = last_event_id
+        self._persisted_ids[log_type] = last_event_id
+
+    def _extend_index(self, log_type: str) -> List[Dict[str, Any]]:
+        """
+        Thêm vào chỉ mục offset các dòng tiến trình khác (vd. leader) đã ghi thêm vào cuối file
+        Returns:
+            list: Các entry mới đọc được
+        """
+        position = self._end_offsets[log_type]
+        entries = []
+        try:
+            if os.path.getsize(self.log_files[log_type]) <= position:
+                return entries
+            with open(self.log_files[log_type], 'rb') as f:
+                f.seek(position)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        # Dòng đang được ghi dở
+                        break
+                    line_offset = position
+                    position += len(line)
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._offsets[log_type].append(line_offset)
+                    self._persisted_ids[log_type] = max(self._persisted_ids[log_type], entry.get('event_id') or 0)
+                    entries.append(entry)
+        except OSError:
+            return entries
+        self._end_offsets[log_type] = position
+        return entries
+
+    def _read_range(self, log_type: str, start: int, end: int) -> List[Dict[str, Any]]:
+        """Đọc các entry [start, end) đã ghi xuống đĩa bằng cách seek theo chỉ mục"""
+        if start >= end:
+            return []
+        offsets = self._offsets[log_type]
+        stop = offsets[end] if end < len(offsets) else self._end_offsets[log_type]
+        with open(self.log_files[log_type], 'rb') as f:
+            f.seek(offsets[start])
+            chunk = f.read(stop - offsets[start])
+        entries = []
+        for line in chunk.splitlines():
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # Dòng hỏng không có trong chỉ mục
+                continue
+        return entries
 
     def _write_logs(self, log_type: str, logs: List[Dict[str, Any]]) -> None:
-        """Ghi logs vào file"""
-        with open(self.log_files[log_type], 'w', encoding='utf-8') as f:
-            json.dump(logs, f, ensure_ascii=False, indent=2)
+        """Ghi đè toàn bộ logs vào file (ghi file tạm rồi đổi tên)"""
+        with STAGE_SECONDS.time(stage='log_rewrite'):
+            _write_atomic(self.log_files[log_type], ''.join(
+                json.dumps(log_entry, ensure_ascii=False) + '\n' for log_entry in logs
+            ))
+
+    def _migrate_legacy_logs(self, log_type: str) -> None:
+        """Chuyển file <type>_logs.json (JSON array) cũ sang JSONL"""
+        legacy_file = os.path.splitext(self.log_files[log_type])[0] + '.json'
+        if not os.path.exists(legacy_file):
+            return
+            
+        try:
+            with open(legacy_file, 'r', encoding='utf-8') as f:
+                legacy_logs = json.load(f)
+        except (OSError, ValueError):
+            legacy_logs = []
+        if not isinstance(legacy_logs, list):
+            legacy_logs = []
+            
+        # Giữ lại các entry đã có trong JSONL (nếu có) sau các entry cũ
+        with self._file_lock(log_type):
+            logs = legacy_logs + self._read_logs(log_type)
+            self._write_logs(log_type, logs)
+            os.remove(legacy_file)
+
+    def _read_status(self, log_type: str) -> Dict[str, Any]:
+        """Đọc trạng thái đã lưu từ file"""
+        status_file = os.path.join(self.log_dir, f'{log_type}_status.json')
+        try:
+            with open(status_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return dict(DEFAULT_STATUS)
+
+    def _flush_loop(self) -> None:
+        """Luồng nền: ghi dữ liệu theo chu kỳ hoặc khi đủ lô"""
+        while not self._stopped:
+            self._flush_event.wait(self.flush_interval)
+            self._flush_event.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing logs: {str(e)}")
 
     def _update_current_status(self, log_type: str, status: Dict[str, Any]) -> None:
         """Cập nhật trạng thái hiện tại"""
         status_file = os.path.join(self.log_dir, f'{log_type}_status.json')
-        with open(status_file, 'w', encoding='utf-8') as f:
-            json.dump(status, f, ensure_ascii=False, indent=2)
+        with STAGE_SECONDS.time(stage='log_status_write'):
+            _write_atomic(status_file, json.dumps(status, ensure_ascii=False, indent=2))
 
     def _write_processed_data(self, data: Dict[str, Any]) -> None:
         """Ghi dữ liệu đã xử lý vào file"""
-        with open(self.processed_data_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        with STAGE_SECONDS.time(stage='processed_data_write'):
+            _write_atomic(self.processed_data_file, json.dumps(data, ensure_ascii=False, indent=2))
             
     def _send_telegram_notification(self, log_type: str, data: Dict[str, Any]) -> None:
         """Gửi thông báo qua Telegram dựa trên loại log và dữ liệu"""
@@ -175,16 +678,17 @@ class LogManager:
                     f"📊 Thống kê:\n"
                     f"- Tổng số mẫu: {stats.get('total_raw', 0)}\n"
                     f"- Mẫu hợp lệ: {stats.get('total_normalized', 0)}\n"
-                    f"- Mẫu không hợp lệ: {stats.get('invalid', 0)}\n\n"
+                    f"- Mẫu không hợp lệ: {stats.get('invalid', 0)}\n"
+                    f"- Mẫu trùng lặp: {stats.get('duplicates', 0)}\n\n"
                     f"💬 Chi tiết: {data.get('message', '')}"
                 )
-                notifier.send_message(message)
+                dispatcher.enqueue(message)
             elif data.get('status') == 'Error':
                 message = (
                     "🔔 <b>Webhook Error</b>\n\n"
                     f"❌ {data.get('message', 'Có lỗi xảy ra trong quá trình xử lý webhook')}"
                 )
-                notifier.send_message(message)
+                dispatcher.enqueue(message)
 
         elif log_type == 'training':
             status = data.get('status', '')
@@ -193,19 +697,19 @@ class LogManager:
                     "🔔 <b>Training Started</b>\n\n"
                     "🚀 Bắt đầu quá trình training model..."
                 )
-                notifier.send_message(message)
+                dispatcher.enqueue(message)
             elif status == 'Completed':
                 message = (
                     "🔔 <b>Training Completed</b>\n\n"
                     "✅ Quá trình training đã hoàn thành thành công!"
                 )
-                notifier.send_message(message)
+                dispatcher.enqueue(message)
             elif status == 'Error':
                 message = (
                     "🔔 <b>Training Error</b>\n\n"
                     f"❌ {data.get('message', 'Có lỗi xảy ra trong quá trình training')}"
                 )
-                notifier.send_message(message)
+                dispatcher.enqueue(message)
             elif 'progress' in data:
                 progress = data.get('progress', 0)
                 if progress > 0 and progress % 25 == 0:  # Thông báo mỗi 25%
@@ -213,4 +717,4 @@ class LogManager:
                         "🔔 <b>Training Progress</b>\n\n"
                         f"📊 Tiến độ: {progress}%"
                     )
-                    notifier.send_message(message)
\ No newline at end of file
+                    dispatcher.enqueue(message, progress=True)
\ No newline at end of file
@@ -1,71 +1,370 @@
-from flask import Flask, request, jsonify, render_template, Response
+from flask import Flask, request, jsonify, render_template, Response, g, send_file
+import numpy as np
 import pandas as pd
 import json
 import os
+import random
+import shutil
+import tempfile
+import threading
 import time
+import zipfile
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Optional
 from werkzeug.utils import secure_filename
-from queue import Queue
-import threading
 from log_manager import LogManager
+from event_broker import EventBroker
+from event_bus import LocalEventBus, SQLiteEventBus, LeaderElection
+from normalizer import (
+    MESSAGE_COLUMNS, normalize_conversation, records_to_frame,
+    normalize_frame, frame_to_jsonl
+)
+from jsonl_index import get_index
+from arrow_dataset import ArrowDatasetWriter, arrow_available, arrow_path_for
+from sequence_packing import load_tokenizer, token_lengths, packing_report
+from upload_pool import (
+    UploadPool, DATA_EXTENSIONS, ARCHIVE_EXTENSIONS, detect_layout, extract_archive, file_extension, read_chunks
+)
+from csv_sniffer import UnusableFileError
+from dataset_split import write_splits, shards_dir_for, MANIFEST_FILE
+from dedup_index import DedupIndex
+from near_dedup import NearDupIndex, DEFAULT_THRESHOLD, NUM_PERM
+from metrics import registry, STAGE_SECONDS, CONTENT_TYPE
+from telegram_notifier import dispatcher
+from request_profiler import RequestProfiler, collapsed_stacks
+from job_scheduler import TrainingScheduler, FINISHED_STATES, QUEUED, RUNNING
+from job_store import JobStore
 
 app = Flask(__name__, template_folder='templates')
 
 # Thư mục lưu trữ
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data"))
 UPLOAD_DIR = os.path.join(DATA_DIR, "uploads")
 LOG_DIR = os.path.join(DATA_DIR, "logs")
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "configs")
+TRAINING_CONFIG_FILE = os.path.join(CONFIG_DIR, "fine_tune_spa.yaml")
+CHATBOT_CONFIG_FILE = os.path.join(CONFIG_DIR, "chatbot_config.json")
 os.makedirs(DATA_DIR, exist_ok=True)
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(LOG_DIR, exist_ok=True)
 
 # Khởi tạo Log Manager
-log_manager = LogManager(LOG_DIR)
+# Mỗi file log giữ tối đa LOG_MAX_ENTRIES entry (chỉ mục offset trong bộ nhớ không tăng mãi), phần cũ
+# được chuyển sang <type>_logs.1.jsonl
+log_manager = LogManager(LOG_DIR, max_file_entries=int(os.getenv('LOG_MAX_ENTRIES', 100000)))
+
+# Chỉ mục chống trùng lặp và dataset tổng hợp các cặp hội thoại không trùng
+CANONICAL_DATASET = os.path.join(DATA_DIR, "training_canonical.jsonl")
+# Tìm các cặp gần trùng (MinHash/LSH, độ tương đồng >= NEAR_DUP_THRESHOLD): mặc định 'report' chỉ ghi
+# báo cáo <dataset>.near_dups.json và vẫn giữ các cặp, '1' loại chúng khỏi dataset, '0' tắt
+NEAR_DEDUP = os.getenv('NEAR_DEDUP', 'report')
+NEAR_DUP_NUM_PERM = int(os.getenv('NEAR_DUP_NUM_PERM', NUM_PERM))
+near_dup_index = NearDupIndex(
+    os.path.join(DATA_DIR, "dedup", f"minhash_{NEAR_DUP_NUM_PERM}.bin"), CANONICAL_DATASET,
+    threshold=float(os.getenv('NEAR_DUP_THRESHOLD', DEFAULT_THRESHOLD)), num_perm=NEAR_DUP_NUM_PERM,
+    drop=NEAR_DEDUP == '1'
+) if NEAR_DEDUP in ('1', 'report') else None
+dedup_index = DedupIndex(os.path.join(DATA_DIR, "dedup", "pair_hashes.bin"), CANONICAL_DATASET, near_dup_index)
 
 # Cấu hình upload
-ALLOWED_EXTENSIONS = {'csv', 'xlsx'}
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max-limit
+ALLOWED_EXTENSIONS = DATA_EXTENSIONS | ARCHIVE_EXTENSIONS
+# File được đọc và xử lý theo từng chunk nên bộ nhớ không tăng theo kích thước file
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_UPLOAD_MB', 512)) * 1024 * 1024
 app.config['UPLOAD_FOLDER'] = UPLOAD_DIR
+UPLOAD_CHUNK_ROWS = 10000
+# Nhiều file / file zip được đọc và chuẩn hóa song song bằng pool tiến trình,
+# một file đọc quá UPLOAD_FILE_TIMEOUT giây bị báo lỗi và tiến trình đọc nó bị dừng
+upload_pool = UploadPool(
+    int(os.getenv('UPLOAD_WORKERS', os.cpu_count() or 1)), float(os.getenv('UPLOAD_FILE_TIMEOUT', 600))
+)
+MAX_UNZIPPED_BYTES = int(os.getenv('MAX_UNZIPPED_MB', 4 * int(os.getenv('MAX_UPLOAD_MB', 512)))) * 1024 * 1024
+
+# Xuất thêm bản Arrow (dạng cột, đọc bằng memory map) cho mỗi dataset, bật mặc định (cần pyarrow).
+# Đặt ARROW_EXPORT=1 mà thiếu pyarrow thì dừng khởi động; mặc định thì chỉ cảnh báo và bỏ qua bản Arrow
+ARROW_EXPORT = os.getenv('ARROW_EXPORT', '1') == '1'
+if ARROW_EXPORT and not arrow_available():
+    if os.getenv('ARROW_EXPORT') == '1':
+        raise RuntimeError('ARROW_EXPORT=1 nhưng chưa cài pyarrow (pip install -r requirements.txt)')
+    print("Warning: pyarrow chưa được cài đặt, không xuất dataset Arrow (cài pyarrow hoặc đặt ARROW_EXPORT=0)")
+    ARROW_EXPORT = False
+
+def load_context_length() -> int:
+    """context_length của chatbot (configs/chatbot_config.json)"""
+    try:
+        with open(CHATBOT_CONFIG_FILE, 'r', encoding='utf-8') as f:
+            return int(json.load(f).get('context_length', 4096))
+    except (OSError, ValueError):
+        return 4096
+
+# Chia train/eval theo hash của cặp (ổn định khi dữ liệu tăng) và ghi mỗi tập thành nhiều shard
+EVAL_SPLIT_RATIO = float(os.getenv('EVAL_SPLIT_RATIO', 0.1))
+DATASET_SHARDS = int(os.getenv('DATASET_SHARDS', 4))
+
+# Báo cáo độ dài mẫu và token padding tiết kiệm được khi trainer đóng gói các mẫu ngắn thành chuỗi
+# gần đủ context length (packing của trainer, xem configs/fine_tune_spa.yaml)
+SEQUENCE_PACKING = os.getenv('SEQUENCE_PACKING', '1') == '1'
+PACKING_CONTEXT_LENGTH = int(os.getenv('PACKING_CONTEXT_LENGTH', load_context_length()))
+PACKING_BATCH_SIZE = int(os.getenv('TRAINING_BATCH_SIZE', 4))
+packing_tokenizer = load_tokenizer() if SEQUENCE_PACKING else None
+
+# Profile theo request cho các endpoint nhận dữ liệu, mặc định tắt: bật cho từng request bằng header
+# X-Profile: 1 khi đặt PROFILE_HEADER=1 (webhook/upload là endpoint công khai, không để client ngoài tự bật)
+# hoặc lấy mẫu ngẫu nhiên PROFILE_SAMPLE_RATE (0..1) request. Tắt thì không tốn gì thêm và /profiles trả 404
+PROFILED_ENDPOINTS = {'upload_file', 'sheets_webhook'}
+PROFILE_HEADER = os.getenv('PROFILE_HEADER', '0') == '1'
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILING_ENABLED = PROFILE_HEADER or PROFILE_SAMPLE_RATE > 0
+request_profiler = RequestProfiler(
+    os.path.join(LOG_DIR, "profiles"), max_profiles=int(os.getenv('PROFILE_MAX_FILES', 50))
+)
+
+# Phân trang cho /processed-data/preview
+PREVIEW_PAGE_SIZE = 50
+PREVIEW_MAX_PAGE_SIZE = 500
+
+# Lưu training job vào SQLite để không mất trạng thái khi restart
+job_store = JobStore(os.path.join(LOG_DIR, "training_jobs.db"))
 
-# Queue cho SSE events
-event_queue = Queue()
+# Hàng đợi training: gộp các dataset tới dồn dập thành một lượt chạy trên tất cả dataset đã gộp
+# (mỗi dataset chỉ chứa các cặp mới của lượt xử lý đó)
+TRAINING_JOBS_DIR = os.path.join(DATA_DIR, "jobs")
+training_scheduler = TrainingScheduler(
+    lambda job: demo_finetune(job.datasets, job.cancel_event, job.id),
+    workers=int(os.getenv('TRAINING_WORKERS', 1)),
+    max_queue_size=int(os.getenv('TRAINING_QUEUE_SIZE', 10)),
+    debounce_seconds=float(os.getenv('TRAINING_DEBOUNCE_SECONDS', 5)),
+    max_delay_seconds=float(os.getenv('TRAINING_MAX_DELAY_SECONDS', 60)),
+    cancel_running=os.getenv('TRAINING_CANCEL_SUPERSEDED', '0') == '1',
+    store=job_store
+)
+
+# Phân trang cho /logs
+LOGS_PAGE_SIZE = 100
+LOGS_MAX_PAGE_SIZE = 1000
+
+# Broker phân phối SSE events tới từng client
+event_broker = EventBroker(replay=lambda last_event_id: replay_sse_events(last_event_id))
+SSE_KEEPALIVE_SECONDS = 15
+
+# Bus event: mọi event (logs, trạng thái, SSE) và lệnh điều khiển đều đi qua bus.
+# Một tiến trình: LocalEventBus giao event ngay. Nhiều worker (create_app(multiprocess=True)):
+# SQLiteEventBus dùng chung, mỗi worker nhận đủ event nên worker nào cũng phục vụ được /events
+event_bus = LocalEventBus()
+EVENT_BUS_DB = os.path.join(LOG_DIR, "event_bus.db")
+LEADER_LOCK_FILE = os.path.join(LOG_DIR, "leader.lock")
+# Loại event chứa lệnh điều khiển giữa các worker (không gửi tới client SSE)
+CONTROL_EVENT = '_control'
+
+# Chế độ nhiều worker: chỉ leader ghi logs xuống đĩa, gửi Telegram và chạy training.
+# Khóa này đảm bảo việc chuyển sang leader không chen vào giữa lúc xử lý một event
+leader_election: Optional[LeaderElection] = None
+_leading = False
+_bus_lock = threading.RLock()
+_app_lock = threading.Lock()
+
+# Metrics cho /metrics (Prometheus): histogram thời gian các bước nằm trong metrics.STAGE_SECONDS,
+# các gauge được đọc từ trạng thái sẵn có lúc scrape
+ROWS_IN = registry.counter('spa_rows_in_total', 'Số dòng nhận được', ['source'])
+ROWS_KEPT = registry.counter('spa_rows_kept_total', 'Số cặp hội thoại mới được giữ lại', ['source'])
+ROWS_INVALID = registry.counter('spa_rows_invalid_total', 'Số dòng không hợp lệ bị loại', ['source'])
+ROWS_DUPLICATE = registry.counter('spa_rows_duplicate_total', 'Số cặp trùng / gần trùng bị loại', ['source', 'kind'])
+EVENTS_EMITTED = registry.counter('spa_events_emitted_total', 'Số event đã gửi qua bus', ['type'])
+HTTP_SECONDS = registry.histogram(
+    'spa_http_request_duration_seconds', 'Thời gian xử lý request (giây)', ['endpoint', 'status']
+)
+registry.gauge_callback('spa_sse_clients', 'Số client SSE đang kết nối', lambda: event_broker.stats()['subscribers'])
+registry.gauge_callback('spa_sse_queued_events', 'Số event đang chờ gửi tới client SSE',
+                        lambda: event_broker.stats()['queued'])
+registry.counter_callback('spa_sse_dropped_events_total', 'Số event bị bỏ vì client SSE đọc chậm',
+                          lambda: event_broker.stats()['dropped'])
+registry.gauge_callback('spa_telegram_queue_depth', 'Số thông báo Telegram đang chờ gửi',
+                        lambda: dispatcher.stats()['queue_depth'])
+registry.counter_callback(
+    'spa_telegram_notifications_total', 'Số thông báo Telegram theo kết quả',
+    lambda: {(result,): value for result, value in dispatcher.stats().items() if result != 'queue_depth'},
+    ['result']
+)
+registry.gauge_callback('spa_log_pending_entries', 'Số log đang chờ ghi xuống đĩa', lambda: log_manager.pending_count())
+registry.gauge_callback(
+    'spa_training_jobs', 'Số training job theo trạng thái',
+    lambda: {(state,): len(jobs) for state, jobs in training_scheduler.snapshot().items() if state in ('queued', 'running')},
+    ['state']
+)
+registry.gauge_callback('spa_dataset_unique_pairs', 'Số cặp hội thoại không trùng trong dataset tổng hợp',
+                        lambda: len(dedup_index))
+_app_initialized = False
 
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return file_extension(filename) in ALLOWED_EXTENSIONS
 
 def send_event(event_type: str, data: dict):
-    """Gửi event tới client và lưu log"""
-    event_data = {
-        'type': event_type,
+    """Gửi event qua bus: mọi worker lưu log, cập nhật trạng thái và gửi tới client"""
+    EVENTS_EMITTED.inc(type=event_type)
+    event_bus.publish(event_type, {
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
         **data
-    }
-    # Lưu log
-    log_manager.add_log(event_type, data)
-    # Gửi event
-    event_queue.put(json.dumps(event_data))
-
-def normalize_conversation(data: List[Dict[str, Any]]) -> List[Dict[str, str]]:
-    """Chuẩn hóa dữ liệu từ Google Sheets thành format JSONL"""
-    normalized = []
-    for row in data:
-        if "user_message" not in row or "assistant_message" not in row:
-            continue
-            
-        user_msg = str(row["user_message"]).strip()
-        assistant_msg = str(row["assistant_message"]).strip()
-        
-        if not user_msg or not assistant_msg or user_msg.lower() == 'nan' or assistant_msg.lower() == 'nan':
-            continue
-            
-        conversation = {
-            "messages": [
-                {"role": "user", "content": user_msg},
-                {"role": "assistant", "content": assistant_msg}
-            ]
-        }
-        normalized.append(conversation)
-    return normalized
+    })
+
+def is_leader() -> bool:
+    """Tiến trình này có ghi logs, gửi Telegram và chạy training không"""
+    return leader_election is None or _leading
+
+def handle_bus_event(event_id: int, event_type: str, payload: dict):
+    """Xử lý một event nhận từ bus (chạy ở mọi worker, theo đúng thứ tự id)"""
+    if event_type == CONTROL_EVENT:
+        handle_control(payload)
+        return
+    multiprocess = leader_election is not None
+    with _bus_lock:
+        # Lưu log (chỉ leader ghi đĩa, các worker khác cập nhật bộ nhớ)
+        log_index = log_manager.ingest(event_type, payload, event_id if multiprocess else None, persist=is_leader())
+    if event_type == 'data' and multiprocess:
+        log_manager.reload_processed_data()
+    # Gửi event, kèm số thứ tự của log entry để trang web không hiển thị lại entry đã tải qua /logs
+    data = {'type': event_type, **payload}
+    if log_index is not None:
+        data['log_index'] = log_index
+    event_broker.publish(event_type, json.dumps(data), event_id)
+
+def handle_control(payload: dict):
+    """Lệnh điều khiển: xóa logs ở mọi worker, job training chỉ do leader xử lý"""
+    action = payload.get('action')
+    if action == 'clear_logs':
+        with _bus_lock:
+            log_manager.clear_logs(payload.get('type'), persist=is_leader())
+    elif not is_leader():
+        return
+    elif action == 'submit_job':
+        training_scheduler.adopt(payload['job_id'])
+    elif action == 'cancel_job':
+        training_scheduler.cancel(payload['job_id'])
+
+# Một tiến trình: xử lý event ngay (kể cả khi dùng app trực tiếp, không qua create_app)
+event_bus.subscribe(handle_bus_event)
+
+def replay_bus_events(after_id: int, until_id: Optional[int] = None) -> Iterator[tuple]:
+    """Các event còn lưu trên bus sau after_id, đọc theo từng trang"""
+    while True:
+        events = event_bus.replay(after_id, until_id)
+        if not events:
+            return
+        yield from events
+        after_id = events[-1][0]
+
+def replay_sse_events(last_event_id: int) -> List[tuple]:
+    """Event SSE client đã lỡ, lấy từ bus khi lịch sử của broker không đủ"""
+    events = [
+        (event_id, event_type, json.dumps({'type': event_type, **payload}))
+        for event_id, event_type, payload in replay_bus_events(last_event_id)
+        if event_type != CONTROL_EVENT
+    ]
+    return events
+
+def on_elected():
+    """Worker này trở thành leader: ghi nốt logs leader cũ chưa ghi, nhận lại hàng đợi training"""
+    global _leading
+    with _bus_lock:
+        for log_type in log_manager.log_files:
+            log_manager.persist_missing(log_type, lambda after_id, log_type=log_type: (
+                (event_id, payload)
+                for event_id, event_type, payload in replay_bus_events(after_id)
+                if event_type == log_type
+            ))
+        _leading = True
+    recovered = training_scheduler.recover()
+    print(f"Worker {os.getpid()} là leader, khôi phục training jobs: {recovered}")
+
+def create_app(multiprocess: Optional[bool] = None, recover_jobs: bool = True) -> Flask:
+    """
+    App factory, gọi một lần ở mỗi tiến trình worker
+    Args:
+        multiprocess: Chạy nhiều worker (vd. gunicorn -w 4 'main:create_app()'),
+            mặc định theo biến môi trường MULTI_WORKER=1
+        recover_jobs: Khôi phục training jobs khi chạy một tiến trình
+    """
+    global event_bus, leader_election, _app_initialized
+    with _app_lock:
+        if _app_initialized:
+            return app
+        _app_initialized = True
+        if multiprocess is None:
+            multiprocess = os.getenv('MULTI_WORKER', '0') == '1'
+
+        if not multiprocess:
+            if recover_jobs:
+                # Khôi phục job đang chờ / đánh dấu job chạy dở sau khi restart
+                training_scheduler.recover()
+            return app
+
+        bus = SQLiteEventBus(EVENT_BUS_DB, poll_interval=float(os.getenv('EVENT_BUS_POLL_SECONDS', 0.05)))
+        start_id = bus.last_id()
+        event_bus = bus
+        # Nạp vào bộ nhớ các log leader chưa kịp ghi xuống đĩa, để thứ tự khớp với file
+        after_id = min(log_manager.last_event_id(log_type) for log_type in log_manager.log_files)
+        for event_id, event_type, payload in replay_bus_events(after_id, start_id):
+            log_manager.ingest(event_type, payload, event_id, persist=False)
+        bus.subscribe(handle_bus_event)
+        bus.start(after_id=start_id)
+
+        leader_election = LeaderElection(LEADER_LOCK_FILE, on_elected)
+        leader_election.start()
+        return app
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    if request.endpoint in PROFILED_ENDPOINTS and (
+        (PROFILE_HEADER and request.headers.get('X-Profile') == '1')
+        or (PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE)
+    ):
+        g.profile = request_profiler.start(request.endpoint, request.method)
+
+@app.after_request
+def observe_request(response: Response) -> Response:
+    # /events giữ kết nối lâu, thời gian tới lúc trả response không có ý nghĩa
+    if request.endpoint not in (None, 'events', 'metrics') and 'request_started' in g:
+        HTTP_SECONDS.observe(time.perf_counter() - g.request_started,
+                             endpoint=request.endpoint, status=response.status_code)
+    if 'profile' in g:
+        g.profile.status = response.status_code
+        response.headers['X-Profile-Id'] = g.profile.id
+    return response
+
+@app.teardown_request
+def save_request_profile(error: Optional[BaseException]):
+    # Chạy cả khi request lỗi, để luồng lấy mẫu luôn được dừng
+    profile = g.pop('profile', None)
+    if profile is not None:
+        try:
+            request_profiler.save(profile)
+        except Exception as e:
+            print(f"Error saving request profile: {str(e)}")
+
+@app.route('/profiles')
+def list_profiles():
+    """Danh sách profile request đã lưu (data/logs/profiles), mới nhất trước"""
+    if not PROFILING_ENABLED:
+        return jsonify({'error': 'Profiling chưa được bật'}), 404
+    return jsonify({'profiles': request_profiler.list()})
+
+@app.route('/profiles/<profile_id>')
+def download_profile(profile_id: str):
+    """Tải một profile: JSON đầy đủ, hoặc ?format=collapsed cho stack đã lấy mẫu (flamegraph)"""
+    if not PROFILING_ENABLED:
+        return jsonify({'error': 'Profiling chưa được bật'}), 404
+    path = request_profiler.path_for(profile_id)
+    if path is None:
+        return jsonify({'error': 'Không tìm thấy profile'}), 404
+    if request.args.get('format') == 'collapsed':
+        return Response(collapsed_stacks(path), mimetype='text/plain', headers={
+            'Content-Disposition': f'attachment; filename={profile_id}.folded'
+        })
+    return send_file(path, mimetype='application/json', as_attachment=True, download_name=f'{profile_id}.json')
+
+@app.route('/metrics')
+def metrics():
+    """Metrics theo định dạng text của Prometheus (số liệu của tiến trình worker nhận request)"""
+    return Response(registry.render(), content_type=CONTENT_TYPE)
 
 @app.route('/')
 def index():
@@ -79,15 +378,47 @@ def index():
 
 @app.route('/logs')
 def get_logs():
-    """API endpoint để lấy logs"""
+    """
+    API endpoint để lấy logs
+    Query params:
+        type: Loại log (webhook, training, upload)
+        since: Chỉ lấy logs có timestamp >= since ('%Y-%m-%d %H:%M:%S')
+        cursor: next_cursor của trang trước (yêu cầu type)
+        limit: Số logs tối đa mỗi trang
+        tail: 1 để lấy trang gồm limit logs mới nhất (yêu cầu type), dùng khi load trang;
+            logs cũ hơn lấy tiếp bằng cursor nhỏ hơn cursor của trang này
+    Không truyền since/cursor/limit/tail thì trả về các logs gần nhất như cũ.
+    """
     log_type = request.args.get('type')
-    return jsonify(log_manager.get_logs(log_type))
+    since = request.args.get('since')
+    cursor = request.args.get('cursor', type=int)
+    limit = request.args.get('limit', type=int)
+    tail = request.args.get('tail') == '1'
+
+    if since is None and cursor is None and limit is None and not tail:
+        return jsonify(log_manager.get_logs(log_type))
+
+    if log_type and log_type not in log_manager.log_files:
+        return jsonify({'error': f'Loại log không hợp lệ: {log_type}'}), 400
+    if (cursor is not None or tail) and not log_type:
+        return jsonify({'error': 'Tham số cursor/tail yêu cầu type'}), 400
+
+    if since:
+        since = since.replace('T', ' ')
+    limit = min(max(limit or LOGS_PAGE_SIZE, 1), LOGS_MAX_PAGE_SIZE)
+
+    if log_type:
+        return jsonify(log_manager.get_logs_page(log_type, cursor or 0, limit, since, tail))
+    return jsonify({
+        log_type: log_manager.get_logs_page(log_type, 0, limit, since)
+        for log_type in log_manager.log_files
+    })
 
 @app.route('/logs/clear', methods=['POST'])
 def clear_logs():
     """API endpoint để xóa logs"""
     log_type = request.json.get('type') if request.json else None
-    log_manager.clear_logs(log_type)
+    event_bus.publish(CONTROL_EVENT, {'action': 'clear_logs', 'type': log_type})
     return jsonify({'status': 'success'})
 
 @app.route('/processed-data')
@@ -95,81 +426,361 @@ def get_processed_data():
     """API endpoint để lấy dữ liệu đã xử lý gần nhất"""
     return jsonify(log_manager.get_processed_data())
 
+@app.route('/processed-data/preview')
+def preview_processed_data():
+    """
+    API endpoint để xem một trang dữ liệu đã xử lý
+    Query params:
+        offset: Vị trí mẫu bắt đầu
+        limit: Số mẫu tối đa mỗi trang
+    """
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', PREVIEW_PAGE_SIZE, type=int), 1), PREVIEW_MAX_PAGE_SIZE)
+
+    file_path = log_manager.get_processed_data().get('file_path')
+    if not file_path or not os.path.exists(file_path):
+        return jsonify({'items': [], 'offset': offset, 'limit': limit, 'total': 0})
+
+    # Seek tới đúng dòng qua chỉ mục offset, không đọc toàn bộ file
+    index = get_index(file_path)
+    return jsonify({
+        'items': index.read(offset, limit),
+        'offset': offset,
+        'limit': limit,
+        'total': len(index)
+    })
+
 @app.route('/events')
 def events():
-    """SSE endpoint"""
+    """SSE endpoint, phát lại các event bị lỡ theo Last-Event-ID"""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
     def event_stream():
-        while True:
-            if not event_queue.empty():
-                event_data = event_queue.get()
-                yield f"data: {event_data}\n\n"
-            time.sleep(0.1)
+        # Đăng ký trong generator để luôn được hủy khi kết nối đóng
+        subscriber = event_broker.subscribe(last_event_id)
+        try:
+            while True:
+                events = subscriber.get(timeout=SSE_KEEPALIVE_SECONDS)
+                if not events:
+                    # Giữ kết nối và phát hiện client đã ngắt
+                    yield ": keep-alive\n\n"
+                    continue
+                for event_id, _, event_data in events:
+                    yield f"id: {event_id}\ndata: {event_data}\n\n"
+        finally:
+            event_broker.unsubscribe(subscriber)
     
-    return Response(event_stream(), mimetype='text/event-stream')
+    return Response(event_stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/jobs')
+def list_jobs():
+    """API endpoint để xem trạng thái hàng đợi training"""
+    if is_leader():
+        return jsonify(training_scheduler.snapshot())
+    # Worker không chạy training: đọc hàng đợi từ job store dùng chung
+    return jsonify({
+        'workers': training_scheduler.workers,
+        'max_queue_size': training_scheduler.max_queue_size,
+        'debounce_seconds': training_scheduler.debounce_seconds,
+        'max_delay_seconds': training_scheduler.max_delay_seconds,
+        'queued': job_store.list_jobs([QUEUED], training_scheduler.max_queue_size),
+        'running': job_store.list_jobs([RUNNING], training_scheduler.workers),
+        'recent': job_store.list_jobs(list(FINISHED_STATES), training_scheduler.history_size),
+        'stats': None
+    })
+
+@app.route('/jobs/<int:job_id>')
+def get_job(job_id: int):
+    """API endpoint để xem một training job, kèm lịch sử trạng thái và tiến độ mới nhất"""
+    job = job_store.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Không tìm thấy job'}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<int:job_id>/progress')
+def get_job_progress(job_id: int):
+    """
+    API endpoint để lấy tiến độ của một training job
+    Query params:
+        since: next_cursor của lần gọi trước
+        limit: Số mẫu tối đa
+    """
+    if job_store.get_job(job_id) is None:
+        return jsonify({'error': 'Không tìm thấy job'}), 404
+    since = request.args.get('since', 0, type=int)
+    limit = min(max(request.args.get('limit', LOGS_PAGE_SIZE, type=int), 1), LOGS_MAX_PAGE_SIZE)
+    return jsonify(job_store.get_progress(job_id, since, limit))
+
+@app.route('/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_job(job_id: int):
+    """API endpoint để hủy một training job"""
+    if job_store.get_row(job_id) is None:
+        return jsonify({'error': 'Không tìm thấy job'}), 404
+    event_bus.publish(CONTROL_EVENT, {'action': 'cancel_job', 'job_id': job_id})
+    return jsonify(job_summary(job_id))
+
+def submit_training(jsonl_path: str, key: str, source: str) -> Dict[str, Any]:
+    """Tạo training job và gửi cho leader qua bus (gộp với job cùng key đang chờ)"""
+    job_id = training_scheduler.create(jsonl_path, key, source, config=training_config_snapshot())
+    event_bus.publish(CONTROL_EVENT, {'action': 'submit_job', 'job_id': job_id})
+    return job_summary(job_id)
+
+def job_summary(job_id: int) -> Optional[Dict[str, Any]]:
+    """Trạng thái job: từ hàng đợi nếu worker này chạy training, ngược lại từ job store"""
+    job = training_scheduler.get(job_id)
+    if job is not None:
+        return job.to_dict()
+    job = job_store.get_job(job_id)
+    if job is not None:
+        for key in ('config', 'transitions', 'progress'):
+            job.pop(key, None)
+    return job
 
 def process_data(data: List[Dict[str, Any]], source: str = 'upload') -> tuple:
-    """Xử lý dữ liệu và lưu kết quả"""
+    """Xử lý dữ liệu và lưu kết quả (kết quả như process_chunks)"""
+    with STAGE_SECONDS.time(stage='parse'):
+        frame = records_to_frame(data)
+    return process_chunks([frame], source)
+
+def process_chunks(chunks: Iterable[pd.DataFrame], source: str = 'upload',
+                   files: Optional[List[Dict[str, Any]]] = None) -> tuple:
+    """
+    Xử lý dữ liệu theo từng chunk, ghi dần ra file JSONL (và Arrow) và lưu kết quả
+    Args:
+        files: Thống kê từng file khi gộp nhiều file upload (được điền trong lúc đọc chunks),
+            chunks khi đó đã được chuẩn hóa nên số dòng gốc lấy từ thống kê này
+    Returns:
+        tuple: (đường dẫn file JSONL, thống kê, lỗi). Gửi lại dữ liệu đã có (không có cặp mới)
+            không phải lỗi: đường dẫn là None và thống kê có new = 0
+    """
+    jsonl_path = None
+    tmp_path = None
+    arrow_path = None
+    arrow_writer = None
+    committed = False
     try:
-        # Chuẩn hóa dữ liệu
-        normalized_data = normalize_conversation(data)
-        
-        if not normalized_data:
-            return None, "Không có dữ liệu hợp lệ để xử lý"
-            
         # Tạo tên file với timestamp
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        jsonl_path = os.path.join(DATA_DIR, f"training_{timestamp}.jsonl")
+        jsonl_path = reserve_dataset_path(timestamp)
+        tmp_path = jsonl_path + ".tmp"
+        
+        total_raw = 0
+        total_normalized = 0
+        total_new = 0
+        dedup_batch = dedup_index.begin()
+        lengths = []
+        arrow_path = arrow_path_for(jsonl_path) if ARROW_EXPORT else None
+        if arrow_path:
+            arrow_writer = ArrowDatasetWriter(arrow_path + ".tmp")
+        
+        # Chuẩn hóa, lọc trùng và ghi từng chunk, không giữ toàn bộ dữ liệu trong bộ nhớ
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            # Thời gian chờ chunk tiếp theo là thời gian đọc/parse file upload
+            chunk_iter = iter(chunks)
+            while True:
+                with STAGE_SECONDS.time(stage='parse'):
+                    chunk = next(chunk_iter, None)
+                if chunk is None:
+                    break
+                with STAGE_SECONDS.time(stage='normalize'):
+                    normalized_chunk = normalize_frame(chunk)
+                with STAGE_SECONDS.time(stage='dedup'):
+                    new_chunk, _ = dedup_batch.filter(normalized_chunk)
+                with STAGE_SECONDS.time(stage='jsonl_write'):
+                    f.write(frame_to_jsonl(new_chunk))
+                if arrow_writer:
+                    with STAGE_SECONDS.time(stage='arrow_write'):
+                        arrow_writer.write(new_chunk)
+                if packing_tokenizer:
+                    with STAGE_SECONDS.time(stage='tokenize'):
+                        lengths.append(token_lengths(new_chunk, packing_tokenizer))
+                
+                total_raw += len(chunk)
+                total_normalized += len(normalized_chunk)
+                total_new += len(new_chunk)
+        if files is not None:
+            total_raw = sum(entry.get('rows', 0) for entry in files)
+        ROWS_IN.inc(total_raw, source=source)
+        ROWS_INVALID.inc(total_raw - total_normalized, source=source)
+        ROWS_KEPT.inc(total_new, source=source)
+        ROWS_DUPLICATE.inc(dedup_batch.duplicates, source=source, kind='exact')
+        if dedup_batch.near_dup and near_dup_index.drop:
+            ROWS_DUPLICATE.inc(dedup_batch.near_dup.duplicates, source=source, kind='near')
+        
+        stats = {
+            'total_raw': total_raw,
+            'total_normalized': total_normalized,
+            'invalid': total_raw - total_normalized,
+            'duplicates': dedup_batch.duplicates,
+            'new': total_new
+        }
+        if files is not None:
+            stats['files'] = files
+        if dedup_batch.near_dup:
+            stats['near_duplicates'] = dedup_batch.near_dup.duplicates
         
-        # Lưu file JSONL
-        with open(jsonl_path, "w", encoding="utf-8") as f:
-            for item in normalized_data:
-                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+        if not total_new:
+            os.remove(tmp_path)
+            os.remove(jsonl_path)
+            if arrow_writer:
+                arrow_writer.abort()
+            if not total_normalized:
+                return None, None, "Không có dữ liệu hợp lệ để xử lý"
+        else:
+            # Chỉ công bố file JSONL khi đã ghi xong, rồi gộp các cặp mới vào dataset tổng hợp
+            # (commit lỗi được hoàn tác và các file vừa công bố bị xóa ở nhánh except)
+            if arrow_writer:
+                arrow_writer.close()
+                os.replace(arrow_writer.path, arrow_path)
+            os.replace(tmp_path, jsonl_path)
+            with STAGE_SECONDS.time(stage='dedup_commit'):
+                dedup_batch.commit(jsonl_path)
+            committed = True
         
-        # Cập nhật dữ liệu đã xử lý
+        stats['total_unique'] = len(dedup_index)
+        
+        # Gửi lại dữ liệu đã có (vd. Google Sheets gửi lại cả sheet): không có dataset mới để lưu
+        if not total_new:
+            if source == 'webhook':
+                send_event('webhook', {
+                    'status': 'Success',
+                    'message': f'Không có cặp hội thoại mới ({dedup_batch.duplicates} cặp đã tồn tại)',
+                    'status_class': 'info',
+                    'stats': stats
+                })
+            return None, stats, None
+        
+        # Các cặp mới đã nằm trong dataset tổng hợp: lỗi ở các bước sau chỉ được ghi log,
+        # lượt xử lý vẫn thành công để dataset được train (gửi lại sẽ không còn cặp mới)
+        if dedup_batch.near_dup:
+            # Chi tiết các cụm nằm trong <dataset>.near_dups.json, stats chỉ giữ số cặp
+            try:
+                dedup_batch.near_dup.report(jsonl_path)
+            except Exception as e:
+                print(f"Error writing near-duplicate report: {str(e)}")
+        with STAGE_SECONDS.time(stage='split'):
+            manifest_path = split_training_data(jsonl_path, dedup_batch.hashes, stats)
+        if packing_tokenizer:
+            with STAGE_SECONDS.time(stage='packing'):
+                pack_training_data(jsonl_path, np.concatenate(lengths), stats)
+        
+        # Cập nhật dữ liệu đã xử lý: chỉ lưu thống kê và đường dẫn file JSONL,
+        # nội dung được xem qua /processed-data/preview
         processed_data = {
-            'raw': data,
-            'normalized': normalized_data,
             'file_path': jsonl_path,
+            'arrow_path': arrow_path,
+            'manifest_path': manifest_path,
             'timestamp': timestamp,
             'source': source,
-            'stats': {
-                'total_raw': len(data),
-                'total_normalized': len(normalized_data),
-                'invalid': len(data) - len(normalized_data)
-            }
+            'stats': stats
         }
         
-        # Lưu vào log manager
-        log_manager.update_processed_data(processed_data)
-        
-        # Gửi event thông báo có dữ liệu mới
-        send_event('data', {
-            'status': 'Updated',
-            'message': 'Đã cập nhật dữ liệu mới',
-            'timestamp': timestamp,
-            'status_class': 'info'
-        })
-        
-        # Gửi thông báo thành công với stats nếu là webhook
-        if source == 'webhook':
-            send_event('webhook', {
-                'status': 'Success',
-                'message': 'Xử lý dữ liệu từ Google Sheets thành công',
-                'status_class': 'success',
-                'stats': {
-                    'total_raw': len(data),
-                    'total_normalized': len(normalized_data),
-                    'invalid': len(data) - len(normalized_data)
-                }
+        try:
+            # Lưu vào log manager
+            log_manager.update_processed_data(processed_data)
+            
+            # Gửi event thông báo có dữ liệu mới
+            send_event('data', {
+                'status': 'Updated',
+                'message': 'Đã cập nhật dữ liệu mới',
+                'timestamp': timestamp,
+                'status_class': 'info'
             })
+            
+            # Gửi thông báo thành công với stats nếu là webhook
+            if source == 'webhook':
+                send_event('webhook', {
+                    'status': 'Success',
+                    'message': 'Xử lý dữ liệu từ Google Sheets thành công',
+                    'status_class': 'success',
+                    'stats': stats
+                })
+        except Exception as e:
+            print(f"Error publishing processed data: {str(e)}")
         
-        return jsonl_path, None
+        return jsonl_path, stats, None
+    except Exception as e:
+        if committed:
+            # Lỗi ngoài dự kiến sau khi đã commit: dataset vẫn được giữ để train
+            print(f"Error finishing processed data: {str(e)}")
+            return jsonl_path, stats, None
+        if jsonl_path:
+            # Chưa gộp vào dataset tổng hợp: xóa file tạm, file giữ chỗ và các file đã công bố
+            for path in (tmp_path, jsonl_path, arrow_path):
+                if path and os.path.exists(path):
+                    os.remove(path)
+            if arrow_writer and os.path.exists(arrow_writer.path):
+                arrow_writer.abort()
+        return None, None, str(e)
+
+def split_training_data(jsonl_path: str, hashes: List[int], stats: Dict[str, Any]) -> Optional[str]:
+    """Ghi các shard train/eval kèm manifest, thêm số mẫu mỗi tập vào stats"""
+    try:
+        manifest = write_splits(jsonl_path, hashes, DATASET_SHARDS, EVAL_SPLIT_RATIO)
     except Exception as e:
-        return None, str(e)
+        print(f"Error splitting training data: {str(e)}")
+        return None
+    stats['train'] = manifest['splits']['train']['rows']
+    stats['eval'] = manifest['splits']['eval']['rows']
+    return os.path.join(shards_dir_for(jsonl_path), MANIFEST_FILE)
+
+def pack_training_data(jsonl_path: str, lengths: np.ndarray, stats: Dict[str, Any]) -> None:
+    """
+    Báo cáo packing cho dataset vừa xử lý, thêm số chuỗi ước lượng sau khi đóng gói vào stats
+    (chi tiết nằm trong <dataset>.lengths.json). Lỗi ở bước này không làm hỏng lượt xử lý dữ liệu
+    """
+    try:
+        report = packing_report(jsonl_path, lengths, PACKING_CONTEXT_LENGTH, PACKING_BATCH_SIZE)
+    except Exception as e:
+        print(f"Error writing packing report: {str(e)}")
+        return
+    stats['packed_sequences'] = report['padding_waste']['sequences_after']
+
+def reserve_dataset_path(timestamp: str) -> str:
+    """Giữ chỗ tên file dataset, thêm hậu tố nếu một worker khác đã dùng tên này"""
+    suffix = 0
+    while True:
+        name = f"training_{timestamp}.jsonl" if not suffix else f"training_{timestamp}_{suffix}.jsonl"
+        path = os.path.join(DATA_DIR, name)
+        try:
+            open(path, 'x').close()
+            return path
+        except FileExistsError:
+            suffix += 1
+
+def iter_upload_chunks(filepath: str, layout: Any = None) -> Iterator[pd.DataFrame]:
+    """Đọc file upload theo từng chunk và báo tiến độ theo số byte/dòng đã xử lý"""
+    last_progress = 0
+    rows = 0
+    
+    def report(progress: int) -> None:
+        nonlocal last_progress
+        # Chỉ gửi event khi tiến độ tăng ít nhất 10% để không spam logs
+        if progress - last_progress >= 10:
+            last_progress = progress
+            send_event('upload', {
+                'status': 'processing',
+                'message': f'Đã xử lý {rows} dòng...',
+                'progress': progress,
+                'status_class': 'warning'
+            })
+    
+    for chunk, done in read_chunks(filepath, UPLOAD_CHUNK_ROWS, layout):
+        rows += len(chunk)
+        yield chunk
+        report(min(int(done * 100), 99))
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    if 'file' not in request.files:
+    """Upload một file CSV/XLSX, nhiều file (trường file lặp lại) hoặc file zip"""
+    if 'file' not in request.files and 'files' not in request.files:
         send_event('upload', {
             'status': 'error',
             'message': 'Không tìm thấy file',
@@ -177,8 +788,8 @@ def upload_file():
         })
         return jsonify({'error': 'Không tìm thấy file'}), 400
         
-    file = request.files['file']
-    if file.filename == '':
+    uploads = [file for file in request.files.getlist('file') + request.files.getlist('files') if file.filename]
+    if not uploads:
         send_event('upload', {
             'status': 'error',
             'message': 'Chưa chọn file',
@@ -186,7 +797,10 @@ def upload_file():
         })
         return jsonify({'error': 'Chưa chọn file'}), 400
         
-    if file and allowed_file(file.filename):
+    if all(allowed_file(file.filename) for file in uploads):
+        if len(uploads) > 1 or file_extension(uploads[0].filename) in ARCHIVE_EXTENSIONS:
+            return upload_batch(uploads)
+        file = uploads[0]
         try:
             filename = secure_filename(file.filename)
             filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
@@ -201,24 +815,26 @@ def upload_file():
             
             file.save(filepath)
             
+            # Dò header/delimiter/encoding từ phần đầu file, loại file không dùng được trước khi đọc hết
+            try:
+                layout = detect_layout(filepath)
+            except UnusableFileError as e:
+                send_event('upload', {
+                    'status': 'error',
+                    'message': f'Lỗi: {filename}: {str(e)}',
+                    'status_class': 'danger'
+                })
+                return jsonify({'error': f'{filename}: {str(e)}'}), 400
+            
             send_event('upload', {
                 'status': 'processing',
                 'message': 'Đang xử lý file...',
-                'progress': 50,
+                'progress': 0,
                 'status_class': 'warning'
             })
             
-            # Đọc file dựa vào định dạng
-            if filename.endswith('.csv'):
-                df = pd.read_csv(filepath)
-            else:  # xlsx
-                df = pd.read_excel(filepath)
-            
-            # Chuyển đổi DataFrame thành list of dicts
-            data = df.to_dict('records')
-            
-            # Xử lý dữ liệu
-            jsonl_path, error = process_data(data, 'upload')
+            # Đọc và xử lý file theo từng chunk
+            jsonl_path, stats, error = process_chunks(iter_upload_chunks(filepath, layout), 'upload')
             
             if error:
                 send_event('upload', {
@@ -228,6 +844,9 @@ def upload_file():
                 })
                 return jsonify({'error': error}), 500
             
+            if jsonl_path is None:
+                return no_new_pairs_response('upload', stats)
+            
             send_event('upload', {
                 'status': 'completed',
                 'message': 'Tải lên và xử lý thành công!',
@@ -235,13 +854,15 @@ def upload_file():
                 'status_class': 'success'
             })
             
-            # Bắt đầu demo training
-            threading.Thread(target=demo_finetune, args=(jsonl_path,)).start()
+            # Đưa vào hàng đợi training (gộp với lần upload cùng file đang chờ)
+            job = submit_training(jsonl_path, key=f'upload:{filename}', source='upload')
             
             return jsonify({
                 'status': 'success',
                 'message': 'Xử lý thành công',
-                'file_path': jsonl_path
+                'file_path': jsonl_path,
+                'stats': stats,
+                'job': job
             })
             
         except Exception as e:
@@ -259,6 +880,131 @@ def upload_file():
     })
     return jsonify({'error': 'Định dạng file không được hỗ trợ'}), 400
 
+def reserve_upload_dir(timestamp: str) -> str:
+    """Thư mục riêng của một lượt upload nhiều file, thêm hậu tố nếu lượt khác đã dùng tên này"""
+    suffix = 0
+    while True:
+        name = f"batch_{timestamp}" if not suffix else f"batch_{timestamp}_{suffix}"
+        path = os.path.join(app.config['UPLOAD_FOLDER'], name)
+        try:
+            os.makedirs(path)
+            return path
+        except FileExistsError:
+            suffix += 1
+
+def upload_batch(uploads: list):
+    """Nhiều file hoặc file zip: đọc và chuẩn hóa song song trong pool, gộp thành một dataset"""
+    # File của lượt này lưu trong thư mục riêng, tên có số thứ tự nên các file trùng tên
+    # (trong cùng lượt hoặc ở hai lượt đồng thời) không ghi đè nhau
+    upload_dir = reserve_upload_dir(datetime.now().strftime("%Y%m%d_%H%M%S"))
+    # Thư mục tạm cho kết quả trung gian của pool, xóa khi xong
+    batch_dir = tempfile.mkdtemp(prefix='work_', dir=upload_dir)
+    entries: List[Dict[str, Any]] = []
+    try:
+        send_event('upload', {
+            'status': 'uploading',
+            'message': f'Đang tải lên {len(uploads)} file',
+            'progress': 0,
+            'status_class': 'info'
+        })
+        
+        for index, file in enumerate(uploads):
+            filename = secure_filename(file.filename)
+            filepath = os.path.join(upload_dir, f'{index}_{filename}')
+            file.save(filepath)
+            if file_extension(filename) in ARCHIVE_EXTENSIONS:
+                # Giải nén vào thư mục con riêng của file zip, xóa file zip sau khi giải nén
+                archive_dir = os.path.join(upload_dir, f'{index}_{os.path.splitext(filename)[0]}')
+                os.makedirs(archive_dir, exist_ok=True)
+                try:
+                    entries.extend(extract_archive(filepath, archive_dir, MAX_UNZIPPED_BYTES, filename))
+                except (zipfile.BadZipFile, ValueError) as e:
+                    entries.append({'file': filename, 'error': str(e)})
+                finally:
+                    os.remove(filepath)
+            else:
+                entries.append({'file': filename, 'path': filepath})
+        
+        send_event('upload', {
+            'status': 'processing',
+            'message': f'Đang xử lý {len(entries)} file...',
+            'progress': 0,
+            'status_class': 'warning'
+        })
+        
+        def on_file_done(done: int, total: int, entry: Dict[str, Any]) -> None:
+            send_event('upload', {
+                'status': 'processing',
+                'message': f"Đã xử lý {done}/{total} file ({entry['file']})",
+                'progress': min(int(done * 100 / total), 99),
+                'status_class': 'warning'
+            })
+        
+        chunks = upload_pool.process(entries, batch_dir, UPLOAD_CHUNK_ROWS, on_file_done)
+        jsonl_path, stats, error = process_chunks(chunks, 'upload', files=entries)
+        for entry in entries:
+            entry.pop('path', None)
+        failed = sum(1 for entry in entries if 'error' in entry)
+        
+        if error:
+            send_event('upload', {
+                'status': 'error',
+                'message': f'Lỗi: {error}',
+                'status_class': 'danger'
+            })
+            return jsonify({'error': error, 'files': entries}), 500
+        
+        if jsonl_path is None:
+            return no_new_pairs_response('upload', stats)
+        
+        send_event('upload', {
+            'status': 'completed',
+            'message': f'Tải lên và xử lý thành công {len(entries) - failed}/{len(entries)} file!',
+            'progress': 100,
+            'status_class': 'success' if not failed else 'warning'
+        })
+        
+        # Đưa vào hàng đợi training (gộp với lần upload cùng bộ file đang chờ)
+        job = submit_training(
+            jsonl_path, key='upload:' + ','.join(sorted(entry['file'] for entry in entries)), source='upload'
+        )
+        
+        return jsonify({
+            'status': 'success',
+            'message': 'Xử lý thành công',
+            'file_path': jsonl_path,
+            'files': entries,
+            'stats': stats,
+            'job': job
+        })
+        
+    except Exception as e:
+        send_event('upload', {
+            'status': 'error',
+            'message': f'Lỗi: {str(e)}',
+            'status_class': 'danger'
+        })
+        return jsonify({'error': f'Lỗi xử lý file: {str(e)}'}), 500
+    finally:
+        shutil.rmtree(batch_dir, ignore_errors=True)
+
+def no_new_pairs_response(source: str, stats: Dict[str, Any]):
+    """Dữ liệu gửi lại toàn cặp đã có: thành công, không tạo dataset và không chạy training"""
+    if source == 'upload':
+        send_event('upload', {
+            'status': 'completed',
+            'message': f"Không có cặp hội thoại mới ({stats['duplicates']} cặp đã tồn tại)",
+            'progress': 100,
+            'status_class': 'info'
+        })
+    return jsonify({
+        'status': 'success',
+        'message': 'Không có cặp hội thoại mới',
+        'file_path': None,
+        'stats': stats,
+        'job': None
+    })
+
 @app.route('/webhook/sheets', methods=["POST"])
 def sheets_webhook():
     try:
@@ -287,7 +1033,7 @@ def sheets_webhook():
         })
         
         # Xử lý dữ liệu
-        jsonl_path, error = process_data(sheet_data, 'webhook')
+        jsonl_path, stats, error = process_data(sheet_data, 'webhook')
         
         if error:
             send_event('webhook', {
@@ -297,13 +1043,18 @@ def sheets_webhook():
             })
             return jsonify({"error": error}), 500
         
-        # Demo fine-tune
-        threading.Thread(target=demo_finetune, args=(jsonl_path,)).start()
+        if jsonl_path is None:
+            return no_new_pairs_response('webhook', stats)
+        
+        # Demo fine-tune qua hàng đợi training (gộp các webhook tới dồn dập)
+        job = submit_training(jsonl_path, key='webhook:sheets', source='webhook')
         
         return jsonify({
             "status": "success",
             "message": "Đã xử lý dữ liệu thành công",
-            "file_path": jsonl_path
+            "file_path": jsonl_path,
+            "stats": stats,
+            "job": job
         })
         
     except Exception as e:
@@ -314,10 +1065,66 @@ def sheets_webhook():
         })
         return jsonify({"error": str(e)}), 500
 
-def demo_finetune(jsonl_path: str):
-    """Demo quá trình fine-tune với LoRA"""
+def training_config_snapshot() -> Dict[str, Any]:
+    """Snapshot cấu hình training lưu kèm mỗi job"""
+    try:
+        with open(TRAINING_CONFIG_FILE, 'r', encoding='utf-8') as f:
+            config_text = f.read()
+    except OSError:
+        config_text = None
+    return {
+        'config_file': TRAINING_CONFIG_FILE,
+        'config': config_text
+    }
+
+def send_training_event(job_id: Optional[int], data: dict):
+    """Gửi event training và lưu mẫu tiến độ của job"""
+    if job_id is not None:
+        data = {'job_id': job_id, **data}
+        try:
+            job_store.add_progress(job_id, data.get('status'), data.get('progress'), data.get('message'))
+        except Exception as e:
+            print(f"Error saving training progress: {str(e)}")
+    send_event('training', data)
+
+def merge_datasets(datasets: List[str], job_id: Optional[int]) -> tuple:
+    """
+    Ghép các dataset của một job (đã gộp) thành một file JSONL để train một lần
+    Returns:
+        tuple: (đường dẫn file training, có phải file tạm cần xóa sau khi train không)
+    """
+    existing = [path for path in datasets if os.path.exists(path)]
+    for path in datasets:
+        if path not in existing:
+            print(f"Training dataset not found: {path}")
+    if len(existing) <= 1:
+        return (existing[0] if existing else datasets[-1]), False
+    os.makedirs(TRAINING_JOBS_DIR, exist_ok=True)
+    merged_path = os.path.join(TRAINING_JOBS_DIR, f"job_{job_id if job_id is not None else os.getpid()}.jsonl")
+    with open(merged_path, 'wb') as out:
+        for path in existing:
+            with open(path, 'rb') as f:
+                shutil.copyfileobj(f, out)
+    return merged_path, True
+
+def demo_finetune(datasets: List[str], cancel_event: Optional[threading.Event] = None,
+                  job_id: Optional[int] = None):
+    """
+    Demo quá trình fine-tune với LoRA trên tất cả dataset của job,
+    dừng sớm nếu cancel_event được set
+    """
+    jsonl_path, merged = merge_datasets(datasets, job_id)
+    try:
+        run_demo_finetune(jsonl_path, len(datasets), cancel_event, job_id)
+    finally:
+        if merged:
+            os.remove(jsonl_path)
+
+def run_demo_finetune(jsonl_path: str, dataset_count: int, cancel_event: Optional[threading.Event] = None,
+                      job_id: Optional[int] = None):
+    """Các bước demo fine-tune trên một file JSONL"""
     # Thông báo bắt đầu training
-    send_event('training', {
+    send_training_event(job_id, {
         'status': 'Started',
         'message': 'Bắt đầu quá trình training model...',
         'progress': 0,
@@ -334,18 +1141,29 @@ def demo_finetune(jsonl_path: str):
     total_steps = len(steps)
     for i, (status, message) in enumerate(steps, 1):
         progress = int((i / total_steps) * 100)
-        send_event('training', {
+        send_training_event(job_id, {
             'status': status,
             'message': message,
             'progress': progress,
             'status_class': 'info'
         })
-        time.sleep(1)  # Giả lập thời gian xử lý
+        # Giả lập thời gian xử lý, đồng thời chờ yêu cầu hủy
+        if cancel_event is not None and cancel_event.wait(1):
+            send_training_event(job_id, {
+                'status': 'Cancelled',
+                'message': 'Đã hủy training do có dữ liệu mới hơn hoặc yêu cầu hủy',
+                'progress': progress,
+                'status_class': 'secondary'
+            })
+            return
+        if cancel_event is None:
+            time.sleep(1)
     
     # In thông tin training
     print("\n[DEMO] Fine-tuning Process")
     print("=" * 30)
-    print(f"Training data: {jsonl_path}")
+    print(f"Training data: {jsonl_path} (gộp từ {dataset_count} dataset)")
+    print(f"Sequence packing: neat_packing của trainer, cutoff_len {PACKING_CONTEXT_LENGTH} token")
     print("Model: QWEN3:4B")
     print("Method: LoRA fine-tuning")
     print("Parameters:")
@@ -355,7 +1173,7 @@ def demo_finetune(jsonl_path: str):
     print("=" * 30)
     print("=" * 50)
     
-    send_event('training', {
+    send_training_event(job_id, {
         'status': 'Completed',
         'message': 'Hoàn thành quá trình xử lý!',
         'progress': 100,
@@ -363,4 +1181,7 @@ def demo_finetune(jsonl_path: str):
     })
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    # Tiến trình cha của reloader (debug) không khôi phục job để job không chạy hai lần
+    create_app(multiprocess=False, recover_jobs=os.environ.get('WERKZEUG_RUN_MAIN') == 'true').run(
+        host="0.0.0.0", port=5000, debug=True
+    )
\ No newline at end of file
@@ -0,0 +1,180 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+# Ngưỡng (giây) của histogram thời gian, từ thao tác nhỏ tới cả lượt xử lý dataset lớn
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Hàm nhận từng khối lệnh được đo bằng Histogram.time (tên metric, nhãn, lúc bắt đầu, thời gian),
+# chỉ được đặt trong request đang bật profile (request_profiler)
+SPAN_LISTENER: ContextVar[Optional[Callable[[str, Dict[str, Any], float, float], None]]] = ContextVar(
+    'span_listener', default=None
+)
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names: Sequence[str], values: Sequence[Any], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple:
+        return tuple(labels[name] for name in self.label_names)
+
+    def header(self) -> List[str]:
+        return [f'# HELP {self.name} {_escape(self.help_text)}', f'# TYPE {self.name} {self.kind}']
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [
+            f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}' for key, value in values
+        ]
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Mỗi bộ nhãn: số lần quan sát theo từng ngưỡng (không cộng dồn, ô cuối là +Inf), tổng, số lần
+        self._values: Dict[Tuple, List[Any]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """Đo thời gian một khối lệnh (kể cả khi có exception)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.observe(elapsed, **labels)
+            listener = SPAN_LISTENER.get()
+            if listener is not None:
+                listener(self.name, labels, started, elapsed)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, [list(state[0]), state[1], state[2]]) for key, state in self._values.items())
+        lines = self.header()
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.label_names, key)} {count}')
+        return lines
+
+class CallbackMetric(_Metric):
+    def __init__(self, name: str, help_text: str, kind: str,
+                 callback: Callable[[], Union[float, Dict[Tuple, float]]], labels: Sequence[str] = ()):
+        """
+        Giá trị lấy lúc scrape từ trạng thái sẵn có (số client SSE, độ dài hàng đợi...),
+        không tốn gì trên đường xử lý
+        Args:
+            callback: Trả về một số, hoặc dict {bộ giá trị nhãn: số} khi có labels
+        """
+        super().__init__(name, help_text, labels)
+        self.kind = kind
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        try:
+            values = self.callback()
+        except Exception as e:
+            print(f"Error collecting metric {self.name}: {str(e)}")
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return self.header() + [
+            f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}'
+            for key, value in sorted(values.items())
+        ]
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'Metric {metric.name} đã được đăng ký')
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def gauge_callback(self, name: str, help_text: str, callback: Callable, labels: Sequence[str] = ()) -> None:
+        self.register(CallbackMetric(name, help_text, 'gauge', callback, labels))
+
+    def counter_callback(self, name: str, help_text: str, callback: Callable, labels: Sequence[str] = ()) -> None:
+        self.register(CallbackMetric(name, help_text, 'counter', callback, labels))
+
+    def render(self) -> str:
+        """Toàn bộ metrics theo định dạng text của Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+# Registry dùng chung trong tiến trình (mỗi worker gunicorn có số liệu riêng)
+registry = MetricsRegistry()
+
+# Thời gian các bước trên đường xử lý dữ liệu, ghi log và gửi Telegram
+STAGE_SECONDS = registry.histogram(
+    'spa_stage_duration_seconds', 'Thời gian từng bước xử lý (giây)', ['stage']
+)
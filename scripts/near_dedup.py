@@ -0,0 +1,426 @@
+import fcntl
+import json
+import os
+import re
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from jsonl_index import get_index
+
+# Số hàm hash của MinHash (mỗi cặp hội thoại là một chữ ký NUM_PERM số 32-bit)
+NUM_PERM = 64
+# Ngưỡng độ tương đồng Jaccard (ước lượng qua MinHash) để coi hai cặp là gần trùng
+DEFAULT_THRESHOLD = 0.8
+# Số cặp tính chữ ký mỗi lần (giới hạn bộ nhớ của ma trận shingle x NUM_PERM)
+SIGNATURE_BATCH_SIZE = 2000
+# Số chữ ký kiểm tra ứng viên mỗi lần (giới hạn bộ nhớ của ma trận so sánh)
+VERIFY_BATCH_SIZE = 500
+# Số dòng đọc mỗi lần khi tính bù chữ ký cho dataset tổng hợp
+BACKFILL_BATCH_SIZE = 10000
+
+# Từ đệm / hư từ tiếng Việt (đã bỏ dấu) không mang nội dung câu hỏi, chỉ bỏ ở phía câu hỏi,
+# vd. "Giá dịch vụ massage chân là ạ?" ~ "Giá massage chân?". Từ phủ định và từ để hỏi
+# (có, không, được, bao nhiêu, gì, nào, sao...) được giữ vì đổi nghĩa của cặp
+STOPWORDS = {
+    'a', 'ah', 'oi', 'nhe', 'nha', 'nhi', 'vay', 'the', 'thi', 'la', 'ma', 'va', 'voi',
+    'cua', 'cho', 'em', 'anh', 'chi', 'minh', 'ban', 'toi', 'quy', 'khach',
+    'hoi', 'xin', 'vui', 'long', 'giup', 'dich', 'vu', 'ben', 'o', 'day', 'do', 'nay', 'kia',
+    'roi', 'luon', 'nhung', 'cac'
+}
+# Từ phủ định: "Dạ có ạ" và "Dạ không ạ" chỉ khác một từ nhưng trái nghĩa
+NEGATIONS = {'khong', 'chua', 'chang', 'cha', 'ko', 'k', 'hong', 'kg'}
+# Số shingle thêm cho mỗi token là số / từ phủ định
+NUMBER_WEIGHT = 8
+NEGATION_WEIGHT = 24
+# Hằng số trộn hash khi ghép token thành shingle, và đánh dấu phía câu hỏi / câu trả lời
+SHINGLE_MIX = np.array([0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D, 0x27D4EB2F, 0x165667B1], dtype=np.uint32)
+USER_SIDE = np.uint32(0x1B873593)
+ASSISTANT_SIDE = np.uint32(0xCC9E2D51)
+TOKEN_PATTERN = re.compile(r'\w+')
+DIACRITICS_PATTERN = '[\u0300-\u036f]'
+
+def fold_text(texts: pd.Series) -> pd.Series:
+    """Chữ thường, bỏ dấu thanh/dấu mũ và đ -> d để gõ có dấu và không dấu cho cùng shingle"""
+    return (texts.astype(str).str.casefold()
+            .str.normalize('NFD')
+            .str.replace(DIACRITICS_PATTERN, '', regex=True)
+            .str.replace('đ', 'd', regex=False))
+
+_token_hashes: Dict[str, int] = {}
+
+def _token_hash(token: str) -> int:
+    """Hash 32-bit của một âm tiết (có cache vì vốn từ nhỏ hơn nhiều so với số câu)"""
+    value = _token_hashes.get(token)
+    if value is None:
+        value = _token_hashes[token] = zlib.crc32(token.encode('utf-8'))
+    return value
+
+def _side_shingles(folded: pd.Series, side: int, strip_stopwords: bool) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Shingle của một phía (câu hỏi / câu trả lời): unigram + bigram âm tiết, bỏ từ đệm nếu
+    strip_stopwords (giữ nguyên nếu câu chỉ toàn từ đệm). Số (giá, số gói, giờ) và từ phủ định
+    được nhân trọng số để hai câu chỉ khác con số hoặc có/không không bị coi là trùng
+    Returns:
+        tuple: (hash uint32 của các shingle, số thứ tự dòng của từng shingle)
+    """
+    hashes: List[int] = []
+    lengths: List[int] = []
+    weights: List[int] = []
+    for text in folded:
+        tokens = TOKEN_PATTERN.findall(text)
+        content = tokens
+        if strip_stopwords:
+            content = [token for token in tokens if token not in STOPWORDS] or tokens
+        hashes.extend(_token_hash(token) for token in content)
+        weights.extend(
+            NUMBER_WEIGHT if token[0].isdigit() else NEGATION_WEIGHT if token in NEGATIONS else 0
+            for token in content
+        )
+        lengths.append(len(content))
+    tokens = np.asarray(hashes, dtype=np.uint32)
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    weights = np.asarray(weights, dtype=np.int64)
+    # Bản sao thứ copy của các token có trọng số lớn hơn copy
+    weighted = [np.flatnonzero(weights > copy) for copy in range(max(NUMBER_WEIGHT, NEGATION_WEIGHT))]
+    # Hai token liền nhau trong cùng một dòng tạo thành bigram
+    pairs = np.flatnonzero(rows[1:] == rows[:-1])
+    # Dòng không có token nào vẫn cần một shingle để có chữ ký
+    empty = np.flatnonzero(np.asarray(lengths) == 0)
+    with np.errstate(over='ignore'):
+        values = [
+            tokens * SHINGLE_MIX[0] + side,
+            tokens[pairs] * SHINGLE_MIX[1] + tokens[pairs + 1] * SHINGLE_MIX[2] + side
+        ] + [
+            tokens[positions] * SHINGLE_MIX[3] + np.uint32(copy * SHINGLE_MIX[4]) + side
+            for copy, positions in enumerate(weighted)
+        ] + [np.full(len(empty), side, dtype=np.uint32)]
+    row_ids = [rows, rows[pairs]] + [rows[positions] for positions in weighted] + [empty]
+    return np.concatenate(values), np.concatenate(row_ids)
+
+def shingle_sets(normalized: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Shingle của các cặp hội thoại, câu hỏi và câu trả lời đánh dấu riêng
+    (từ đệm chỉ bỏ ở câu hỏi, câu trả lời giữ nguyên từng từ)
+    Returns:
+        tuple: (hash các shingle xếp theo dòng, vị trí bắt đầu của từng dòng)
+    """
+    user_values, user_rows = _side_shingles(fold_text(normalized['user_message']), USER_SIDE, True)
+    assistant_values, assistant_rows = _side_shingles(
+        fold_text(normalized['assistant_message']), ASSISTANT_SIDE, False
+    )
+    rows = np.concatenate([user_rows, assistant_rows])
+    order = np.argsort(rows, kind='stable')
+    starts = np.searchsorted(rows[order], np.arange(len(normalized)))
+    return np.concatenate([user_values, assistant_values])[order], starts
+
+class MinHasher:
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        """
+        Chữ ký MinHash: min(a * h + b mod 2^32) trên tập shingle với num_perm cặp (a lẻ, b)
+        cố định, mỗi cặp là một hoán vị của không gian hash 32-bit
+        """
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = (rng.randint(0, 2 ** 31, num_perm).astype(np.uint32) << np.uint32(1)) | np.uint32(1)
+        self.b = rng.randint(0, 2 ** 31, num_perm).astype(np.uint32)
+
+    def signatures(self, normalized: pd.DataFrame) -> np.ndarray:
+        """Chữ ký (n, num_perm) uint32 của các cặp đã chuẩn hóa, tính vector hóa theo lô"""
+        result = np.empty((len(normalized), self.num_perm), dtype=np.uint32)
+        for start in range(0, len(normalized), SIGNATURE_BATCH_SIZE):
+            values, starts = shingle_sets(normalized.iloc[start:start + SIGNATURE_BATCH_SIZE])
+            with np.errstate(over='ignore'):
+                hashed = values[:, None] * self.a + self.b
+            result[start:start + len(starts)] = np.minimum.reduceat(hashed, starts, axis=0)
+        return result
+
+def lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    Chọn số band và số dòng mỗi band (bands * rows <= num_perm) sao cho đường cong
+    1 - (1 - s^rows)^bands lọc sát ngưỡng; ưu tiên không bỏ sót vì ứng viên được kiểm tra lại
+    """
+    grid = np.linspace(0, 1, 201)
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        probability = 1 - (1 - grid ** rows) ** bands
+        # Tích phân xấp xỉ trên lưới đều
+        false_positive = probability[grid < threshold].sum() / len(grid)
+        false_negative = (1 - probability[grid >= threshold]).sum() / len(grid)
+        error = 0.1 * false_positive + 0.9 * false_negative
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+class LSHTable:
+    def __init__(self, bands: int, rows: int):
+        """
+        Bảng LSH: khóa 64-bit của từng band -> id chữ ký
+        Lưu thành các run đã sắp xếp (gộp dần như LSM tree) thay vì dict Python để
+        một triệu cặp chỉ tốn vài chục MB và truy vấn được vector hóa bằng searchsorted
+        """
+        self.bands = bands
+        self.rows = rows
+        rng = np.random.RandomState(bands * 1000 + rows)
+        self._mix = rng.randint(1, 2 ** 62, size=(bands, rows), dtype=np.int64).astype(np.uint64)
+        self._runs: List[Tuple[np.ndarray, np.ndarray]] = []
+
+    def keys(self, signatures: np.ndarray) -> np.ndarray:
+        """Khóa (n, bands) của các chữ ký: tổ hợp tuyến tính (mod 2^64) các giá trị trong band"""
+        bands = signatures[:, :self.bands * self.rows].astype(np.uint64).reshape(-1, self.bands, self.rows)
+        keys = (bands * self._mix).sum(axis=2, dtype=np.uint64)
+        return keys ^ np.arange(self.bands, dtype=np.uint64)
+
+    def add(self, keys: np.ndarray, ids: np.ndarray) -> None:
+        if not len(ids):
+            return
+        flat_keys = keys.ravel()
+        order = np.argsort(flat_keys, kind='stable')
+        self._runs.append((flat_keys[order], np.repeat(ids, self.bands)[order]))
+        # Gộp các run có kích thước tương đương để số run chỉ là O(log n)
+        while len(self._runs) >= 2 and len(self._runs[-2][0]) <= 2 * len(self._runs[-1][0]):
+            (keys_a, ids_a), (keys_b, ids_b) = self._runs[-2], self._runs[-1]
+            merged_keys = np.concatenate([keys_a, keys_b])
+            order = np.argsort(merged_keys, kind='stable')
+            self._runs[-2:] = [(merged_keys[order], np.concatenate([ids_a, ids_b])[order])]
+
+    def query(self, keys: np.ndarray) -> np.ndarray:
+        """Id ứng viên (n, bands * số run) có chung ít nhất một band, -1 nếu không có"""
+        flat_keys = keys.ravel()
+        candidates = []
+        for run_keys, run_ids in self._runs:
+            position = np.minimum(np.searchsorted(run_keys, flat_keys), len(run_keys) - 1)
+            found = run_keys[position] == flat_keys
+            candidates.append(np.where(found, run_ids[position], -1).reshape(len(keys), -1))
+        if not candidates:
+            return np.full((len(keys), 0), -1, dtype=np.int64)
+        return np.concatenate(candidates, axis=1)
+
+def _verify(signatures: np.ndarray, candidates: np.ndarray, source: np.ndarray,
+            threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Kiểm tra lại các ứng viên LSH bằng độ tương đồng ước lượng từ chữ ký
+    Returns:
+        tuple: (id ứng viên giống nhất đạt ngưỡng hoặc -1, độ tương đồng) cho từng chữ ký
+    """
+    ids = np.full(len(signatures), -1, dtype=np.int64)
+    similarities = np.zeros(len(signatures))
+    if not len(source) or not candidates.shape[1]:
+        return ids, similarities
+    for start in range(0, len(signatures), VERIFY_BATCH_SIZE):
+        end = start + VERIFY_BATCH_SIZE
+        part = candidates[start:end]
+        valid = part >= 0
+        scores = (source[np.where(valid, part, 0)] == signatures[start:end, None, :]).mean(axis=2)
+        scores[~valid] = 0
+        best = scores.argmax(axis=1)
+        best_scores = scores[np.arange(len(part)), best]
+        matched = best_scores >= threshold
+        ids[start:end] = np.where(matched, part[np.arange(len(part)), best], -1)
+        similarities[start:end] = np.where(matched, best_scores, 0)
+    return ids, similarities
+
+class _SignatureStore:
+    def __init__(self, num_perm: int):
+        """Mảng chữ ký tăng dần (nhân đôi dung lượng khi đầy)"""
+        self._data = np.empty((1024, num_perm), dtype=np.uint32)
+        self.rows = 0
+
+    @property
+    def signatures(self) -> np.ndarray:
+        return self._data[:self.rows]
+
+    def extend(self, signatures: np.ndarray) -> None:
+        needed = self.rows + len(signatures)
+        if needed > len(self._data):
+            grown = np.empty((max(needed, 2 * len(self._data)), self._data.shape[1]), dtype=np.uint32)
+            grown[:self.rows] = self._data[:self.rows]
+            self._data = grown
+        self._data[self.rows:needed] = signatures
+        self.rows = needed
+
+class NearDupIndex:
+    def __init__(self, signature_path: str, canonical_path: str,
+                 threshold: float = DEFAULT_THRESHOLD, num_perm: int = NUM_PERM, drop: bool = True):
+        """
+        Chỉ mục MinHash/LSH của dataset tổng hợp: dòng i của file chữ ký ứng với dòng i của
+        dataset tổng hợp (và hash thứ i của DedupIndex). Trạng thái được DedupIndex đồng bộ
+        và ghi trong cùng khóa khi commit
+        Args:
+            signature_path: File nhị phân, mỗi dòng num_perm số uint32
+            canonical_path: File JSONL dataset tổng hợp (để tính bù chữ ký và lấy nội dung cho báo cáo)
+            drop: False thì chỉ báo cáo các cặp gần trùng, vẫn giữ chúng trong dataset
+        """
+        self.signature_path = signature_path
+        self.canonical_path = canonical_path
+        self.threshold = threshold
+        self.drop = drop
+        self.hasher = MinHasher(num_perm)
+        self.table = LSHTable(*lsh_params(threshold, num_perm))
+        self._store = _SignatureStore(num_perm)
+        self._row_bytes = num_perm * 4
+        os.makedirs(os.path.dirname(signature_path), exist_ok=True)
+
+    def __len__(self) -> int:
+        return self._store.rows
+
+    @property
+    def signatures(self) -> np.ndarray:
+        return self._store.signatures
+
+    def begin(self) -> 'NearDupBatch':
+        return NearDupBatch(self)
+
+    def sync(self, rows: int) -> None:
+        """
+        Nạp chữ ký tới dòng rows của dataset tổng hợp (gọi khi DedupIndex giữ khóa của nó)
+        Dataset có từ trước khi bật tính năng (file chữ ký ngắn hơn) được tính bù và ghi lại
+        """
+        if rows <= len(self):
+            return
+        with open(self.signature_path, 'ab+') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            stored = os.fstat(f.fileno()).st_size // self._row_bytes
+            if stored < rows:
+                f.truncate(stored * self._row_bytes)
+                for start in range(stored, rows, BACKFILL_BATCH_SIZE):
+                    conversations = get_index(self.canonical_path).read(start, min(BACKFILL_BATCH_SIZE, rows - start))
+                    self.hasher.signatures(conversations_to_frame(conversations)).tofile(f)
+                f.flush()
+            f.seek(len(self) * self._row_bytes)
+            data = f.read((rows - len(self)) * self._row_bytes)
+        self._add(np.frombuffer(data, dtype=np.uint32).reshape(-1, self.hasher.num_perm))
+
+    def append(self, signatures: np.ndarray, at_row: int) -> None:
+        """Ghi chữ ký của các dòng vừa thêm vào dataset tổng hợp, bắt đầu từ dòng at_row"""
+        with open(self.signature_path, 'ab') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            # Bỏ phần ghi dở của lần commit bị lỗi trước đó để file luôn thẳng hàng với chỉ mục hash
+            f.truncate(at_row * self._row_bytes)
+            signatures.astype(np.uint32).tofile(f)
+            f.flush()
+        self._add(signatures)
+
+    def rollback(self, rows: int) -> None:
+        """Bỏ các chữ ký từ dòng rows trở đi (commit bị lỗi giữa chừng), dựng lại bảng LSH"""
+        if rows >= len(self):
+            return
+        with open(self.signature_path, 'ab') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            f.truncate(rows * self._row_bytes)
+        self._store.rows = rows
+        self.table = LSHTable(self.table.bands, self.table.rows)
+        if rows:
+            self.table.add(self.table.keys(self.signatures), np.arange(rows, dtype=np.int64))
+
+    def _add(self, signatures: np.ndarray) -> None:
+        ids = np.arange(len(self), len(self) + len(signatures), dtype=np.int64)
+        self._store.extend(signatures)
+        self.table.add(self.table.keys(signatures), ids)
+
+def conversations_to_frame(conversations: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Các dòng JSONL (messages user/assistant) thành DataFrame hai cột"""
+    return pd.DataFrame({
+        'user_message': [conversation['messages'][0]['content'] for conversation in conversations],
+        'assistant_message': [conversation['messages'][1]['content'] for conversation in conversations]
+    })
+
+class NearDupBatch:
+    def __init__(self, index: NearDupIndex):
+        """
+        Lọc gần trùng của một lượt xử lý: so với dataset tổng hợp và với các cặp đã giữ
+        trong lượt này, giữ cặp xuất hiện đầu tiên (chế độ chỉ báo cáo: giữ tất cả)
+        """
+        self.index = index
+        # Số cặp gần trùng tìm thấy (bị loại nếu index.drop)
+        self.duplicates = 0
+        self.signatures = _SignatureStore(index.hasher.num_perm)
+        self._table = LSHTable(index.table.bands, index.table.rows)
+        # (nguồn, dòng của cặp được giữ) -> các cặp bị loại
+        self.clusters: Dict[Tuple[str, int], List[Dict[str, Any]]] = {}
+
+    def filter(self, normalized: pd.DataFrame, signatures: np.ndarray) -> np.ndarray:
+        """
+        Quyết định giữ/loại từng cặp (gọi khi DedupIndex giữ khóa, sau khi đã lọc trùng tuyệt đối)
+        Id của cặp được giữ trong lượt chính là số dòng của nó trong file JSONL của lượt
+        Returns:
+            ndarray: Mask bool các cặp được giữ
+        """
+        threshold = self.index.threshold
+        keys = self._table.keys(signatures)
+        matches = [
+            ('canonical',) + _verify(signatures, self.index.table.query(keys), self.index.signatures, threshold),
+            ('dataset',) + _verify(signatures, self._table.query(keys), self.signatures.signatures, threshold)
+        ]
+        keep = np.ones(len(signatures), dtype=bool)
+        chunk_start = self.signatures.rows
+        # Band -> cặp đã giữ trong chunk này (chưa có trong bảng LSH của lượt)
+        chunk_buckets: Dict[int, int] = {}
+
+        for i in range(len(signatures)):
+            match = next(
+                ((source, int(ids[i]), float(similarities[i])) for source, ids, similarities in matches if ids[i] >= 0),
+                None
+            )
+            row_keys = keys[i].tolist()
+            if match is None:
+                local = [chunk_buckets[key] for key in row_keys if key in chunk_buckets]
+                if local:
+                    ids, similarities = _verify(signatures[i:i + 1], np.array([local]),
+                                                self.signatures.signatures, threshold)
+                    if ids[0] >= 0:
+                        match = ('dataset', int(ids[0]), float(similarities[0]))
+            if match is not None:
+                self.duplicates += 1
+                self.clusters.setdefault(match[:2], []).append({
+                    'user_message': normalized['user_message'].iat[i],
+                    'assistant_message': normalized['assistant_message'].iat[i],
+                    'similarity': round(match[2], 3)
+                })
+                if self.index.drop:
+                    keep[i] = False
+                    continue
+            kept_id = self.signatures.rows
+            self.signatures.extend(signatures[i:i + 1])
+            for key in row_keys:
+                chunk_buckets.setdefault(key, kept_id)
+
+        self._table.add(keys[keep], np.arange(chunk_start, self.signatures.rows, dtype=np.int64))
+        return keep
+
+    def report(self, jsonl_path: str) -> Optional[str]:
+        """
+        Ghi báo cáo <name>.near_dups.json: mỗi cụm gồm cặp được giữ (trong dataset của lượt
+        hoặc dataset tổng hợp) và các cặp gần trùng với nó kèm độ tương đồng
+        Returns:
+            str: Đường dẫn báo cáo, None nếu không có cặp gần trùng
+        """
+        if not self.clusters:
+            return None
+        sources = {'dataset': jsonl_path, 'canonical': self.index.canonical_path}
+        clusters = []
+        for (source, line), duplicates in sorted(self.clusters.items(), key=lambda item: -len(item[1])):
+            kept = get_index(sources[source]).read(line, 1)
+            clusters.append({
+                'kept': {
+                    'source': source,
+                    'line': line,
+                    **(conversations_to_frame(kept).iloc[0].to_dict() if kept else {})
+                },
+                'duplicates': duplicates
+            })
+        report_path = os.path.splitext(jsonl_path)[0] + '.near_dups.json'
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'threshold': self.index.threshold,
+                'dropped': self.index.drop,
+                'num_perm': self.index.hasher.num_perm,
+                'bands': self.index.table.bands,
+                'rows_per_band': self.index.table.rows,
+                'duplicates': self.duplicates,
+                'clusters': clusters
+            }, f, ensure_ascii=False, indent=2)
+        return report_path
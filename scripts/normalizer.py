@@ -0,0 +1,80 @@
+from json.encoder import encode_basestring
+import pandas as pd
+from typing import List, Dict, Any
+
+MESSAGE_COLUMNS = ('user_message', 'assistant_message')
+
+# Mọi cách viết hoa/thường của 'nan' (tương đương text.lower() == 'nan')
+NAN_VARIANTS = ['nan', 'naN', 'nAn', 'nAN', 'Nan', 'NaN', 'NAn', 'NAN']
+
+def normalize_conversation(data: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Chuẩn hóa dữ liệu từ Google Sheets thành format JSONL"""
+    normalized = []
+    for row in data:
+        if "user_message" not in row or "assistant_message" not in row:
+            continue
+
+        user_msg = str(row["user_message"]).strip()
+        assistant_msg = str(row["assistant_message"]).strip()
+
+        if not user_msg or not assistant_msg or user_msg.lower() == 'nan' or assistant_msg.lower() == 'nan':
+            continue
+
+        conversation = {
+            "messages": [
+                {"role": "user", "content": user_msg},
+                {"role": "assistant", "content": assistant_msg}
+            ]
+        }
+        normalized.append(conversation)
+    return normalized
+
+def records_to_frame(data: List[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    Chuyển payload dạng list of dicts (webhook) thành DataFrame theo cột
+    Dùng dtype=object để giá trị giữ nguyên kiểu như khi gọi str() từng ô
+    """
+    return pd.DataFrame(data, columns=list(MESSAGE_COLUMNS), dtype=object)
+
+def normalize_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Chuẩn hóa theo cột bằng các phép toán chuỗi vector hóa
+    Cho kết quả giống normalize_conversation nhưng không lặp từng dòng bằng Python
+    Returns:
+        DataFrame: Hai cột user_message, assistant_message đã strip và lọc dòng không hợp lệ
+    """
+    if any(column not in df.columns for column in MESSAGE_COLUMNS):
+        return pd.DataFrame({column: pd.Series(dtype=object) for column in MESSAGE_COLUMNS})
+
+    user_msg = df['user_message'].astype(str).str.strip()
+    assistant_msg = df['assistant_message'].astype(str).str.strip()
+
+    valid = (
+        (user_msg != '') & (assistant_msg != '') &
+        ~user_msg.isin(NAN_VARIANTS) & ~assistant_msg.isin(NAN_VARIANTS)
+    )
+    return pd.DataFrame({
+        'user_message': user_msg[valid],
+        'assistant_message': assistant_msg[valid]
+    })
+
+def frame_to_jsonl(normalized: pd.DataFrame) -> str:
+    """Serialize kết quả của normalize_frame thành JSONL (giống hệt json.dumps từng conversation)"""
+    # encode_basestring là encoder chuỗi mà json.dumps(..., ensure_ascii=False) dùng
+    return ''.join([
+        f'{{"messages": [{{"role": "user", "content": {encode_basestring(user_msg)}}}, '
+        f'{{"role": "assistant", "content": {encode_basestring(assistant_msg)}}}]}}\n'
+        for user_msg, assistant_msg in zip(normalized['user_message'], normalized['assistant_message'])
+    ])
+
+def frame_to_conversations(normalized: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Chuyển kết quả của normalize_frame về dạng list conversation"""
+    return [
+        {
+            "messages": [
+                {"role": "user", "content": user_msg},
+                {"role": "assistant", "content": assistant_msg}
+            ]
+        }
+        for user_msg, assistant_msg in zip(normalized['user_message'], normalized['assistant_message'])
+    ]
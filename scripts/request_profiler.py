@@ -0,0 +1,147 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from metrics import SPAN_LISTENER
+
+# Khoảng cách giữa hai lần lấy mẫu stack của luồng xử lý request
+SAMPLE_INTERVAL = 0.005
+PROFILE_ID_PATTERN = re.compile(r'^[0-9]{8}_[0-9]{6}_[a-z_]+_[0-9a-f]{8}$')
+
+def _collapse(frame) -> str:
+    """Stack từ gốc tới frame hiện tại dạng 'file:hàm;file:hàm' (định dạng collapsed của flamegraph)"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+class RequestProfile:
+    def __init__(self, endpoint: str, method: str, sample_interval: float):
+        """
+        Trace của một request: các span (bước được đo bằng STAGE_SECONDS.time) và
+        stack của luồng xử lý request được lấy mẫu mỗi sample_interval giây
+        Chỉ luồng xử lý request được lấy mẫu: LogManager ghi log xuống đĩa ở luồng flusher
+        (write-behind) nên thời gian ghi log không xuất hiện trong trace
+        """
+        self.id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{endpoint.lower()}_{uuid.uuid4().hex[:8]}"
+        self.endpoint = endpoint
+        self.method = method
+        self.status: Optional[int] = None
+        self.started_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.sample_interval = sample_interval
+        self.spans: List[Dict[str, Any]] = []
+        self.samples: Dict[str, int] = {}
+        self._started = time.perf_counter()
+        self._duration: Optional[float] = None
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name=f'profiler-{self.id}', daemon=True)
+        self._sampler.start()
+        self._token = SPAN_LISTENER.set(self._record_span)
+
+    def _record_span(self, name: str, labels: Dict[str, Any], started: float, elapsed: float) -> None:
+        self.spans.append({
+            'name': labels.get('stage', name),
+            'start_ms': round((started - self._started) * 1000, 3),
+            'duration_ms': round(elapsed * 1000, 3)
+        })
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.sample_interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None:
+                stack = _collapse(frame)
+                self.samples[stack] = self.samples.get(stack, 0) + 1
+
+    def finish(self) -> None:
+        """Dừng lấy mẫu và ghi span (gọi ở luồng đã bắt đầu profile)"""
+        if self._duration is not None:
+            return
+        self._duration = time.perf_counter() - self._started
+        SPAN_LISTENER.reset(self._token)
+        self._stop.set()
+        self._sampler.join()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'endpoint': self.endpoint,
+            'method': self.method,
+            'status': self.status,
+            'started_at': self.started_at,
+            'duration_ms': round((self._duration or 0) * 1000, 3),
+            'sample_interval_ms': self.sample_interval * 1000,
+            'spans': self.spans,
+            'samples': dict(sorted(self.samples.items(), key=lambda item: -item[1]))
+        }
+
+class RequestProfiler:
+    def __init__(self, directory: str, max_profiles: int = 50, sample_interval: float = SAMPLE_INTERVAL):
+        """
+        Lưu trace của các request được bật profile vào directory (mỗi request một file JSON),
+        chỉ giữ max_profiles file mới nhất
+        """
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self.sample_interval = sample_interval
+        self._lock = threading.Lock()
+
+    def start(self, endpoint: str, method: str) -> RequestProfile:
+        return RequestProfile(endpoint, method, self.sample_interval)
+
+    def save(self, profile: RequestProfile) -> str:
+        profile.finish()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'{profile.id}.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(profile.to_dict(), f, ensure_ascii=False)
+        with self._lock:
+            for old in self._files()[self.max_profiles:]:
+                try:
+                    os.remove(os.path.join(self.directory, old))
+                except OSError:
+                    pass
+        return path
+
+    def _files(self) -> List[str]:
+        """Tên các file profile, mới nhất trước (tên bắt đầu bằng thời điểm tạo)"""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return sorted((name for name in names if name.endswith('.json')), reverse=True)
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Tóm tắt các profile đã lưu (không kèm span/stack)"""
+        profiles = []
+        for name in self._files():
+            try:
+                with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            profiles.append({
+                key: data.get(key) for key in ('id', 'endpoint', 'method', 'status', 'started_at', 'duration_ms')
+            })
+        return profiles
+
+    def path_for(self, profile_id: str) -> Optional[str]:
+        """Đường dẫn file của profile, None nếu id không hợp lệ hoặc không còn"""
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        path = os.path.join(self.directory, f'{profile_id}.json')
+        return path if os.path.exists(path) else None
+
+def collapsed_stacks(path: str) -> str:
+    """Stack đã lấy mẫu của một profile dạng text 'stack count' (flamegraph.pl, speedscope)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        samples = json.load(f).get('samples', {})
+    return ''.join(f'{stack} {count}\n' for stack, count in samples.items())
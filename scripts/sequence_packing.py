@@ -0,0 +1,184 @@
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+# Số token thêm vào mỗi mẫu bởi chat template (role markers, BOS/EOS)
+TEMPLATE_OVERHEAD_TOKENS = 8
+# Độ rộng mỗi cột của histogram độ dài (token)
+HISTOGRAM_BIN_WIDTH = 64
+
+# Ước lượng token: mỗi từ/dấu câu ít nhất một token, text có dấu tiếng Việt
+# bị tách nhỏ hơn nên tính thêm theo số byte UTF-8
+WORD_PATTERN = r'\w+|[^\w\s]'
+APPROX_BYTES_PER_TOKEN = 3
+
+class ApproxTokenizer:
+    name = 'approx'
+
+    def count(self, texts: pd.Series) -> np.ndarray:
+        """Ước lượng số token (vector hóa, không cần model, chạy offline)"""
+        texts = texts.astype(str)
+        pieces = texts.str.count(WORD_PATTERN).to_numpy(dtype=np.int64)
+        byte_lengths = texts.str.encode('utf-8').str.len().to_numpy(dtype=np.int64)
+        return np.maximum(pieces, -(-byte_lengths // APPROX_BYTES_PER_TOKEN))
+
+class HFTokenizer:
+    def __init__(self, name_or_path: str):
+        """Tokenizer thật của model (cần transformers và file tokenizer có sẵn ở local/cache)"""
+        from transformers import AutoTokenizer
+        self.name = name_or_path
+        self._tokenizer = AutoTokenizer.from_pretrained(name_or_path)
+
+    def count(self, texts: pd.Series) -> np.ndarray:
+        encoded = self._tokenizer(list(texts.astype(str)), add_special_tokens=False)['input_ids']
+        return np.fromiter((len(ids) for ids in encoded), dtype=np.int64, count=len(encoded))
+
+def load_tokenizer(name_or_path: Optional[str] = None):
+    """
+    Tokenizer dùng để đếm token: TOKENIZER (tên/đường dẫn model HuggingFace) nếu có,
+    lỗi hoặc chưa cấu hình thì dùng ApproxTokenizer
+    """
+    name_or_path = name_or_path or os.getenv('TOKENIZER')
+    if name_or_path:
+        try:
+            return HFTokenizer(name_or_path)
+        except Exception as e:
+            print(f"Không tải được tokenizer {name_or_path}, dùng ước lượng: {str(e)}")
+    return ApproxTokenizer()
+
+def token_lengths(normalized: pd.DataFrame, tokenizer) -> np.ndarray:
+    """Số token của từng mẫu (kết quả của normalize_frame): user + assistant + template"""
+    if normalized.empty:
+        return np.zeros(0, dtype=np.int64)
+    return (tokenizer.count(normalized['user_message'])
+            + tokenizer.count(normalized['assistant_message'])
+            + TEMPLATE_OVERHEAD_TOKENS)
+
+def pack(lengths: np.ndarray, capacity: int) -> List[List[int]]:
+    """
+    Xếp các mẫu vào các bin có tổng số token <= capacity (Best-Fit Decreasing)
+    Bin được nhóm theo dung lượng còn trống, cây phân đoạn tìm bin vừa khít nhất trong O(log capacity)
+    Mẫu dài hơn capacity nằm riêng một bin
+    Returns:
+        list: Chỉ số các mẫu trong từng bin
+    """
+    size = 1
+    while size < capacity + 1:
+        size *= 2
+    # tree[size + r] = số bin còn trống đúng r token; nút trong = tổng của hai con
+    tree = [0] * (2 * size)
+    bins_by_space: Dict[int, List[int]] = {}
+    bins: List[List[int]] = []
+    spaces: List[int] = []
+
+    def update(space: int, delta: int) -> None:
+        node = size + space
+        while node:
+            tree[node] += delta
+            node //= 2
+
+    def find(length: int) -> int:
+        """Dung lượng trống nhỏ nhất >= length đang có bin, -1 nếu không có"""
+        node = size + length
+        if tree[node]:
+            return length
+        # Đi lên tới khi gặp anh em bên phải có bin, rồi đi xuống nhánh trái nhất
+        while node > 1:
+            if node % 2 == 0 and tree[node + 1]:
+                node += 1
+                break
+            node //= 2
+        else:
+            return -1
+        while node < size:
+            node = 2 * node if tree[2 * node] else 2 * node + 1
+        return node - size
+
+    for index in np.argsort(-lengths, kind='stable').tolist():
+        length = int(lengths[index])
+        space = find(length) if length <= capacity else -1
+        if space < 0:
+            bins.append([index])
+            spaces.append(max(capacity - length, 0))
+            bin_id = len(bins) - 1
+        else:
+            bin_id = bins_by_space[space].pop()
+            update(space, -1)
+            bins[bin_id].append(index)
+            spaces[bin_id] = space - length
+        remaining = spaces[bin_id]
+        if remaining > 0:
+            bins_by_space.setdefault(remaining, []).append(bin_id)
+            update(remaining, 1)
+    return bins
+
+def length_histogram(lengths: np.ndarray, capacity: int) -> Dict[str, Any]:
+    """Histogram và các phân vị của độ dài mẫu"""
+    edges = np.arange(0, max(int(lengths.max(initial=0)), capacity) + HISTOGRAM_BIN_WIDTH, HISTOGRAM_BIN_WIDTH)
+    counts, edges = np.histogram(lengths, bins=edges)
+    return {
+        'count': int(len(lengths)),
+        'mean': float(lengths.mean()) if len(lengths) else 0.0,
+        'p50': int(np.percentile(lengths, 50)) if len(lengths) else 0,
+        'p95': int(np.percentile(lengths, 95)) if len(lengths) else 0,
+        'max': int(lengths.max(initial=0)),
+        'over_capacity': int((lengths > capacity).sum()),
+        'bin_width': HISTOGRAM_BIN_WIDTH,
+        'bins': [
+            {'start': int(start), 'count': int(count)}
+            for start, count in zip(edges[:-1], counts) if count
+        ]
+    }
+
+def padding_waste(lengths: np.ndarray, bins: List[List[int]], capacity: int, batch_size: int) -> Dict[str, Any]:
+    """
+    Tỉ lệ token padding:
+    - unpacked_static: mỗi mẫu pad tới capacity
+    - unpacked_dynamic: mỗi batch pad tới mẫu dài nhất (theo thứ tự dataset)
+    - packed: mỗi bin pad tới capacity
+    """
+    clipped = np.minimum(lengths, capacity)
+    real_tokens = int(clipped.sum())
+    padded = np.pad(clipped, (0, -len(clipped) % batch_size))
+    dynamic_total = int(padded.reshape(-1, batch_size).max(axis=1).sum() * batch_size)
+
+    def waste(total: int) -> float:
+        return round(1 - real_tokens / total, 4) if total else 0.0
+
+    unpacked_static = waste(len(clipped) * capacity)
+    packed = waste(len(bins) * capacity)
+    return {
+        'real_tokens': real_tokens,
+        'unpacked_static': unpacked_static,
+        'unpacked_dynamic': waste(dynamic_total),
+        'packed': packed,
+        'reduction': round(unpacked_static - packed, 4),
+        'sequences_before': int(len(clipped)),
+        'sequences_after': len(bins)
+    }
+
+def packing_report(jsonl_path: str, lengths: np.ndarray, capacity: int, batch_size: int) -> Dict[str, Any]:
+    """
+    Ghi <name>.lengths.json: histogram độ dài và ước lượng token padding khi đóng gói.
+    Không ghi bản đóng gói: trainer tự đóng gói khi train (LLaMA-Factory packing + neat_packing
+    trong configs/fine_tune_spa.yaml) và chặn attention giữa các hội thoại ghép chung một chuỗi,
+    báo cáo này dùng để chọn cutoff_len và kiểm tra lợi ích của packing trên dữ liệu thật
+    Args:
+        lengths: Số token của từng dòng trong jsonl_path, theo đúng thứ tự
+    """
+    report_path = os.path.splitext(jsonl_path)[0] + '.lengths.json'
+    bins = pack(lengths, capacity)
+    report = {
+        'context_length': capacity,
+        'batch_size': batch_size,
+        'template_overhead_tokens': TEMPLATE_OVERHEAD_TOKENS,
+        'histogram': length_histogram(lengths, capacity),
+        'padding_waste': padding_waste(lengths, bins, capacity, batch_size)
+    }
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
@@ -1,15 +1,42 @@
 import os
+import queue
+import threading
+import time
 import requests
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
+from metrics import STAGE_SECONDS
 
 load_dotenv()
 
+# Giới hạn độ dài một tin nhắn của Telegram
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+
 class TelegramNotifier:
-    def __init__(self):
-        self.bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
-        self.chat_id = os.getenv('TELEGRAM_CHAT_ID')
-        self.api_url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
+    def __init__(self, bot_token: Optional[str] = None, chat_id: Optional[str] = None,
+                 api_base: Optional[str] = None, timeout: float = 10):
+        self.bot_token = bot_token or os.getenv('TELEGRAM_BOT_TOKEN')
+        self.chat_id = chat_id or os.getenv('TELEGRAM_CHAT_ID')
+        # Cho phép trỏ tới server giả lập khi test
+        api_base = (api_base or os.getenv('TELEGRAM_API_URL') or 'https://api.telegram.org').rstrip('/')
+        self.api_url = f"{api_base}/bot{self.bot_token}/sendMessage"
+        self.timeout = timeout
+        # Session dùng chung để tái sử dụng kết nối (connection pool)
+        self.session = requests.Session()
+
+    def is_configured(self) -> bool:
+        """Kiểm tra đã cấu hình token và chat id chưa"""
+        return bool(self.bot_token and self.chat_id)
+
+    def post_message(self, message: str, parse_mode: Optional[str] = 'HTML') -> requests.Response:
+        """Gọi API sendMessage và trả về response (có thể raise lỗi mạng)"""
+        payload = {
+            'chat_id': self.chat_id,
+            'text': message,
+            'parse_mode': parse_mode
+        }
+        with STAGE_SECONDS.time(stage='telegram_post'):
+            return self.session.post(self.api_url, json=payload, timeout=self.timeout)
 
     def send_message(self, message: str, parse_mode: Optional[str] = 'HTML') -> bool:
         """
@@ -20,21 +47,178 @@ class TelegramNotifier:
         Returns:
             bool: True nếu gửi thành công, False nếu có lỗi
         """
-        if not self.bot_token or not self.chat_id:
+        if not self.is_configured():
             print("Telegram credentials not configured")
             return False
 
         try:
-            payload = {
-                'chat_id': self.chat_id,
-                'text': message,
-                'parse_mode': parse_mode
-            }
-            response = requests.post(self.api_url, json=payload)
+            response = self.post_message(message, parse_mode)
             return response.status_code == 200
         except Exception as e:
             print(f"Error sending Telegram message: {str(e)}")
             return False
 
+class TelegramDispatcher:
+    def __init__(self, notifier: TelegramNotifier, max_queue_size: int = 100,
+                 coalesce_window: float = 2.0, min_interval: float = 1.0,
+                 max_retries: int = 3, backoff: float = 1.0):
+        """
+        Gửi thông báo Telegram ở luồng nền để không chặn request và training
+        Args:
+            notifier: TelegramNotifier dùng để gọi API
+            max_queue_size: Số tin nhắn tối đa chờ gửi, vượt quá sẽ bị bỏ
+            coalesce_window: Thời gian (giây) gom các tin tiến độ liên tiếp thành một tin
+            min_interval: Khoảng cách tối thiểu (giây) giữa hai lần gửi
+            max_retries: Số lần thử lại khi lỗi mạng, lỗi 5xx hoặc bị giới hạn (429)
+            backoff: Thời gian chờ cơ sở (giây) cho exponential backoff
+        """
+        self.notifier = notifier
+        self.coalesce_window = coalesce_window
+        self.min_interval = min_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._stats = {'enqueued': 0, 'sent': 0, 'failed': 0, 'dropped': 0, 'coalesced': 0, 'retries': 0}
+        self._last_sent = 0.0
+        self._stopped = False
+        self._warned_unconfigured = False
+        self._worker = threading.Thread(target=self._run, name='telegram-dispatcher', daemon=True)
+        self._worker.start()
+
+    def enqueue(self, message: str, parse_mode: Optional[str] = 'HTML', progress: bool = False) -> bool:
+        """
+        Đưa tin nhắn vào hàng đợi gửi
+        Args:
+            message: Nội dung tin nhắn
+            parse_mode: HTML hoặc Markdown
+            progress: Tin tiến độ, có thể được gộp với các tin tiến độ khác
+        Returns:
+            bool: False nếu tin nhắn bị bỏ (chưa cấu hình hoặc hàng đợi đầy)
+        """
+        if not self.notifier.is_configured():
+            if not self._warned_unconfigured:
+                print("Telegram credentials not configured")
+                self._warned_unconfigured = True
+            return False
+
+        try:
+            self._queue.put_nowait((message, parse_mode, progress))
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('enqueued')
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê độ dài hàng đợi và số tin đã gửi/lỗi/bỏ/gộp"""
+        with self._lock:
+            return {'queue_depth': self._queue.qsize(), **self._stats}
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Chờ tới khi hàng đợi được gửi hết, trả về False nếu hết timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self, timeout: float = 10) -> None:
+        """Gửi nốt các tin đang chờ rồi dừng luồng nền"""
+        self.flush(timeout)
+        self._stopped = True
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[key] += amount
+
+    def _run(self) -> None:
+        """Luồng nền: lấy tin từ hàng đợi, gộp tin tiến độ và gửi"""
+        while not self._stopped:
+            try:
+                item = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            items = [item]
+            if item[2]:
+                # Gom các tin tới trong cửa sổ coalesce_window
+                deadline = time.monotonic() + self.coalesce_window
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        items.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+
+            try:
+                for message, parse_mode in self._coalesce(items):
+                    self._deliver(message, parse_mode)
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+    def _coalesce(self, items: List[Tuple[str, Optional[str], bool]]) -> List[Tuple[str, Optional[str]]]:
+        """Gộp các tin tiến độ liên tiếp thành một tin tổng hợp, giữ nguyên thứ tự"""
+        batches: List[Tuple[str, Optional[str]]] = []
+        progress_run: List[Tuple[str, Optional[str]]] = []
+
+        def flush_progress():
+            if len(progress_run) > 1:
+                self._count('coalesced', len(progress_run) - 1)
+                digest = "\n\n".join(message for message, _ in progress_run)
+                batches.append((digest[:TELEGRAM_MAX_MESSAGE_LENGTH], progress_run[0][1]))
+            elif progress_run:
+                batches.append(progress_run[0])
+            progress_run.clear()
+
+        for message, parse_mode, progress in items:
+            if progress:
+                progress_run.append((message, parse_mode))
+                continue
+            flush_progress()
+            batches.append((message, parse_mode))
+        flush_progress()
+        return batches
+
+    def _deliver(self, message: str, parse_mode: Optional[str]) -> bool:
+        """Gửi một tin, tuân thủ giới hạn tốc độ và thử lại với backoff"""
+        for attempt in range(self.max_retries + 1):
+            # Giữ khoảng cách tối thiểu giữa các lần gửi
+            wait = self._last_sent + self.min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+            retry_after = self.backoff * (2 ** attempt)
+            try:
+                response = self.notifier.post_message(message, parse_mode)
+                self._last_sent = time.monotonic()
+                if response.status_code == 200:
+                    self._count('sent')
+                    return True
+                if response.status_code == 429:
+                    # Telegram trả về thời gian phải chờ trong parameters.retry_after
+                    try:
+                        retry_after = float(response.json().get('parameters', {}).get('retry_after', retry_after))
+                    except ValueError:
+                        pass
+                elif response.status_code < 500:
+                    print(f"Error sending Telegram message: HTTP {response.status_code}")
+                    break
+            except requests.RequestException as e:
+                self._last_sent = time.monotonic()
+                print(f"Error sending Telegram message: {str(e)}")
+
+            if attempt < self.max_retries:
+                self._count('retries')
+                time.sleep(retry_after)
+
+        self._count('failed')
+        return False
+
 # Khởi tạo instance để sử dụng trong toàn bộ ứng dụng
-notifier = TelegramNotifier()
\ No newline at end of file
+notifier = TelegramNotifier()
+dispatcher = TelegramDispatcher(notifier)
@@ -0,0 +1,274 @@
+import json
+import os
+import pickle
+import select
+import shutil
+import subprocess
+import sys
+import threading
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from werkzeug.utils import secure_filename
+
+from csv_sniffer import UnusableFileError, match_columns, read_csv_chunks, sniff_csv
+from normalizer import MESSAGE_COLUMNS
+
+# Định dạng file dữ liệu đọc được (file .zip được giải nén thành các file này)
+DATA_EXTENSIONS = {'csv', 'xlsx'}
+ARCHIVE_EXTENSIONS = {'zip'}
+# Script của tiến trình đọc + chuẩn hóa file (upload_worker.parse_file)
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'upload_worker.py')
+
+def file_extension(filename: str) -> str:
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+def detect_layout(filepath: str) -> Any:
+    """
+    Kiểm tra nhanh file trước khi đọc toàn bộ: CSV chỉ dò vài KB đầu (encoding, delimiter,
+    dòng header, cột câu hỏi/trả lời), XLSX chỉ đọc dòng header
+    Returns:
+        CsvLayout với file CSV, vị trí các cột hội thoại với file XLSX
+    Raises:
+        UnusableFileError: File không có cột câu hỏi và cột câu trả lời
+    """
+    if filepath.endswith('.csv'):
+        return sniff_csv(filepath)
+    workbook = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        header = next(workbook.worksheets[0].iter_rows(values_only=True), None) or ()
+    finally:
+        workbook.close()
+    return _xlsx_positions(header)
+
+def _xlsx_positions(header: tuple) -> Dict[str, int]:
+    positions = match_columns(header)
+    if len(positions) < len(MESSAGE_COLUMNS):
+        raise UnusableFileError(
+            'Dòng đầu của sheet không có cột câu hỏi và câu trả lời '
+            '(cần user_message/assistant_message hoặc question/answer, câu hỏi/trả lời...)'
+        )
+    return positions
+
+def read_chunks(filepath: str, chunk_rows: int, layout: Any = None) -> Iterator[Tuple[pd.DataFrame, float]]:
+    """
+    Đọc file CSV/XLSX theo từng chunk
+    Args:
+        layout: Kết quả detect_layout nếu đã kiểm tra file trước đó
+    Yields:
+        tuple: (chunk, tỉ lệ đã đọc của file từ 0 tới 1)
+    """
+    if filepath.endswith('.csv'):
+        yield from read_csv_chunks(filepath, chunk_rows, layout)
+    else:  # xlsx
+        yield from read_xlsx_chunks(filepath, chunk_rows)
+
+def _excel_value(value: Any) -> Any:
+    """Giá trị ô giống pd.read_excel: ô trống là NaN, số thực nguyên (5.0) thành int"""
+    if value is None:
+        return np.nan
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def read_xlsx_chunks(filepath: str, chunk_rows: int) -> Iterator[Tuple[pd.DataFrame, float]]:
+    """
+    Đọc sheet đầu tiên của file XLSX ở chế độ read-only: openpyxl duyệt XML của sheet theo
+    từng dòng thay vì dựng toàn bộ workbook trong bộ nhớ như pd.read_excel
+    Chỉ giữ các cột user_message/assistant_message (tìm theo dòng header, chấp nhận alias)
+    """
+    workbook = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        # Số dòng lấy từ thẻ dimension của sheet (có thể thiếu), chỉ dùng để báo tiến độ
+        total_rows = max((sheet.max_row or 0) - 1, 1)
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        positions = _xlsx_positions(header)
+        columns: Dict[str, List[Any]] = {column: [] for column in positions}
+        count = 0
+        read = 0
+        for values in rows:
+            for column, position in positions.items():
+                columns[column].append(_excel_value(values[position] if position < len(values) else None))
+            count += 1
+            if count == chunk_rows:
+                read += count
+                yield pd.DataFrame(columns, index=range(count), dtype=object), min(read / total_rows, 1.0)
+                columns = {column: [] for column in positions}
+                count = 0
+        if count:
+            yield pd.DataFrame(columns, index=range(count), dtype=object), 1.0
+    finally:
+        workbook.close()
+
+def _load_chunks(path: str) -> Iterator[pd.DataFrame]:
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+def extract_archive(zip_path: str, directory: str, max_bytes: int,
+                    archive_name: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Giải nén các file CSV/XLSX trong file zip vào directory (bỏ qua thư mục con trong tên,
+    chặn path traversal và tổng dung lượng giải nén vượt max_bytes)
+    Args:
+        archive_name: Tên hiển thị của file zip trong kết quả (mặc định tên file)
+    Returns:
+        list: {'file', 'path'} cho mỗi file giải nén được, {'file', 'error'} cho mỗi file bị bỏ qua
+    """
+    archive_name = archive_name or os.path.basename(zip_path)
+    entries = []
+    with zipfile.ZipFile(zip_path) as archive:
+        members = [member for member in archive.infolist() if not member.is_dir()]
+        if sum(member.file_size for member in members) > max_bytes:
+            raise ValueError(f'{archive_name}: dung lượng sau giải nén vượt quá {max_bytes // 2 ** 20}MB')
+        for index, member in enumerate(members):
+            name = f'{archive_name}/{member.filename}'
+            filename = secure_filename(os.path.basename(member.filename))
+            if file_extension(filename) not in DATA_EXTENSIONS:
+                entries.append({'file': name, 'error': 'Định dạng file không được hỗ trợ'})
+                continue
+            path = os.path.join(directory, f'{index}_{filename}')
+            with archive.open(member) as source, open(path, 'wb') as target:
+                shutil.copyfileobj(source, target)
+            entries.append({'file': name, 'path': path})
+    return entries
+
+class _WorkerProcess:
+    def __init__(self):
+        """Một tiến trình upload_worker.py, nhận task qua stdin và trả kết quả qua stdout"""
+        self.process = subprocess.Popen(
+            [sys.executable, WORKER_SCRIPT], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            text=True, encoding='utf-8'
+        )
+        self.alive = True
+
+    def run(self, filepath: str, output_path: str, chunk_rows: int,
+            timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Args:
+            timeout: Thời gian tối đa (giây) chờ kết quả, quá hạn thì dừng hẳn tiến trình
+                (vd. treo khi đọc file hỏng), pool tạo tiến trình mới cho file sau
+        """
+        try:
+            self.process.stdin.write(json.dumps({
+                'path': filepath, 'output_path': output_path, 'chunk_rows': chunk_rows
+            }) + '\n')
+            self.process.stdin.flush()
+            ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+            if not ready:
+                self.alive = False
+                self.process.kill()
+                self.process.wait()
+                raise RuntimeError(f'Đọc file quá {timeout:g} giây, đã dừng tiến trình đọc file')
+            line = self.process.stdout.readline()
+        except (BrokenPipeError, ValueError):
+            line = ''
+        if not line:
+            self.alive = False
+            raise RuntimeError(f'Tiến trình đọc file đã dừng (exit code {self.process.poll()})')
+        reply = json.loads(line)
+        if 'error' in reply:
+            raise RuntimeError(reply['error'])
+        return reply['result']
+
+    def close(self) -> None:
+        """Đóng stdin để worker tự thoát, buộc dừng nếu không thoát kịp"""
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+
+class UploadPool:
+    def __init__(self, workers: int, file_timeout: Optional[float] = None):
+        """
+        Pool tiến trình đọc + chuẩn hóa nhiều file song song, tiến trình được tạo khi dùng lần đầu
+        và dùng lại cho các file sau. Mỗi tiến trình chạy upload_worker.py như một script riêng
+        (không fork tiến trình web đang chạy nhiều luồng, không import lại module __main__ của app)
+        Args:
+            file_timeout: Thời gian tối đa (giây) đọc một file, quá hạn file đó bị báo lỗi
+        """
+        self.workers = workers
+        self.file_timeout = file_timeout
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._idle: List[_WorkerProcess] = []
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Mỗi luồng của executor giữ một tiến trình worker trong lúc đọc một file
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='upload-pool')
+            return self._executor
+
+    def _parse_file(self, filepath: str, output_path: str, chunk_rows: int) -> Dict[str, Any]:
+        """Đọc một file bằng một tiến trình worker đang rảnh (tạo mới nếu chưa có)"""
+        with self._lock:
+            worker = self._idle.pop() if self._idle else None
+        if worker is None:
+            worker = _WorkerProcess()
+        try:
+            return worker.run(filepath, output_path, chunk_rows, self.file_timeout)
+        finally:
+            if worker.alive:
+                with self._lock:
+                    self._idle.append(worker)
+            else:
+                worker.close()
+
+    def process(self, entries: List[Dict[str, Any]], work_dir: str, chunk_rows: int,
+                on_file_done: Optional[Callable[[int, int, Dict[str, Any]], None]] = None) -> Iterator[pd.DataFrame]:
+        """
+        Đọc song song các file, trả về các chunk đã chuẩn hóa theo đúng thứ tự file
+        (để lọc trùng luôn giữ cùng một cặp) trong khi các file sau vẫn đang được đọc
+        Kết quả từng file (rows/valid/invalid/seconds hoặc error) được ghi vào chính entry đó
+        Args:
+            entries: {'file', 'path'} hoặc {'file', 'error'} (file đã bị loại từ trước)
+        """
+        executor = self._get_executor()
+        futures: List[Optional[Future]] = [
+            executor.submit(self._parse_file, entry['path'], os.path.join(work_dir, f'{index}.pkl'), chunk_rows)
+            if 'path' in entry else None
+            for index, entry in enumerate(entries)
+        ]
+        try:
+            for index, (entry, future) in enumerate(zip(entries, futures)):
+                if future is not None:
+                    output_path = os.path.join(work_dir, f'{index}.pkl')
+                    try:
+                        entry.update(future.result())
+                    except Exception as e:
+                        entry['error'] = str(e)
+                    else:
+                        yield from _load_chunks(output_path)
+                    finally:
+                        if os.path.exists(output_path):
+                            os.remove(output_path)
+                    entry.pop('path')
+                if on_file_done:
+                    on_file_done(index + 1, len(entries), entry)
+        finally:
+            # Dừng sớm (lỗi ở bước sau): hủy các file chưa bắt đầu đọc
+            for future in futures:
+                if future is not None:
+                    future.cancel()
+
+    def close(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.close()
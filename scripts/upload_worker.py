@@ -0,0 +1,54 @@
+import json
+import os
+import pickle
+import sys
+import time
+from typing import Any, Dict
+
+from normalizer import normalize_frame
+from upload_pool import detect_layout, read_chunks
+
+# Tiến trình đọc file của UploadPool: chạy như một script riêng (python upload_worker.py) nên không
+# import lại module __main__ của app. Nhận mỗi dòng stdin một task JSON {'path', 'output_path', 'chunk_rows'},
+# trả mỗi dòng stdout một kết quả {'result': ...} hoặc {'error': ...}
+
+def parse_file(filepath: str, output_path: str, chunk_rows: int) -> Dict[str, Any]:
+    """
+    Đọc và chuẩn hóa một file
+    Các chunk đã chuẩn hóa được pickle nối tiếp vào output_path để tiến trình chính đọc lại
+    từng chunk, không phải giữ kết quả của cả file trong bộ nhớ
+    File không dùng được bị loại ngay sau bước dò (UnusableFileError), trước khi đọc toàn bộ
+    """
+    started = time.perf_counter()
+    rows = 0
+    valid = 0
+    layout = detect_layout(filepath)
+    with open(output_path, 'wb') as out:
+        for chunk, _ in read_chunks(filepath, chunk_rows, layout):
+            normalized = normalize_frame(chunk)
+            rows += len(chunk)
+            valid += len(normalized)
+            if len(normalized):
+                pickle.dump(normalized, out, protocol=pickle.HIGHEST_PROTOCOL)
+    return {
+        'rows': rows,
+        'valid': valid,
+        'invalid': rows - valid,
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+
+def main():
+    replies = os.fdopen(os.dup(sys.stdout.fileno()), 'w', encoding='utf-8')
+    # Thông báo in ra từ thư viện đi sang stderr, không lẫn vào kết quả
+    sys.stdout = sys.stderr
+    for line in sys.stdin:
+        task = json.loads(line)
+        try:
+            reply = {'result': parse_file(task['path'], task['output_path'], task['chunk_rows'])}
+        except Exception as e:
+            reply = {'error': str(e)}
+        replies.write(json.dumps(reply, ensure_ascii=False) + '\n')
+        replies.flush()
+
+if __name__ == '__main__':
+    main()